@@ -1,21 +1,30 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request, UploadFile, File
+from fastapi.responses import FileResponse, Response
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-import uuid
-from pathlib import Path
-from datetime import timedelta
+from starlette.concurrency import run_in_threadpool
+import time
+import logging
 from typing import Optional
-from app.models.schemas import UserRegister, UserLogin, Token, UserResponse, UserUpdate, PasswordChange
+from app.core.config import settings
+from app.models.schemas import UserRegister, UserLogin, Token, RefreshRequest, UserResponse, UserUpdate, PasswordChange
+from app.models.user import User
 from app.services.auth import (
     authenticate_user,
     create_user,
-    create_access_token,
+    create_token_pair,
     get_user_by_email,
     get_user_by_id,
+    get_token_version,
+    is_token_revoked,
+    password_fingerprint,
     verify_token,
     update_user_profile,
-    update_user_password,
-    ACCESS_TOKEN_EXPIRE_MINUTES
+    update_user_password
 )
+from app.services.avatar import AvatarService
+from app.services.user_cache import UserCache
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -27,18 +36,24 @@ async def get_token_from_header(request: Request) -> Optional[str]:
     
     if auth_header:
         if auth_header.startswith("Bearer "):
-            extracted_token = auth_header[7:].strip()
-            print(f"Token extracted from request.headers (length: {len(extracted_token)})")
-            print(f"Token preview: {extracted_token[:50]}...")
-            return extracted_token
+            return auth_header[7:].strip()
         else:
-            print(f"Auth header doesn't start with 'Bearer ': {auth_header[:50]}")
+            logger.debug("Auth header doesn't start with 'Bearer '")
     else:
-        print("No Authorization header found in request")
-        print(f"Available headers: {list(request.headers.keys())}")
+        logger.debug("No Authorization header found in request")
     
     return None
 
+async def load_user(user_id: int) -> Optional[User]:
+    """Utilisateur depuis le cache, sinon depuis la base"""
+    user = UserCache.get(user_id)
+    if user is None:
+        fetched_at = time.time()
+        user = await get_user_by_id(user_id)
+        if user is not None:
+            UserCache.put(user, fetched_at)
+    return user
+
 async def get_current_user(request: Request):
     """Dépendance pour obtenir l'utilisateur actuel depuis le token"""
     credentials_exception = HTTPException(
@@ -49,65 +64,93 @@ async def get_current_user(request: Request):
     try:
         # Extraire le token depuis le header
         token = await get_token_from_header(request)
-        
-        print(f"get_current_user called with token (length: {len(token) if token else 0})")
-        if token:
-            print(f"Token preview: {token[:50]}...")
         if not token:
-            print("No token provided to get_current_user")
+            logger.debug("No token provided to get_current_user")
             raise credentials_exception
         payload = verify_token(token)
         if payload is None:
-            print(f"Token verification failed: payload is None")
+            logger.debug("Token verification failed: payload is None")
+            raise credentials_exception
+        if payload.get("typ") == "refresh" or is_token_revoked(payload):
+            logger.debug("Token verification failed: refresh or revoked token")
             raise credentials_exception
         user_id = payload.get("sub")
         if user_id is None:
-            print(f"Token verification failed: user_id is None in payload {payload}")
+            logger.debug("Token verification failed: no user_id in payload")
             raise credentials_exception
-        print(f"Looking for user with ID: {user_id} (type: {type(user_id)})")
         # Convertir user_id en int si nécessaire
         try:
             user_id_int = int(user_id) if not isinstance(user_id, int) else user_id
         except (ValueError, TypeError) as e:
-            print(f"Error converting user_id to int: {e}, user_id: {user_id}")
+            logger.warning("Error converting user_id to int: %s, user_id: %r", e, user_id)
             raise credentials_exception
-        user = get_user_by_id(user_id_int)
+        user = await load_user(user_id_int)
         if user is None:
-            print(f"User not found with ID: {user_id_int}")
+            logger.info("User not found with ID: %s", user_id_int)
             raise credentials_exception
-        print(f"User found: {user.email}")
         return user
     except HTTPException:
         raise
-    except Exception as e:
-        print(f"Error in get_current_user: {str(e)}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Error in get_current_user")
         raise credentials_exception
 
+async def get_authorized_user(request: Request):
+    """
+    Utilisateur actuel pour l'autorisation (id, email, plan, état du compte)
+
+    En mode stateless, il est reconstruit depuis les claims du token d'accès,
+    sans accès à la base; les autres champs du profil ne sont pas renseignés.
+    Sinon, équivalent à get_current_user.
+    """
+    if settings.AUTH_MODE == "stateless":
+        token = await get_token_from_header(request)
+        payload = verify_token(token) if token else None
+        if payload is not None and payload.get("typ") == "access" and not is_token_revoked(payload):
+            if not payload.get("act", False):
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Inactive user",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+            return User(
+                id=int(payload["sub"]),
+                email=payload.get("email"),
+                hashed_password=None,
+                plan=payload.get("plan", "free"),
+                is_active=True
+            )
+    return await get_current_user(request)
+
+async def get_optional_user(request: Request):
+    """Utilisateur actuel si un token valide est fourni, sinon None (endpoints publics)"""
+    if not (request.headers.get("Authorization") or request.headers.get("authorization")):
+        return None
+    try:
+        return await get_authorized_user(request)
+    except HTTPException:
+        return None
+
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def register(user_data: UserRegister):
     """Inscription d'un nouvel utilisateur"""
     try:
-        print(f"Register request received for email: {user_data.email}")
-        
         # Vérifier si l'email existe déjà
-        existing_user = get_user_by_email(user_data.email)
+        existing_user = await get_user_by_email(user_data.email)
         if existing_user:
-            print(f"Email {user_data.email} already exists")
+            logger.info("Registration refused, email already exists: %s", user_data.email)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
         
         # Créer l'utilisateur
-        print(f"Creating user: {user_data.email}")
-        user = create_user(
+        user = await create_user(
             email=user_data.email,
             password=user_data.password,
             full_name=user_data.full_name
         )
-        print(f"User created successfully with ID: {user.id}")
+        logger.info("User created with ID: %s", user.id)
         
         # Convertir l'enum plan en string pour la réponse
         plan_value = user.plan.value if hasattr(user.plan, 'value') else str(user.plan)
@@ -119,14 +162,11 @@ async def register(user_data: UserRegister):
             is_active=user.is_active,
             is_verified=user.is_verified
         )
-        print(f"Returning user response: {response_data}")
         return response_data
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Register error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Register error")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating user: {str(e)}"
@@ -135,38 +175,52 @@ async def register(user_data: UserRegister):
 @router.post("/login", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     """Connexion d'un utilisateur"""
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.id, "email": user.email},
-        expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return create_token_pair(user)
 
 @router.post("/login-json", response_model=Token)
 async def login_json(user_data: UserLogin):
     """Connexion avec JSON (alternative à OAuth2PasswordRequestForm)"""
-    user = authenticate_user(user_data.email, user_data.password)
+    user = await authenticate_user(user_data.email, user_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.id, "email": user.email},
-        expires_delta=access_token_expires
+    return create_token_pair(user)
+
+@router.post("/refresh", response_model=Token)
+async def refresh_tokens(refresh_data: RefreshRequest):
+    """Renouvelle le token d'accès à partir d'un refresh token"""
+    invalid_token = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
     )
-    print(f"Login successful for user {user.email}, token created (length: {len(access_token)})")
-    print(f"Token preview: {access_token[:50]}...")
-    return {"access_token": access_token, "token_type": "bearer"}
+    payload = verify_token(refresh_data.refresh_token)
+    if payload is None or payload.get("typ") != "refresh":
+        raise invalid_token
+    try:
+        user_id = int(payload.get("sub"))
+    except (ValueError, TypeError):
+        raise invalid_token
+    # Seul passage par la base: compte désactivé, mot de passe changé ou tokens révoqués
+    user = await load_user(user_id)
+    if (
+        user is None
+        or not user.is_active
+        or payload.get("ver", 0) < get_token_version(user_id)
+        or payload.get("pwd") != password_fingerprint(user.hashed_password)
+    ):
+        raise invalid_token
+    return create_token_pair(user)
 
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(request: Request):
@@ -192,7 +246,7 @@ async def update_profile(request: Request, user_update: UserUpdate):
     current_user = await get_current_user(request)
     
     update_data = user_update.dict(exclude_unset=True)
-    updated_user = update_user_profile(current_user.id, update_data)
+    updated_user = await update_user_profile(current_user.id, update_data)
     
     if not updated_user:
         raise HTTPException(
@@ -222,7 +276,7 @@ async def change_password(request: Request, password_data: PasswordChange):
     current_user = await get_current_user(request)
     
     # Vérifier l'ancien mot de passe
-    if not authenticate_user(current_user.email, password_data.old_password):
+    if not await authenticate_user(current_user.email, password_data.old_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect old password"
@@ -236,7 +290,7 @@ async def change_password(request: Request, password_data: PasswordChange):
         )
     
     # Mettre à jour le mot de passe
-    success = update_user_password(current_user.id, password_data.new_password)
+    success = await update_user_password(current_user.id, password_data.new_password)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -247,9 +301,7 @@ async def change_password(request: Request, password_data: PasswordChange):
 
 @router.post("/me/avatar")
 async def upload_avatar(request: Request, file: UploadFile = File(...)):
-    """Uploader une photo de profil"""
-    from app.core.config import settings
-    
+    """Uploader une photo de profil (convertie en variantes WebP 64/128/256 px)"""
     current_user = await get_current_user(request)
     
     # Valider le type de fichier
@@ -268,24 +320,11 @@ async def upload_avatar(request: Request, file: UploadFile = File(...)):
             detail="L'image est trop volumineuse (maximum 5MB)"
         )
     
-    # Générer un nom de fichier unique
-    ext = file.filename.split(".")[-1].lower() if "." in file.filename else "jpg"
-    if ext not in ["jpg", "jpeg", "png", "gif", "webp"]:
-        ext = "jpg"
-    
-    file_id = str(uuid.uuid4())
-    saved_filename = f"avatar_{current_user.id}_{file_id}.{ext}"
-    
-    # Créer le dossier avatars s'il n'existe pas
-    avatars_dir = Path(settings.UPLOAD_DIR) / "avatars"
-    avatars_dir.mkdir(parents=True, exist_ok=True)
-    
-    file_path = avatars_dir / saved_filename
-    
-    # Sauvegarder le fichier
+    # Décodage et redimensionnement: hors de la boucle d'événements
     try:
-        with open(file_path, "wb") as buffer:
-            buffer.write(content)
+        avatar_id = await run_in_threadpool(AvatarService.create_variants, content, current_user.id)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -293,41 +332,45 @@ async def upload_avatar(request: Request, file: UploadFile = File(...)):
         )
     
     # Mettre à jour l'URL de l'avatar dans la base de données
-    avatar_url = f"/api/avatars/{saved_filename}"
-    updated_user = update_user_profile(current_user.id, {"avatar_url": avatar_url})
+    avatar_url = AvatarService.avatar_url(avatar_id)
+    previous_url = getattr(current_user, 'avatar_url', None)
+    updated_user = await update_user_profile(current_user.id, {"avatar_url": avatar_url})
     
     if not updated_user:
-        # Supprimer le fichier si la mise à jour échoue
-        try:
-            file_path.unlink()
-        except:
-            pass
+        # Supprimer les fichiers si la mise à jour échoue
+        AvatarService.delete(avatar_url, current_user.id)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Failed to update avatar"
         )
     
+    AvatarService.delete(previous_url, current_user.id)
     return {"avatar_url": avatar_url, "message": "Avatar uploaded successfully"}
 
 @router.get("/avatars/{filename}")
-async def get_avatar(filename: str):
-    """Récupérer une photo de profil"""
-    from fastapi.responses import FileResponse
-    from app.core.config import settings
-    
-    avatars_dir = Path(settings.UPLOAD_DIR) / "avatars"
-    file_path = avatars_dir / filename
-    
-    if not file_path.exists():
+async def get_avatar(request: Request, filename: str, size: Optional[int] = None):
+    """Récupérer une photo de profil (?size=64|128|256, 256 par défaut)"""
+    file_path = AvatarService.resolve(filename, size)
+    if file_path is None:
         raise HTTPException(status_code=404, detail="Avatar not found")
     
-    return FileResponse(file_path)
+    # Les fichiers ne sont jamais réécrits (nom unique): cache d'un an
+    stat = file_path.stat()
+    etag = f'"{file_path.stem}-{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    headers = {
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "ETag": etag
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    return FileResponse(file_path, headers=headers)
 
 @router.get("/verify-token")
 async def verify_user_token(request: Request):
     """Vérifier si un token est valide"""
     token = await get_token_from_header(request)
-    print(f"verify-token called with token length: {len(token) if token else 0}")
     if not token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -344,15 +387,14 @@ async def verify_user_token(request: Request):
 @router.get("/test-token")
 async def test_token(authorization: str = None):
     """Endpoint de test pour vérifier l'extraction du token"""
-    print(f"Authorization header: {authorization}")
+    logger.debug("test-token called with Authorization: %s", authorization)
     if authorization and authorization.startswith("Bearer "):
         token = authorization[7:]
-        print(f"Extracted token (length: {len(token)}): {token[:20]}...")
         payload = verify_token(token)
         if payload:
             user_id = payload.get("sub")
             if user_id:
-                user = get_user_by_id(int(user_id))
+                user = await get_user_by_id(int(user_id))
                 return {
                     "token_extracted": True,
                     "token_length": len(token),
@@ -366,15 +408,13 @@ async def test_token(authorization: str = None):
 @router.get("/debug/users")
 async def debug_users():
     """Endpoint de debug pour lister tous les utilisateurs (développement uniquement)"""
-    from app.services.auth import get_user_by_email
-    from app.core.database import get_supabase
+    from app.core.repository import get_user_repository
     
     try:
-        supabase = get_supabase()
-        result = supabase.table("users").select("id, email, plan, is_active").limit(10).execute()
+        users = await get_user_repository().list(limit=10)
         return {
-            "users_count": len(result.data) if result.data else 0,
-            "users": result.data if result.data else []
+            "users_count": len(users),
+            "users": users
         }
     except Exception as e:
         return {"error": str(e)}
@@ -1,97 +1,326 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Query
-from fastapi.responses import FileResponse
+import asyncio
+import hashlib
+import json
+import logging
+import secrets
+from pathlib import Path
+from typing import Optional
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from ..services.upload import UploadService
-from ..services.analysis import FeatureExtractor
+from ..services.blob_store import BlobStore
+from ..services.download import DOWNLOAD_FORMATS, DownloadService, RangeFileResponse
+from ..services.storage_lifecycle import KIND_RENDER, KIND_TRANSCODE, KIND_UPLOAD, StorageLifecycle
+from ..services.resumable_upload import ResumableUploadService
+from ..services.analysis_cache import AnalysisCache
+from ..services.fingerprint import FingerprintService
+from ..services.proxy import ProxyService
 from ..services.audio import AudioProcessor
 from ..services.gemini_ai import GeminiAIService
+from ..services.report_cache import AIReportCache, report_key
+from ..services.ai_scheduler import AIRequestScheduler
+from ..models.user import PlanType
+from ..core.compute import ComputeExecutor
+from ..core.metrics import Metrics
+from ..core.storage import ensure_local, get_storage, publish, storage_key, stored_size
+from .auth import get_optional_user
 from ..services.comparison import ComparisonService
-from ..models.schemas import AnalysisResponse, ProcessRequest, ProcessResponse, AIAnalysisRequest, AIAnalysisResponse, ComparisonRequest, ComparisonResponse
+from ..models.schemas import AnalysisResponse, ProcessRequest, ProcessResponse, AIAnalysisRequest, AIAnalysisResponse, AIBatchAnalysisRequest, AIBatchAnalysisResponse, AIBatchTrackReport, ComparisonRequest, ComparisonResponse, ResumableUploadCreate, ResumableUploadStatus
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+async def _upload_owner(http_request: Request):
+    """Plan et id de l'utilisateur connecté (None pour un visiteur anonyme)"""
+    user = await get_optional_user(http_request)
+    if user is None:
+        return PlanType.FREE, None
+    return user.plan, user.id
+
+def _own_upload(blob_name: str, owner: Optional[int], exclude: str) -> Optional[str]:
+    """Plus ancien upload de l'utilisateur pointant vers un blob (jamais celui d'un autre, ni d'un anonyme)"""
+    if owner is None:
+        return None
+    names = [name for name in BlobStore.filenames_for(blob_name) if name != exclude]
+    owned = StorageLifecycle.owned(KIND_UPLOAD, names, owner)
+    return owned[0] if owned else None
+
+async def _register_upload(filename: str, plan: PlanType, owner: Optional[int]) -> dict:
+    """Réponse d'upload commune (upload direct et upload reprenable)"""
+    file_path = await UploadService.get_file_path(filename)
+    logger.info("File saved: %s -> %s", filename, file_path.name)
+    # Quota du plan (l'upload est supprimé s'il ne rentre pas, d'anciens uploads inactifs peuvent l'être)
+    evicted_uploads = await run_in_threadpool(
+        StorageLifecycle.admit, KIND_UPLOAD, filename, file_path.stat().st_size, owner, plan
+    )
+    # Empreinte audio (indexée par blob): relie les doublons à l'analyse du fichier déjà connu
+    duplicate_of = None
+    related_to = None
+    try:
+        if FingerprintService.is_registered(file_path.name):
+            # Contenu identique à un upload précédent: rien à recalculer
+            canonical = FingerprintService.canonical_name(file_path.name)
+        else:
+            canonical = await run_in_threadpool(FingerprintService.register, file_path)
+        # L'index est commun à tous: seuls les uploads de l'utilisateur sont nommés
+        if canonical is not None:
+            duplicate_of = await run_in_threadpool(_own_upload, canonical, owner, filename)
+        else:
+            # Remix, autre master...: signalé, mais analysé séparément
+            related = FingerprintService.related_name(file_path.name)
+            if related is not None:
+                related_to = await run_in_threadpool(_own_upload, related, owner, filename)
+    except Exception as e:
+        logger.warning("Fingerprint error: %s", e)
+    # Proxy d'analyse et aperçu, générés en arrière-plan (une fois par contenu)
+    ProxyService.schedule(file_path)
+    return {
+        "filename": filename,
+        "message": "File uploaded successfully",
+        "duplicate_of": duplicate_of,
+        "related_to": related_to,
+        "evicted_uploads": evicted_uploads,
+        "media": await run_in_threadpool(UploadService.media_info, filename)
+    }
 
 @router.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(http_request: Request, file: UploadFile = File(...)):
     try:
-        print(f"Received file: {file.filename}")
-        file_path = await UploadService.save_upload(file)
-        print(f"File saved to: {file_path}")
-        return {"filename": file_path.name, "message": "File uploaded successfully"}
+        logger.debug("Received file: %s", file.filename)
+        plan, owner = await _upload_owner(http_request)
+        filename = await UploadService.save_upload(file)
+        return await _register_upload(filename, plan, owner)
     except HTTPException:
         # Re-raise HTTP exceptions (400, 413, etc.) as-is
         raise
     except Exception as e:
-        print(f"Upload error: {str(e)}")
+        logger.error("Upload error: %s", e)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@router.post("/uploads", status_code=201, response_model=ResumableUploadStatus)
+async def create_resumable_upload(request: ResumableUploadCreate, http_request: Request, response: Response):
+    """
+    Ouvre un upload reprenable (gros fichiers, connexions instables)
+
+    Envoyer ensuite les blocs avec PATCH /uploads/{upload_id} (en-tête
+    Upload-Offset), reprendre après une coupure avec HEAD /uploads/{upload_id},
+    puis terminer avec POST /uploads/{upload_id}/complete.
+    """
+    plan, owner = await _upload_owner(http_request)
+    # Nombre de sessions borné par utilisateur, ou par adresse IP pour les visiteurs
+    host = http_request.client.host if http_request.client else "unknown"
+    client = f"user:{owner}" if owner is not None else f"ip:{host}"
+    session = await ResumableUploadService.create(request.filename, request.size, plan, owner, client)
+    response.headers["Location"] = f"/api/uploads/{session['upload_id']}"
+    response.headers["Upload-Offset"] = "0"
+    return session
+
+@router.head("/uploads/{upload_id}")
+async def get_resumable_upload_offset(upload_id: str, http_request: Request):
+    """Offset courant d'un upload reprenable (en-têtes Upload-Offset / Upload-Length)"""
+    _, owner = await _upload_owner(http_request)
+    session = await ResumableUploadService.status(upload_id, owner)
+    return Response(headers={
+        "Upload-Offset": str(session["offset"]),
+        "Upload-Length": str(session["size"]),
+        "Cache-Control": "no-store"
+    })
+
+@router.get("/uploads/{upload_id}", response_model=ResumableUploadStatus)
+async def get_resumable_upload(upload_id: str, http_request: Request):
+    _, owner = await _upload_owner(http_request)
+    return await ResumableUploadService.status(upload_id, owner)
+
+@router.patch("/uploads/{upload_id}", status_code=204)
+async def append_resumable_upload(upload_id: str, http_request: Request):
+    """Ajoute un bloc (corps brut) à l'offset indiqué par l'en-tête Upload-Offset"""
+    try:
+        offset = int(http_request.headers["Upload-Offset"])
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=400, detail="Missing or invalid Upload-Offset header")
+    _, owner = await _upload_owner(http_request)
+    new_offset = await ResumableUploadService.append(upload_id, offset, http_request.stream(), owner)
+    return Response(status_code=204, headers={"Upload-Offset": str(new_offset)})
+
+@router.post("/uploads/{upload_id}/complete")
+async def complete_resumable_upload(upload_id: str, http_request: Request):
+    """Termine un upload reprenable: mêmes validations et même réponse que /upload"""
+    plan, owner = await _upload_owner(http_request)
+    filename = await ResumableUploadService.complete(upload_id, owner)
+    return await _register_upload(filename, plan, owner)
+
+@router.delete("/uploads/{upload_id}", status_code=204)
+async def cancel_resumable_upload(upload_id: str, http_request: Request):
+    _, owner = await _upload_owner(http_request)
+    await ResumableUploadService.cancel(upload_id, owner)
+    return Response(status_code=204)
+
 @router.post("/analyze", response_model=AnalysisResponse)
 async def analyze_audio(filename: str = Query(...)):
     try:
-        print(f"Analyzing file: {filename}")
-        file_path = UploadService.get_file_path(filename)
+        logger.debug("Analyzing file: %s", filename)
+        file_path = await UploadService.get_file_path(filename)
         if not file_path.exists():
             raise HTTPException(status_code=404, detail=f"File not found: {filename}")
-        features = FeatureExtractor.analyze(file_path)
-        print(f"Analysis complete for {filename}")
+        StorageLifecycle.touch(KIND_UPLOAD, filename)
+        # Analyse déjà en cache: pas de place de calcul à réserver
+        features = AnalysisCache.cached_features(file_path)
+        if features is None:
+            async with ComputeExecutor.slot("analyze"):
+                features = await AnalysisCache.get_features(file_path)
+        logger.debug("Analysis complete for %s", filename)
         return AnalysisResponse(filename=filename, features=features)
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Analysis error: {str(e)}")
+        logger.error("Analysis error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/process", response_model=ProcessResponse)
-async def process_audio(request: ProcessRequest):
+async def process_audio(request: ProcessRequest, http_request: Request):
     try:
-        file_path = UploadService.get_file_path(request.filename)
-        output_path = AudioProcessor.process_audio(
-            file_path, 
-            speed=request.speed, 
-            pitch=request.pitch, 
-            nightcore=request.nightcore,
-            reverb=request.reverb,
-            gain=getattr(request, 'gain', 0.0),
-            low_pass=getattr(request, 'low_pass', 20000.0),
-            high_pass=getattr(request, 'high_pass', 20.0),
-            delay=getattr(request, 'delay', 0.0),
-            delay_time=getattr(request, 'delay_time', 250.0),
-            delay_feedback=getattr(request, 'delay_feedback', 0.3),
-            chorus=getattr(request, 'chorus', 0.0),
-            chorus_rate=getattr(request, 'chorus_rate', 1.5),
-            chorus_depth=getattr(request, 'chorus_depth', 0.3),
-            flanger=getattr(request, 'flanger', 0.0),
-            flanger_rate=getattr(request, 'flanger_rate', 0.5),
-            flanger_depth=getattr(request, 'flanger_depth', 0.5),
-            phaser=getattr(request, 'phaser', 0.0),
-            phaser_rate=getattr(request, 'phaser_rate', 0.5),
-            distortion=getattr(request, 'distortion', 0.0),
-            compression=getattr(request, 'compression', 0.0),
-            compression_ratio=getattr(request, 'compression_ratio', 4.0),
-            compression_threshold=getattr(request, 'compression_threshold', -12.0),
-            normalize=getattr(request, 'normalize', False),
-            reverse=getattr(request, 'reverse', False),
-            fade_in=getattr(request, 'fade_in', 0.0),
-            fade_out=getattr(request, 'fade_out', 0.0),
-            pan=getattr(request, 'pan', 0.0),
-            eq_bass=getattr(request, 'eq_bass', 0.0),
-            eq_low_mid=getattr(request, 'eq_low_mid', 0.0),
-            eq_mid=getattr(request, 'eq_mid', 0.0),
-            eq_high_mid=getattr(request, 'eq_high_mid', 0.0),
-            eq_treble=getattr(request, 'eq_treble', 0.0)
+        plan, owner = await _upload_owner(http_request)
+        file_path = await UploadService.get_file_path(request.filename)
+        StorageLifecycle.touch(KIND_UPLOAD, request.filename)
+        # Rendu dans le pool de processus: la boucle d'événements reste disponible
+        async with ComputeExecutor.slot("process"):
+            output_path = await ComputeExecutor.run(
+                AudioProcessor.process_audio,
+                file_path,
+                speed=request.speed, 
+                pitch=request.pitch, 
+                nightcore=request.nightcore,
+                reverb=request.reverb,
+                gain=getattr(request, 'gain', 0.0),
+                low_pass=getattr(request, 'low_pass', 20000.0),
+                high_pass=getattr(request, 'high_pass', 20.0),
+                delay=getattr(request, 'delay', 0.0),
+                delay_time=getattr(request, 'delay_time', 250.0),
+                delay_feedback=getattr(request, 'delay_feedback', 0.3),
+                chorus=getattr(request, 'chorus', 0.0),
+                chorus_rate=getattr(request, 'chorus_rate', 1.5),
+                chorus_depth=getattr(request, 'chorus_depth', 0.3),
+                flanger=getattr(request, 'flanger', 0.0),
+                flanger_rate=getattr(request, 'flanger_rate', 0.5),
+                flanger_depth=getattr(request, 'flanger_depth', 0.5),
+                phaser=getattr(request, 'phaser', 0.0),
+                phaser_rate=getattr(request, 'phaser_rate', 0.5),
+                distortion=getattr(request, 'distortion', 0.0),
+                compression=getattr(request, 'compression', 0.0),
+                compression_ratio=getattr(request, 'compression_ratio', 4.0),
+                compression_threshold=getattr(request, 'compression_threshold', -12.0),
+                normalize=getattr(request, 'normalize', False),
+                reverse=getattr(request, 'reverse', False),
+                fade_in=getattr(request, 'fade_in', 0.0),
+                fade_out=getattr(request, 'fade_out', 0.0),
+                pan=getattr(request, 'pan', 0.0),
+                eq_bass=getattr(request, 'eq_bass', 0.0),
+                eq_low_mid=getattr(request, 'eq_low_mid', 0.0),
+                eq_mid=getattr(request, 'eq_mid', 0.0),
+                eq_high_mid=getattr(request, 'eq_high_mid', 0.0),
+                eq_treble=getattr(request, 'eq_treble', 0.0)
+            )
+        # Quota du plan: les rendus les plus anciens de l'utilisateur, puis ses uploads inactifs, laissent la place
+        evicted_uploads = await run_in_threadpool(
+            StorageLifecycle.admit, KIND_RENDER, output_path.name, output_path.stat().st_size, owner, plan
         )
-        return ProcessResponse(download_url=f"/api/download/{output_path.name}")
+        # Téléchargeable depuis toutes les répliques
+        await run_in_threadpool(publish, output_path)
+        return ProcessResponse(download_url=f"/api/download/{output_path.name}", evicted_uploads=evicted_uploads)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/download/{filename}")
-async def download_file(filename: str):
+@router.api_route("/download/{filename}", methods=["GET", "HEAD"])
+async def download_file(http_request: Request, filename: str, format: Optional[str] = None):
+    """
+    Télécharger un fichier traité ou uploadé
+
+    Format: ?format=wav|flac|ogg, sinon en-tête Accept, sinon format d'origine
+    (conversion mise en cache). Gère Range (lecture avec recherche dans le
+    lecteur), ETag / If-None-Match et If-Range.
+    """
     from ..core.config import settings
-    # Chercher d'abord dans processed, puis dans uploads
+    # Chercher d'abord dans processed, puis dans uploads (ici ou dans le stockage partagé)
     file_path = settings.PROCESSED_DIR / filename
+    kind = KIND_RENDER
+    size = await run_in_threadpool(stored_size, file_path)
+    if size is None:
+        file_path = await run_in_threadpool(UploadService.resolve_path, filename)
+        kind = KIND_UPLOAD
+        size = await run_in_threadpool(stored_size, file_path)
+        if size is None:
+            raise HTTPException(status_code=404, detail="File not found")
+    StorageLifecycle.touch(kind, filename)
+
+    source_format = file_path.suffix.lower().lstrip(".")
+    fmt = DownloadService.negotiate(source_format, format, http_request.headers.get("accept"))
+    etag = f'"{DownloadService.source_key(file_path, size)}-{fmt}"'
+    headers = {
+        # Noms uniques, contenu jamais réécrit
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Vary": "Accept"
+    }
+    if_none_match = http_request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+
     if not file_path.exists():
-        file_path = settings.UPLOAD_DIR / filename
-        if not file_path.exists():
+        # Fichier d'une autre réplique: lien direct vers le stockage (qui gère Range)
+        # ou copie locale si une conversion est nécessaire
+        if fmt == source_format:
+            url = get_storage().presigned_url(storage_key(file_path), filename=f"{Path(filename).stem}.{fmt}")
+            if url is not None:
+                return RedirectResponse(url, status_code=307)
+        if not await run_in_threadpool(ensure_local, file_path):
             raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(file_path, media_type="audio/wav", filename=filename)
+    variant_path = await DownloadService.variant(file_path, fmt)
+    stat_result = variant_path.stat()
+    byte_range = None
+    if_range = http_request.headers.get("if-range")
+    # If-Range: la plage ne vaut que pour la version connue du client
+    if if_range is None or if_range.strip() == etag:
+        byte_range = DownloadService.parse_range(http_request.headers.get("range"), stat_result.st_size)
+    return RangeFileResponse(
+        variant_path,
+        byte_range=byte_range,
+        stat_result=stat_result,
+        headers=headers,
+        media_type=DOWNLOAD_FORMATS.get(fmt, ("application/octet-stream",))[0],
+        filename=f"{Path(filename).stem}.{fmt}"
+    )
+
+@router.api_route("/preview/{filename}", methods=["GET", "HEAD"])
+async def preview_file(http_request: Request, filename: str):
+    """
+    Aperçu d'un upload pour l'écoute (OGG Vorbis mono 22,05 kHz, généré à l'upload)
+
+    Gère Range (lecture avec recherche dans le lecteur).
+    """
+    file_path = await UploadService.get_file_path(filename)
+    try:
+        await ProxyService.ensure(file_path)
+    except Exception as e:
+        logger.warning("Preview error for %s: %s", filename, e)
+        raise HTTPException(status_code=422, detail="Cannot build a preview of this file")
+    preview_path = ProxyService.preview_path(file_path)
+    StorageLifecycle.touch(KIND_TRANSCODE, preview_path.name)
+    stat_result = preview_path.stat()
+    return RangeFileResponse(
+        preview_path,
+        byte_range=DownloadService.parse_range(http_request.headers.get("range"), stat_result.st_size),
+        stat_result=stat_result,
+        headers={
+            # Aperçu d'un contenu qui ne change jamais
+            "Cache-Control": "public, max-age=31536000, immutable",
+            "Accept-Ranges": "bytes"
+        },
+        media_type="audio/ogg"
+    )
 
 @router.post("/compare", response_model=ComparisonResponse)
 async def compare_audio(request: ComparisonRequest):
@@ -100,36 +329,67 @@ async def compare_audio(request: ComparisonRequest):
     """
     try:
         # Récupérer les chemins des fichiers
-        original_path = UploadService.get_file_path(request.original_filename)
-        reference_path = UploadService.get_file_path(request.reference_filename)
+        original_path = await UploadService.get_file_path(request.original_filename)
+        reference_path = await UploadService.get_file_path(request.reference_filename)
         
         if not original_path.exists():
             raise HTTPException(status_code=404, detail=f"Fichier original non trouvé: {request.original_filename}")
         if not reference_path.exists():
             raise HTTPException(status_code=404, detail=f"Fichier de référence non trouvé: {request.reference_filename}")
+        StorageLifecycle.touch(KIND_UPLOAD, request.original_filename)
+        StorageLifecycle.touch(KIND_UPLOAD, request.reference_filename)
         
-        # Analyser les deux fichiers
-        print(f"Analyzing original file: {request.original_filename}")
-        original_features = FeatureExtractor.analyze(original_path)
-        
-        print(f"Analyzing reference file: {request.reference_filename}")
-        reference_features = FeatureExtractor.analyze(reference_path)
+        # Analyser les deux fichiers en parallèle (cache ou pool de calcul)
+        logger.debug("Analyzing files: %s / %s", request.original_filename, request.reference_filename)
+        original_features = AnalysisCache.cached_features(original_path)
+        reference_features = AnalysisCache.cached_features(reference_path)
+        if original_features is None or reference_features is None:
+            async with ComputeExecutor.slot("compare"):
+                original_features, reference_features = await asyncio.gather(
+                    AnalysisCache.get_features(original_path),
+                    AnalysisCache.get_features(reference_path)
+                )
         
         # Comparer les métriques
         comparison_result = ComparisonService.compare_features(original_features, reference_features)
         
-        print(f"Comparison complete. Global score: {comparison_result['global_score']}%")
+        logger.debug("Comparison complete. Global score: %s%%", comparison_result['global_score'])
         
         return ComparisonResponse(**comparison_result)
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Comparison error: {str(e)}")
+        logger.error("Comparison error: %s", e)
         raise HTTPException(status_code=500, detail=f"Erreur lors de la comparaison: {str(e)}")
 
+async def _ai_client(http_request: Request):
+    """Plan et identifiant du demandeur (adresse IP pour les visiteurs anonymes)"""
+    user = await get_optional_user(http_request)
+    if user is not None:
+        return user.plan, f"user:{user.id}"
+    host = http_request.client.host if http_request.client else "unknown"
+    return PlanType.FREE, f"ip:{host}"
+
+async def _generate_report(features: dict, cache_key: str) -> str:
+    """Génère un rapport avec Gemini AI et le met en cache"""
+    # Générer l'analyse avec Gemini AI (sans bloquer la boucle d'événements)
+    try:
+        report = await GeminiAIService.generate_audio_analysis_async(features)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=504,
+            detail="Gemini AI n'a pas répondu dans le délai imparti. Veuillez réessayer."
+        )
+    
+    if not report:
+        # Réponse sans texte (bloquée, vide): message de repli, jamais mis en cache
+        return "Aucune analyse disponible."
+    await run_in_threadpool(AIReportCache.put, cache_key, report)
+    return report
+
 @router.post("/analyze-ai", response_model=AIAnalysisResponse)
-async def analyze_with_ai(request: AIAnalysisRequest):
+async def analyze_with_ai(request: AIAnalysisRequest, http_request: Request):
     """
     Génère un rapport d'analyse audio avec Gemini AI
     """
@@ -142,17 +402,194 @@ async def analyze_with_ai(request: AIAnalysisRequest):
                 detail="GEMINI_API_KEY n'est pas configurée. Veuillez définir la variable d'environnement GEMINI_API_KEY."
             )
         
-        # Générer l'analyse avec Gemini AI
-        report = GeminiAIService.generate_audio_analysis(request.features)
+        # Rapport déjà généré pour des métriques équivalentes
+        cache_key = report_key(request.features)
+        report = AIReportCache.get(cache_key)
+        if report is not None:
+            return AIAnalysisResponse(report=report, source="gemini-ai-cache")
         
-        # S'assurer que report est une string
-        if not isinstance(report, str):
-            report = str(report) if report else "Erreur: L'analyse n'a pas pu être générée."
+        # Budget du client selon son plan, fusion des requêtes identiques
+        plan, client_id = await _ai_client(http_request)
+        cost = AIRequestScheduler.estimate_tokens(GeminiAIService.build_prompt(request.features))
+        report = await AIRequestScheduler.run(
+            cache_key, plan, client_id, cost,
+            lambda: _generate_report(request.features, cache_key)
+        )
         
         return AIAnalysisResponse(report=report, source="gemini-ai")
     except HTTPException:
         raise
     except Exception as e:
-        print(f"AI Analysis error: {str(e)}")
+        logger.error("AI Analysis error: %s", e)
         error_message = str(e) if e else "Erreur inconnue"
         raise HTTPException(status_code=500, detail=f"Erreur lors de la génération de l'analyse IA: {error_message}")
+
+@router.post("/analyze-ai/batch", response_model=AIBatchAnalysisResponse)
+async def analyze_batch_with_ai(request: AIBatchAnalysisRequest, http_request: Request):
+    """
+    Génère les rapports de plusieurs morceaux (EP, album) en un seul appel à Gemini AI
+    
+    Les consignes ne sont envoyées qu'une fois avec un tableau compact des
+    métriques; les rapports déjà en cache ne sont pas regénérés.
+    """
+    try:
+        from ..core.config import settings
+        if not settings.GEMINI_API_KEY:
+            raise HTTPException(
+                status_code=500, 
+                detail="GEMINI_API_KEY n'est pas configurée. Veuillez définir la variable d'environnement GEMINI_API_KEY."
+            )
+        tracks = request.tracks
+        if not tracks or len(tracks) > settings.AI_BATCH_MAX_TRACKS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Le nombre de morceaux doit être compris entre 1 et {settings.AI_BATCH_MAX_TRACKS}"
+            )
+        
+        names = [track.name or f"Morceau {index}" for index, track in enumerate(tracks, start=1)]
+        cache_keys = [report_key(track.features) for track in tracks]
+        reports = {}
+        sources = {}
+        for cache_key in cache_keys:
+            cached_report = AIReportCache.get(cache_key)
+            if cached_report is not None:
+                reports[cache_key] = cached_report
+                sources[cache_key] = "gemini-ai-cache"
+        
+        # Morceaux à générer (les métriques identiques ne sont envoyées qu'une fois)
+        missing = {}
+        for index, cache_key in enumerate(cache_keys):
+            if cache_key not in reports and cache_key not in missing:
+                missing[cache_key] = index
+        
+        if missing:
+            plan, client_id = await _ai_client(http_request)
+            batch_names = [names[index] for index in missing.values()]
+            batch_features = [tracks[index].features for index in missing.values()]
+            
+            async def generate_batch():
+                try:
+                    parts = await GeminiAIService.generate_batch_analysis_async(batch_names, batch_features)
+                except asyncio.TimeoutError:
+                    raise HTTPException(
+                        status_code=504,
+                        detail="Gemini AI n'a pas répondu dans le délai imparti. Veuillez réessayer."
+                    )
+                for cache_key, part in zip(missing, parts):
+                    if part:
+                        await run_in_threadpool(AIReportCache.put, cache_key, part)
+                return parts
+            
+            prompt = GeminiAIService.build_batch_prompt(batch_names, batch_features)
+            cost = AIRequestScheduler.estimate_tokens(prompt, reports=len(missing))
+            batch_key = "batch:" + hashlib.sha256(",".join(missing).encode("utf-8")).hexdigest()
+            parts = await AIRequestScheduler.run(batch_key, plan, client_id, cost, generate_batch)
+            
+            for (cache_key, index), part in zip(missing.items(), parts):
+                if part is None:
+                    # Morceau absent de la réponse groupée: génération individuelle
+                    features = tracks[index].features
+                    single_cost = AIRequestScheduler.estimate_tokens(GeminiAIService.build_prompt(features))
+                    part = await AIRequestScheduler.run(
+                        cache_key, plan, client_id, single_cost,
+                        lambda features=features, cache_key=cache_key: _generate_report(features, cache_key)
+                    )
+                reports[cache_key] = part
+                sources[cache_key] = "gemini-ai"
+        
+        return AIBatchAnalysisResponse(reports=[
+            AIBatchTrackReport(name=name, report=reports[cache_key], source=sources[cache_key])
+            for name, cache_key in zip(names, cache_keys)
+        ])
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("AI Batch Analysis error: %s", e)
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la génération des analyses IA: {str(e)}")
+
+def _sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Formate un événement Server-Sent Events"""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/analyze-ai/stream")
+async def analyze_with_ai_stream(request: AIAnalysisRequest, http_request: Request):
+    """
+    Génère un rapport d'analyse audio avec Gemini AI, envoyé au fil de l'eau (SSE)
+    
+    Événements: "message" ({"text": fragment}) puis "done" ({"source": ...}),
+    ou "error" ({"detail": ...}) si la génération échoue.
+    """
+    from ..core.config import settings
+    if not settings.GEMINI_API_KEY:
+        raise HTTPException(
+            status_code=500, 
+            detail="GEMINI_API_KEY n'est pas configurée. Veuillez définir la variable d'environnement GEMINI_API_KEY."
+        )
+    
+    features = request.features
+    cache_key = report_key(features)
+    cached_report = AIReportCache.get(cache_key)
+    
+    if cached_report is None:
+        # Même budget par client que /analyze-ai (pas de fusion: chaque flux est propre au client)
+        plan, client_id = await _ai_client(http_request)
+        cost = AIRequestScheduler.estimate_tokens(GeminiAIService.build_prompt(features))
+        await AIRequestScheduler.acquire(plan, client_id, cost)
+    
+    def event_stream():
+        if cached_report is not None:
+            yield _sse_event({"text": cached_report})
+            yield _sse_event({"source": "gemini-ai-cache"}, event="done")
+            return
+        
+        chunks = []
+        try:
+            for text in GeminiAIService.stream_audio_analysis(features):
+                chunks.append(text)
+                yield _sse_event({"text": text})
+        except Exception as e:
+            logger.error("AI Analysis stream error: %s", e)
+            yield _sse_event({"detail": f"Erreur lors de la génération de l'analyse IA: {str(e)}"}, event="error")
+            return
+        
+        # Rapport complet: le mettre en cache pour les prochaines demandes
+        report = "".join(chunks)
+        if report:
+            AIReportCache.put(cache_key, report)
+        yield _sse_event({"source": "gemini-ai"}, event="done")
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/storage/usage")
+async def get_storage_usage(http_request: Request):
+    """Espace disque utilisé par l'utilisateur connecté et quota de son plan"""
+    user = await get_optional_user(http_request)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    used = await run_in_threadpool(StorageLifecycle.usage, user.id)
+    quota = StorageLifecycle.quota(user.plan)
+    # Quota nul ou non configuré: pas de ratio
+    used_ratio = round(used / quota, 4) if quota > 0 else None
+    return {"used_bytes": used, "quota_bytes": quota, "used_ratio": used_ratio}
+
+@router.get("/metrics")
+async def get_metrics(http_request: Request):
+    """
+    Métriques internes du processus (files d'attente, temps de calcul)
+
+    Réservées au monitoring: en-tête "Authorization: Bearer <METRICS_TOKEN>".
+    Sans METRICS_TOKEN configuré, l'endpoint répond 404.
+    """
+    from ..core.config import settings
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    header = http_request.headers.get("Authorization", "")
+    token = header[7:].strip() if header.startswith("Bearer ") else ""
+    if not secrets.compare_digest(token.encode("utf-8"), settings.METRICS_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+    return Metrics.snapshot()
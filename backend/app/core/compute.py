@@ -0,0 +1,214 @@
+import asyncio
+import importlib
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from fastapi import HTTPException, status
+
+from .config import settings
+from .metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+
+def parse_limits(spec: str) -> Dict[str, int]:
+    """Limites par endpoint au format "analyze=4,process=2" """
+    limits = {}
+    for item in spec.split(","):
+        name, _, value = item.strip().partition("=")
+        if name and value.strip().isdigit():
+            limits[name.strip()] = max(1, int(value))
+    return limits
+
+
+class SharedArray:
+    """Référence (picklable) vers un tableau numpy placé en mémoire partagée"""
+
+    def __init__(self, name: str, shape: Tuple[int, ...], dtype: str):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+
+def _share(value: Any, segments: List[SharedMemory]) -> Any:
+    """Copie un grand tableau en mémoire partagée (les autres valeurs sont picklées telles quelles)"""
+    if not isinstance(value, np.ndarray) or value.nbytes < settings.COMPUTE_SHM_MIN_BYTES:
+        return value
+    segment = SharedMemory(create=True, size=value.nbytes)
+    segments.append(segment)
+    np.ndarray(value.shape, dtype=value.dtype, buffer=segment.buf)[...] = value
+    return SharedArray(segment.name, value.shape, value.dtype.str)
+
+
+def _attach(value: Any, segments: List[SharedMemory]) -> Any:
+    """Côté processus: vue sur le tableau partagé (sans copie)"""
+    if not isinstance(value, SharedArray):
+        return value
+    # Le segment reste la propriété du processus serveur, qui le supprime
+    segment = SharedMemory(name=value.name)
+    segments.append(segment)
+    return np.ndarray(value.shape, dtype=value.dtype, buffer=segment.buf)
+
+
+def _call(func: Callable, args: Sequence, kwargs: Dict) -> Tuple[Any, Tuple]:
+    """
+    Point d'entrée dans un processus du pool
+
+    Returns:
+        (résultat, métriques enregistrées pendant l'appel: voir Metrics.drain)
+    """
+    segments: List[SharedMemory] = []
+    try:
+        result = func(
+            *[_attach(arg, segments) for arg in args],
+            **{name: _attach(value, segments) for name, value in kwargs.items()}
+        )
+        return result, Metrics.drain()
+    finally:
+        for segment in segments:
+            try:
+                segment.close()
+            except BufferError:
+                # Vue encore référencée (par la trace d'une exception): fermée avec le processus
+                pass
+
+
+def _preload(modules: Sequence[str]):
+    """Initialisation d'un processus: importe les modules de calcul une fois pour toutes"""
+    for module in modules:
+        importlib.import_module(module)
+
+
+class ComputeExecutor:
+    """
+    Calculs lourds (analyse, rendu, comparaison) hors du processus serveur.
+
+    - pool de processus partagé, COMPUTE_WORKERS_PER_CORE processus par cœur:
+      la boucle d'événements (et le health check) reste libre pendant un rendu
+    - les grands tableaux numpy passent par la mémoire partagée au lieu
+      d'être picklés (voir COMPUTE_SHM_MIN_BYTES)
+    - admission par endpoint (`slot`): nombre de requêtes simultanées,
+      file d'attente bornée et délai d'attente maximal; au-delà, 503 avec
+      Retry-After plutôt qu'une requête qui attend indéfiniment
+    """
+
+    _pool: Optional[ProcessPoolExecutor] = None
+    _preload_modules: Tuple[str, ...] = ()
+    _limits = parse_limits(settings.COMPUTE_LIMITS)
+    _semaphores: Dict[str, asyncio.Semaphore] = {}
+    _waiting: Dict[str, int] = {}
+
+    @staticmethod
+    def worker_count() -> int:
+        return max(1, round((os.cpu_count() or 1) * settings.COMPUTE_WORKERS_PER_CORE))
+
+    @classmethod
+    def _get_pool(cls) -> ProcessPoolExecutor:
+        if cls._pool is None:
+            # forkserver: pas de fork d'un processus qui a déjà des threads (pools, logs)
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            cls._pool = ProcessPoolExecutor(
+                max_workers=cls.worker_count(),
+                mp_context=context,
+                initializer=_preload,
+                initargs=(cls._preload_modules,)
+            )
+        return cls._pool
+
+    @classmethod
+    def start(cls, preload: Sequence[str] = ()):
+        """Crée le pool (au démarrage); `preload`: modules importés par chaque processus"""
+        cls._preload_modules = tuple(preload)
+        cls._get_pool()
+        logger.info("Pool de calcul: %d processus", cls.worker_count())
+
+    @classmethod
+    def stop(cls):
+        if cls._pool is not None:
+            cls._pool.shutdown(wait=False, cancel_futures=True)
+            cls._pool = None
+
+    @classmethod
+    def _semaphore(cls, endpoint: str) -> asyncio.Semaphore:
+        semaphore = cls._semaphores.get(endpoint)
+        if semaphore is None:
+            limit = cls._limits.get(endpoint, settings.COMPUTE_DEFAULT_LIMIT)
+            semaphore = cls._semaphores[endpoint] = asyncio.Semaphore(limit)
+        return semaphore
+
+    @staticmethod
+    def _saturated(endpoint: str) -> HTTPException:
+        Metrics.increment(f"compute.{endpoint}.rejected")
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy, please retry shortly",
+            headers={"Retry-After": str(settings.COMPUTE_RETRY_AFTER)}
+        )
+
+    @classmethod
+    @asynccontextmanager
+    async def slot(cls, endpoint: str) -> AsyncIterator[None]:
+        """
+        Réserve une place de calcul pour une requête de l'endpoint
+
+        Raises:
+            HTTPException 503: file d'attente pleine ou attente trop longue
+        """
+        semaphore = cls._semaphore(endpoint)
+        waiting = cls._waiting.get(endpoint, 0)
+        if semaphore.locked() and waiting >= settings.COMPUTE_MAX_QUEUE:
+            raise cls._saturated(endpoint)
+
+        submitted_at = time.perf_counter()
+        cls._waiting[endpoint] = waiting + 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=settings.COMPUTE_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise cls._saturated(endpoint)
+        finally:
+            cls._waiting[endpoint] -= 1
+        Metrics.observe(f"compute.{endpoint}.queue_seconds", time.perf_counter() - submitted_at)
+        try:
+            yield
+        finally:
+            semaphore.release()
+            Metrics.observe(f"compute.{endpoint}.total_seconds", time.perf_counter() - submitted_at)
+
+    @classmethod
+    async def run(cls, func: Callable, *args, **kwargs) -> Any:
+        """
+        Exécute func(*args, **kwargs) dans le pool de processus
+
+        `func` doit être importable (fonction de module ou méthode statique);
+        le résultat est picklé vers le processus serveur, avec les métriques
+        enregistrées par le processus (décodage audio...).
+        """
+        segments: List[SharedMemory] = []
+        try:
+            shared_args = [_share(arg, segments) for arg in args]
+            shared_kwargs = {name: _share(value, segments) for name, value in kwargs.items()}
+            future = cls._get_pool().submit(_call, func, shared_args, shared_kwargs)
+            result, metrics = await asyncio.wrap_future(future)
+            Metrics.merge(*metrics)
+            return result
+        except BrokenProcessPool:
+            # Processus tué (mémoire, plantage d'une bibliothèque native): repartir d'un pool neuf
+            logger.error("Pool de calcul cassé, recréé (%s)", getattr(func, "__qualname__", func))
+            Metrics.increment("compute.pool_restarts")
+            cls.stop()
+            raise
+        finally:
+            # Calcul terminé, ou annulé: un processus qui a déjà ouvert le segment
+            # le garde jusqu'à sa fermeture
+            for segment in segments:
+                segment.close()
+                segment.unlink()
@@ -1,5 +1,6 @@
 import os
 from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
 
 # Charger les variables d'environnement depuis le fichier .env
@@ -34,11 +35,34 @@ class Settings:
     # Clé anonyme Supabase (service_role key pour les opérations serveur)
     SUPABASE_KEY: str = os.getenv("SUPABASE_KEY", "")
     
+    # Base des utilisateurs: "supabase" (PostgREST) ou "sqlite" (fichier local,
+    # pour les benchmarks et le développement sans Supabase)
+    DB_BACKEND: str = os.getenv("DB_BACKEND", "supabase")
+    SQLITE_DB_PATH: Path = Path(os.getenv("SQLITE_DB_PATH", str(BASE_DIR / "brainwave.db")))
+    # Délai maximal par requête (secondes) et connexions gardées ouvertes vers PostgREST
+    DB_TIMEOUT: float = float(os.getenv("DB_TIMEOUT", "5"))
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "20"))
+    
     # Uploads directory
     UPLOAD_DIR: Path = BASE_DIR / "uploads"
     PROCESSED_DIR: Path = BASE_DIR / "processed"
     
     def __init__(self):
+        if self.DB_BACKEND == "supabase":
+            self._check_supabase()
+        
+        # Ensure directories exist
+        self.UPLOAD_DIR.mkdir(exist_ok=True)
+        self.PROCESSED_DIR.mkdir(exist_ok=True)
+        self.CACHE_DIR.mkdir(exist_ok=True)
+        self.USER_CACHE_DIR.mkdir(exist_ok=True)
+        self.TOKEN_REVOCATION_DIR.mkdir(exist_ok=True)
+        self.TRANSCODE_CACHE_DIR.mkdir(exist_ok=True)
+        (self.UPLOAD_DIR / "avatars").mkdir(exist_ok=True)
+        self.UPLOAD_TMP_DIR.mkdir(exist_ok=True)
+        self.BLOB_DIR.mkdir(exist_ok=True)
+    
+    def _check_supabase(self):
         # Vérifier que SUPABASE_URL est définie
         if not self.SUPABASE_URL:
             env_path_str = str(ENV_PATH)
@@ -67,20 +91,143 @@ class Settings:
                 f"   Format attendu: https://xxx.supabase.co\n"
                 f"   Reçu: {self.SUPABASE_URL[:50]}..."
             )
-        
-        # Ensure directories exist
-        self.UPLOAD_DIR.mkdir(exist_ok=True)
-        self.PROCESSED_DIR.mkdir(exist_ok=True)
-        (self.UPLOAD_DIR / "avatars").mkdir(exist_ok=True)
+    
+    # Logs (voir app/core/log.py): niveau global, niveaux par module
+    # ("app.services.auth=DEBUG,app.api=WARNING"), format "text" ou "json"
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_LEVELS: str = os.getenv("LOG_LEVELS", "")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text")
+    # Fraction des messages DEBUG conservés (volumineux sur les chemins chauds)
+    LOG_DEBUG_SAMPLE_RATE: float = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1"))
     
     ALLOWED_EXTENSIONS: set = {"mp3", "wav", "ogg", "flac"}
     MAX_UPLOAD_SIZE: int = 50 * 1024 * 1024  # 50 MB
-    
+    # Durée maximale d'un fichier audio (secondes), lue dans l'en-tête à l'upload
+    MAX_AUDIO_DURATION: float = float(os.getenv("MAX_AUDIO_DURATION", "3600"))
+    # Rééchantillonneur par défaut de AudioLoader (soxr_vhq/hq/mq/lq/qq, polyphase...)
+    AUDIO_RESAMPLE_TYPE: str = os.getenv("AUDIO_RESAMPLE_TYPE", "soxr_hq")
+    # Uploads: copie par blocs vers un fichier temporaire, renommé une fois complet
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+    UPLOAD_TMP_DIR: Path = UPLOAD_DIR / ".incoming"
+    # Stockage par contenu: un fichier par SHA-256, index des noms et références
+    BLOB_DIR: Path = UPLOAD_DIR / "blobs"
+    BLOB_DB: Path = BASE_DIR / "blobs.db"
+    # Sessions d'upload reprenables (limites par plan: services/resumable_upload.py)
+    RESUMABLE_UPLOAD_TTL: int = int(os.getenv("RESUMABLE_UPLOAD_TTL", str(24 * 3600)))
+    # Sessions ouvertes en même temps par un client (utilisateur ou adresse IP)
+    RESUMABLE_MAX_SESSIONS: int = int(os.getenv("RESUMABLE_MAX_SESSIONS", "5"))
+
+    # Analyse audio
+    # Nombre de threads chargeant les signaux à analyser (calcul: pool de processus, voir COMPUTE_*)
+    ANALYSIS_WORKERS: int = int(os.getenv("ANALYSIS_WORKERS", "2"))
+    # Nombre maximum de résultats d'analyse gardés en mémoire
+    ANALYSIS_CACHE_SIZE: int = int(os.getenv("ANALYSIS_CACHE_SIZE", "256"))
+    # Index des empreintes audio (détection des doublons à l'upload)
+    FINGERPRINT_DB: Path = BASE_DIR / "fingerprints.db"
+
+    # Calculs lourds (analyse, rendu, comparaison): pool de processus partagé
+    # Processus par cœur (0.5: un pour deux cœurs), au moins un
+    COMPUTE_WORKERS_PER_CORE: float = float(os.getenv("COMPUTE_WORKERS_PER_CORE", "1"))
+    # Requêtes simultanées par endpoint ("analyze=4,process=2"), COMPUTE_DEFAULT_LIMIT pour les autres
+    COMPUTE_LIMITS: str = os.getenv("COMPUTE_LIMITS", "analyze=4,process=2,compare=2")
+    COMPUTE_DEFAULT_LIMIT: int = int(os.getenv("COMPUTE_DEFAULT_LIMIT", "2"))
+    # Requêtes en attente par endpoint et attente maximale (secondes): au-delà, 503 + Retry-After
+    COMPUTE_MAX_QUEUE: int = int(os.getenv("COMPUTE_MAX_QUEUE", "16"))
+    COMPUTE_QUEUE_TIMEOUT: float = float(os.getenv("COMPUTE_QUEUE_TIMEOUT", "10"))
+    COMPUTE_RETRY_AFTER: int = int(os.getenv("COMPUTE_RETRY_AFTER", "5"))
+    # Tableaux numpy transmis aux processus par mémoire partagée à partir de cette taille (octets)
+    COMPUTE_SHM_MIN_BYTES: int = int(os.getenv("COMPUTE_SHM_MIN_BYTES", str(64 * 1024)))
+
     # Gemini AI Configuration
     # Charge depuis .env ou variable d'environnement système
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
+    # URL alternative de l'API Gemini (vide = API Google), ex: faux serveur local
+    GEMINI_BASE_URL: str = os.getenv("GEMINI_BASE_URL", "")
+    # Durée de validité du catalogue des modèles Gemini (secondes)
+    GEMINI_MODELS_TTL: int = int(os.getenv("GEMINI_MODELS_TTL", "3600"))
+    # Délai maximal d'une génération, délai avant requête de secours (secondes)
+    GEMINI_DEADLINE: float = float(os.getenv("GEMINI_DEADLINE", "60"))
+    GEMINI_HEDGE_DELAY: float = float(os.getenv("GEMINI_HEDGE_DELAY", "8"))
+    # Analyses groupées (EP, album): délai maximal et nombre de morceaux par requête
+    GEMINI_BATCH_DEADLINE: float = float(os.getenv("GEMINI_BATCH_DEADLINE", "180"))
+    AI_BATCH_MAX_TRACKS: int = int(os.getenv("AI_BATCH_MAX_TRACKS", "10"))
+    # Requêtes simultanées vers Gemini: par génération / pour tout le processus
+    GEMINI_MAX_HEDGED_REQUESTS: int = int(os.getenv("GEMINI_MAX_HEDGED_REQUESTS", "2"))
+    GEMINI_MAX_CONCURRENCY: int = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+    # Ordonnancement des analyses IA (budget de chaque client selon son plan: voir services/ai_scheduler.py)
+    AI_OUTPUT_TOKENS_ESTIMATE: int = int(os.getenv("AI_OUTPUT_TOKENS_ESTIMATE", "1000"))
+    AI_QUEUE_TIMEOUT: float = float(os.getenv("AI_QUEUE_TIMEOUT", "30"))
+    AI_MAX_QUEUE_SIZE: int = int(os.getenv("AI_MAX_QUEUE_SIZE", "100"))
+    AI_BUDGET_SCALE: float = float(os.getenv("AI_BUDGET_SCALE", "1"))
+    # Débit maximal envoyé à Gemini, tous clients confondus (limites du projet Gemini)
+    AI_GLOBAL_REQUESTS_PER_MINUTE: int = int(os.getenv("AI_GLOBAL_REQUESTS_PER_MINUTE", "60"))
+    AI_GLOBAL_TOKENS_PER_MINUTE: int = int(os.getenv("AI_GLOBAL_TOKENS_PER_MINUTE", "1000000"))
+    # Cache des rapports IA (persisté sur disque)
+    CACHE_DIR: Path = BASE_DIR / "cache"
+    AI_REPORT_CACHE_DB: Path = CACHE_DIR / "ai_reports.db"
+    AI_REPORT_CACHE_TTL: int = int(os.getenv("AI_REPORT_CACHE_TTL", str(30 * 24 * 3600)))
+    AI_REPORT_CACHE_SIZE: int = int(os.getenv("AI_REPORT_CACHE_SIZE", "1000"))
+
+    # Stockage partagé entre répliques: "local" (disque), "s3" (S3, MinIO...) ou "memory" (tests)
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "local")
+    # Répertoire du stockage "local" (vide = BASE_DIR, les fichiers restent en place)
+    STORAGE_LOCAL_ROOT: Optional[Path] = Path(os.environ["STORAGE_LOCAL_ROOT"]) if os.getenv("STORAGE_LOCAL_ROOT") else None
+    S3_ENDPOINT_URL: str = os.getenv("S3_ENDPOINT_URL", "https://s3.amazonaws.com")
+    S3_BUCKET: str = os.getenv("S3_BUCKET", "")
+    S3_REGION: str = os.getenv("S3_REGION", "us-east-1")
+    S3_ACCESS_KEY_ID: str = os.getenv("S3_ACCESS_KEY_ID", "")
+    S3_SECRET_ACCESS_KEY: str = os.getenv("S3_SECRET_ACCESS_KEY", "")
+    # Durée de validité des liens de téléchargement direct (secondes)
+    S3_PRESIGN_TTL: int = int(os.getenv("S3_PRESIGN_TTL", "3600"))
+    STORAGE_TIMEOUT: float = float(os.getenv("STORAGE_TIMEOUT", "30"))
+    STORAGE_POOL_SIZE: int = int(os.getenv("STORAGE_POOL_SIZE", "20"))
+
+    # Cycle de vie du stockage (quotas par plan: services/storage_lifecycle.py)
+    STORAGE_DB: Path = BASE_DIR / "storage.db"
+    # Budget disque global et seuils d'éviction (fractions du budget)
+    STORAGE_MAX_BYTES: int = int(os.getenv("STORAGE_MAX_BYTES", str(20 * 1024 ** 3)))
+    STORAGE_HIGH_WATER: float = float(os.getenv("STORAGE_HIGH_WATER", "0.9"))
+    STORAGE_LOW_WATER: float = float(os.getenv("STORAGE_LOW_WATER", "0.8"))
+    # Rendus/conversions inutilisés supprimés après ce délai; uploads évincés seulement si inactifs depuis
+    STORAGE_RENDER_TTL: int = int(os.getenv("STORAGE_RENDER_TTL", str(3 * 24 * 3600)))
+    STORAGE_UPLOAD_MIN_IDLE: int = int(os.getenv("STORAGE_UPLOAD_MIN_IDLE", str(30 * 24 * 3600)))
+    STORAGE_SWEEP_INTERVAL: float = float(os.getenv("STORAGE_SWEEP_INTERVAL", "300"))
+    # Visiteurs anonymes: espace commun à tous leurs fichiers, uploads supprimés après ce délai d'inactivité
+    STORAGE_ANONYMOUS_QUOTA: int = int(os.getenv("STORAGE_ANONYMOUS_QUOTA", str(2 * 1024 ** 3)))
+    STORAGE_ANONYMOUS_UPLOAD_TTL: int = int(os.getenv("STORAGE_ANONYMOUS_UPLOAD_TTL", str(24 * 3600)))
+
+    # Téléchargements convertis (FLAC, OGG) gardés sur disque, threads de conversion
+    TRANSCODE_CACHE_DIR: Path = CACHE_DIR / "transcoded"
+    TRANSCODE_WORKERS: int = int(os.getenv("TRANSCODE_WORKERS", "2"))
+    # Threads générant les proxies d'analyse et les aperçus à l'upload
+    PROXY_WORKERS: int = int(os.getenv("PROXY_WORKERS", "1"))
+
+    # Cache des utilisateurs authentifiés (évite une requête Supabase par appel)
+    USER_CACHE_TTL: int = int(os.getenv("USER_CACHE_TTL", "60"))
+    USER_CACHE_SIZE: int = int(os.getenv("USER_CACHE_SIZE", "10000"))
+    # Invalidation entre workers par fichiers marqueurs (un par utilisateur modifié)
+    USER_CACHE_SHARED_INVALIDATION: bool = os.getenv("USER_CACHE_SHARED_INVALIDATION", "true").lower() == "true"
+    USER_CACHE_DIR: Path = CACHE_DIR / "user_invalidations"
+    # Hachage des mots de passe (bcrypt): threads dédiés et calculs en attente max.
+    # Au-delà, les connexions reçoivent un 503 au lieu de geler les autres endpoints
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_MAX_QUEUE: int = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
     
+    # Jeton du monitoring pour GET /api/metrics (vide: endpoint désactivé)
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")
+
     # JWT Secret Key (OBLIGATOIRE)
     SECRET_KEY: str = os.getenv("SECRET_KEY", "")
+    # "lookup": token d'accès long, utilisateur relu (cache) à chaque requête
+    # "stateless": token d'accès court avec plan/état/version, sans accès base
+    AUTH_MODE: str = os.getenv("AUTH_MODE", "lookup")
+    ACCESS_TOKEN_TTL_MINUTES: int = int(os.getenv("ACCESS_TOKEN_TTL_MINUTES", "15"))
+    REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+    # Révocations de tokens, un fichier par utilisateur (partagées entre workers et
+    # conservées au redémarrage: hors de CACHE_DIR, à ne pas vider)
+    TOKEN_REVOCATION_DIR: Path = BASE_DIR / "token_revocations"
+    # Durée de vie en mémoire d'une version de token lue sur disque (secondes):
+    # délai maximal avant qu'une révocation faite par un autre worker soit vue
+    TOKEN_VERSION_CACHE_TTL: float = float(os.getenv("TOKEN_VERSION_CACHE_TTL", "5"))
 
 settings = Settings()
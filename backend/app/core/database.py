@@ -1,10 +1,12 @@
+from typing import Optional
 from supabase import create_client, Client
 from app.core.config import settings
 
-# Créer le client Supabase
-supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
-
-print(f"✅ Client Supabase configuré (URL: {settings.SUPABASE_URL[:30]}...)")
+# Créer le client Supabase (les requêtes des services passent par app/core/repository.py)
+supabase: Optional[Client] = None
+if settings.DB_BACKEND == "supabase":
+    supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+    print(f"✅ Client Supabase configuré (URL: {settings.SUPABASE_URL[:30]}...)")
 
 # Fonction pour obtenir le client Supabase
 def get_supabase() -> Client:
@@ -15,6 +17,12 @@ def get_supabase() -> Client:
 # Note: Avec Supabase, les tables sont généralement créées via le dashboard ou migrations
 def init_db():
     """Initialise la base de données Supabase"""
+    if settings.DB_BACKEND == "sqlite":
+        # La table users est créée à l'ouverture du fichier
+        from app.core.repository import get_user_repository
+        get_user_repository()
+        print(f"✅ Base SQLite locale: {settings.SQLITE_DB_PATH}")
+        return
     try:
         # Tester la connexion en faisant une requête simple
         # Vérifier si la table users existe
@@ -0,0 +1,109 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+from typing import Dict, Optional
+
+from app.core.config import settings
+
+# Secrets à masquer dans les messages: JWT, en-têtes Bearer, champs sensibles
+_JWT_RE = re.compile(r"eyJ[\w-]+\.[\w-]+\.[\w-]*")
+_BEARER_RE = re.compile(r"(Bearer\s+)\S+", re.IGNORECASE)
+_SECRET_FIELD_RE = re.compile(
+    r"""(['"]?(?:access_token|refresh_token|password|hashed_password|old_password|new_password|api_key|apikey)['"]?\s*[:=]\s*)(['"]?)[^'",}\s]+\2""",
+    re.IGNORECASE
+)
+REDACTED = "[REDACTED]"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def redact(text: str) -> str:
+    """Masque les tokens et mots de passe d'un message"""
+    text = _JWT_RE.sub(REDACTED, text)
+    text = _BEARER_RE.sub(r"\1" + REDACTED, text)
+    return _SECRET_FIELD_RE.sub(r"\1\2" + REDACTED + r"\2", text)
+
+
+class RedactingQueueHandler(logging.handlers.QueueHandler):
+    """Met les messages en file après les avoir formatés et masqués (trace comprise)"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        record.msg = redact(record.msg)
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """Ne garde qu'une fraction des messages DEBUG (LOG_DEBUG_SAMPLE_RATE)"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class JSONFormatter(logging.Formatter):
+    """Une ligne JSON par message (LOG_FORMAT=json)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """"app.services.auth=DEBUG,app.api=WARNING" -> {module: niveau}"""
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging():
+    """
+    Configure les logs de l'application (logger "app"), une seule fois.
+
+    Les appelants ne font que filtrer, masquer et mettre le message en file;
+    l'écriture sur la sortie standard se fait dans le thread du
+    QueueListener, hors du chemin des requêtes.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    if settings.LOG_FORMAT == "json":
+        formatter: logging.Formatter = JSONFormatter()
+    else:
+        formatter = logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    queue_handler = RedactingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(settings.LOG_DEBUG_SAMPLE_RATE))
+
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(settings.LOG_LEVEL.upper())
+    app_logger.addHandler(queue_handler)
+    app_logger.propagate = False
+    for name, level in parse_levels(settings.LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
@@ -0,0 +1,102 @@
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+
+
+class _Summary:
+    """Compteur, somme, maximum et fenêtre des dernières valeurs (percentiles)"""
+
+    WINDOW = 1024
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent: Deque[float] = deque(maxlen=self.WINDOW)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.recent.append(value)
+
+    def snapshot(self) -> Dict:
+        ordered = sorted(self.recent)
+
+        def percentile(pct: float) -> float:
+            if not ordered:
+                return 0.0
+            return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": percentile(50),
+            "p90": percentile(90),
+            "p99": percentile(99),
+            "max": self.max,
+        }
+
+
+class Metrics:
+    """
+    Métriques internes du processus (exposées par GET /api/metrics, avec METRICS_TOKEN).
+
+    - compteurs: incrémentés par `increment`
+    - jauges: dernière valeur fixée par `set_gauge`
+    - résumés: durées ou tailles observées par `observe`
+    """
+
+    _lock = threading.Lock()
+    _counters: Dict[str, float] = {}
+    _gauges: Dict[str, float] = {}
+    _summaries: Dict[str, _Summary] = {}
+
+    @classmethod
+    def increment(cls, name: str, amount: float = 1):
+        with cls._lock:
+            cls._counters[name] = cls._counters.get(name, 0) + amount
+
+    @classmethod
+    def set_gauge(cls, name: str, value: float):
+        with cls._lock:
+            cls._gauges[name] = value
+
+    @classmethod
+    def observe(cls, name: str, value: float):
+        with cls._lock:
+            summary = cls._summaries.get(name)
+            if summary is None:
+                summary = cls._summaries[name] = _Summary()
+            summary.observe(value)
+
+    @classmethod
+    def drain(cls) -> Tuple[Dict[str, float], Dict[str, List[float]]]:
+        """
+        Compteurs et valeurs observées depuis le dernier appel, puis remise à zéro
+
+        Utilisé dans les processus de calcul: leurs métriques sont renvoyées
+        avec le résultat et ajoutées à celles du serveur (voir `merge`).
+        """
+        with cls._lock:
+            counters, cls._counters = cls._counters, {}
+            summaries, cls._summaries = cls._summaries, {}
+        return counters, {name: list(summary.recent) for name, summary in summaries.items()}
+
+    @classmethod
+    def merge(cls, counters: Dict[str, float], observations: Dict[str, List[float]]):
+        """Ajoute les métriques drainées d'un autre processus"""
+        for name, amount in counters.items():
+            cls.increment(name, amount)
+        for name, values in observations.items():
+            for value in values:
+                cls.observe(name, value)
+
+    @classmethod
+    def snapshot(cls) -> Dict:
+        with cls._lock:
+            return {
+                "counters": dict(cls._counters),
+                "gauges": dict(cls._gauges),
+                "summaries": {name: summary.snapshot() for name, summary in cls._summaries.items()},
+            }
@@ -0,0 +1,279 @@
+import asyncio
+from abc import ABC, abstractmethod
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import Metrics
+from app.models.user import User
+
+# HTTP/2 (multiplexage des requêtes sur une connexion) si le paquet h2 est installé
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class RepositoryError(Exception):
+    """Erreur renvoyée par la base (le message contient le code PostgREST s'il existe)"""
+
+
+class UserRepository(ABC):
+    """
+    Accès asynchrone à la table users.
+
+    Implémentations: PostgRESTUserRepository (Supabase) et
+    SQLiteUserRepository (fichier local, pour les benchmarks et le
+    développement sans Supabase). Voir get_user_repository().
+    """
+
+    @abstractmethod
+    async def get_by_id(self, user_id: int, timeout: Optional[float] = None) -> Optional[User]:
+        """Utilisateur par id, ou None"""
+
+    @abstractmethod
+    async def get_by_email(self, email: str, timeout: Optional[float] = None) -> Optional[User]:
+        """Utilisateur par email, ou None"""
+
+    @abstractmethod
+    async def get_many(self, user_ids: Iterable[int], timeout: Optional[float] = None) -> Dict[int, User]:
+        """Utilisateurs par id en une seule requête (les ids inconnus sont absents)"""
+
+    @abstractmethod
+    async def create(self, data: Dict, timeout: Optional[float] = None) -> User:
+        """Crée l'utilisateur et le retourne avec son id"""
+
+    @abstractmethod
+    async def update(self, user_id: int, data: Dict, timeout: Optional[float] = None) -> Optional[User]:
+        """Met à jour les colonnes de `data`; None si l'utilisateur n'existe pas"""
+
+    @abstractmethod
+    async def list(self, limit: int = 10, timeout: Optional[float] = None) -> List[Dict]:
+        """Premières lignes de la table (diagnostic)"""
+
+    async def close(self):
+        """Libère les connexions (rien à faire par défaut)"""
+
+
+class PostgRESTUserRepository(UserRepository):
+    """
+    Table users via l'API PostgREST de Supabase.
+
+    Un seul client httpx par processus: connexions gardées ouvertes (HTTP/2
+    si disponible), délai maximal par appel (DB_TIMEOUT par défaut).
+    """
+
+    def __init__(self, url: str, key: str):
+        self._client = httpx.AsyncClient(
+            base_url=url.rstrip("/") + "/rest/v1",
+            headers={
+                "apikey": key,
+                "Authorization": f"Bearer {key}",
+                "Accept": "application/json",
+            },
+            http2=HTTP2_AVAILABLE,
+            timeout=settings.DB_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.DB_POOL_SIZE,
+                max_keepalive_connections=settings.DB_POOL_SIZE,
+                keepalive_expiry=60
+            )
+        )
+
+    async def _request(
+        self,
+        method: str,
+        params: Dict,
+        json: Optional[Dict] = None,
+        timeout: Optional[float] = None,
+        prefer: Optional[str] = None
+    ) -> List[Dict]:
+        headers = {"Prefer": prefer} if prefer else None
+        start = time.perf_counter()
+        try:
+            response = await self._client.request(
+                method,
+                "/users",
+                params=params,
+                json=json,
+                headers=headers,
+                timeout=timeout if timeout is not None else settings.DB_TIMEOUT
+            )
+        except httpx.TimeoutException as e:
+            Metrics.increment("db.timeouts")
+            raise RepositoryError(f"Délai dépassé pour la requête Supabase ({method} users)") from e
+        finally:
+            Metrics.observe("db.query_seconds", time.perf_counter() - start)
+        if response.status_code >= 400:
+            # Le corps contient le code PGRST et le message (ex: row-level security)
+            raise RepositoryError(f"{response.status_code} {response.text}")
+        return response.json() if response.content else []
+
+    async def get_by_id(self, user_id: int, timeout: Optional[float] = None) -> Optional[User]:
+        rows = await self._request("GET", {"select": "*", "id": f"eq.{user_id}", "limit": 1}, timeout=timeout)
+        return User.from_dict(rows[0]) if rows else None
+
+    async def get_by_email(self, email: str, timeout: Optional[float] = None) -> Optional[User]:
+        rows = await self._request("GET", {"select": "*", "email": f"eq.{email}", "limit": 1}, timeout=timeout)
+        return User.from_dict(rows[0]) if rows else None
+
+    async def get_many(self, user_ids: Iterable[int], timeout: Optional[float] = None) -> Dict[int, User]:
+        ids = sorted({int(user_id) for user_id in user_ids})
+        if not ids:
+            return {}
+        rows = await self._request(
+            "GET",
+            {"select": "*", "id": f"in.({','.join(str(user_id) for user_id in ids)})"},
+            timeout=timeout
+        )
+        users = [User.from_dict(row) for row in rows]
+        return {user.id: user for user in users}
+
+    async def create(self, data: Dict, timeout: Optional[float] = None) -> User:
+        rows = await self._request("POST", {}, json=data, timeout=timeout, prefer="return=representation")
+        if not rows:
+            raise RepositoryError("No data returned from insert")
+        return User.from_dict(rows[0])
+
+    async def update(self, user_id: int, data: Dict, timeout: Optional[float] = None) -> Optional[User]:
+        rows = await self._request(
+            "PATCH", {"id": f"eq.{user_id}"}, json=data, timeout=timeout, prefer="return=representation"
+        )
+        return User.from_dict(rows[0]) if rows else None
+
+    async def list(self, limit: int = 10, timeout: Optional[float] = None) -> List[Dict]:
+        return await self._request("GET", {"select": "id,email,plan,is_active", "limit": limit}, timeout=timeout)
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class SQLiteUserRepository(UserRepository):
+    """
+    Table users dans un fichier SQLite local (même interface, sans Supabase).
+
+    Les requêtes passent par un thread (sqlite3 est bloquant); une seule
+    connexion protégée par un verrou suffit pour ce volume.
+    """
+
+    COLUMNS = (
+        "id", "email", "hashed_password", "full_name", "is_active", "is_verified", "plan",
+        "avatar_url", "bio", "phone", "location", "website", "created_at", "updated_at"
+    )
+    BOOLEAN_COLUMNS = ("is_active", "is_verified")
+
+    def __init__(self, path: Path):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "email TEXT UNIQUE NOT NULL, "
+            "hashed_password TEXT NOT NULL, "
+            "full_name TEXT, "
+            "is_active INTEGER NOT NULL DEFAULT 1, "
+            "is_verified INTEGER NOT NULL DEFAULT 0, "
+            "plan TEXT NOT NULL DEFAULT 'free', "
+            "avatar_url TEXT, bio TEXT, phone TEXT, location TEXT, website TEXT, "
+            "created_at TEXT, updated_at TEXT)"
+        )
+        self._connection.commit()
+
+    def _row_to_dict(self, row: sqlite3.Row) -> Dict:
+        data = dict(row)
+        for column in self.BOOLEAN_COLUMNS:
+            if column in data:
+                data[column] = bool(data[column])
+        return data
+
+    def _execute(self, query: str, params: Iterable = ()) -> List[Dict]:
+        with self._lock:
+            try:
+                cursor = self._connection.execute(query, tuple(params))
+                rows = cursor.fetchall()
+                self._connection.commit()
+            except sqlite3.Error as e:
+                self._connection.rollback()
+                raise RepositoryError(str(e)) from e
+        return [self._row_to_dict(row) for row in rows]
+
+    async def _run(self, query: str, params: Iterable = (), timeout: Optional[float] = None) -> List[Dict]:
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(
+                asyncio.to_thread(self._execute, query, params),
+                timeout=timeout if timeout is not None else settings.DB_TIMEOUT
+            )
+        except asyncio.TimeoutError as e:
+            Metrics.increment("db.timeouts")
+            raise RepositoryError("Délai dépassé pour la requête SQLite (users)") from e
+        finally:
+            Metrics.observe("db.query_seconds", time.perf_counter() - start)
+
+    def _columns(self, data: Dict) -> Dict:
+        return {key: value for key, value in data.items() if key in self.COLUMNS and key != "id"}
+
+    async def get_by_id(self, user_id: int, timeout: Optional[float] = None) -> Optional[User]:
+        rows = await self._run("SELECT * FROM users WHERE id = ?", (user_id,), timeout)
+        return User.from_dict(rows[0]) if rows else None
+
+    async def get_by_email(self, email: str, timeout: Optional[float] = None) -> Optional[User]:
+        rows = await self._run("SELECT * FROM users WHERE email = ?", (email,), timeout)
+        return User.from_dict(rows[0]) if rows else None
+
+    async def get_many(self, user_ids: Iterable[int], timeout: Optional[float] = None) -> Dict[int, User]:
+        ids = sorted({int(user_id) for user_id in user_ids})
+        if not ids:
+            return {}
+        placeholders = ",".join("?" for _ in ids)
+        rows = await self._run(f"SELECT * FROM users WHERE id IN ({placeholders})", ids, timeout)
+        users = [User.from_dict(row) for row in rows]
+        return {user.id: user for user in users}
+
+    async def create(self, data: Dict, timeout: Optional[float] = None) -> User:
+        now = datetime.utcnow().isoformat()
+        values = {"created_at": now, "updated_at": now, **self._columns(data)}
+        columns = ", ".join(values)
+        placeholders = ", ".join("?" for _ in values)
+        rows = await self._run(
+            f"INSERT INTO users ({columns}) VALUES ({placeholders}) RETURNING *", values.values(), timeout
+        )
+        if not rows:
+            raise RepositoryError("No data returned from insert")
+        return User.from_dict(rows[0])
+
+    async def update(self, user_id: int, data: Dict, timeout: Optional[float] = None) -> Optional[User]:
+        values = self._columns(data)
+        if not values:
+            return await self.get_by_id(user_id, timeout)
+        assignments = ", ".join(f"{column} = ?" for column in values)
+        rows = await self._run(
+            f"UPDATE users SET {assignments} WHERE id = ? RETURNING *", [*values.values(), user_id], timeout
+        )
+        return User.from_dict(rows[0]) if rows else None
+
+    async def list(self, limit: int = 10, timeout: Optional[float] = None) -> List[Dict]:
+        return await self._run("SELECT id, email, plan, is_active FROM users LIMIT ?", (limit,), timeout)
+
+
+_repository: Optional[UserRepository] = None
+
+
+def get_user_repository() -> UserRepository:
+    """Dépôt des utilisateurs selon DB_BACKEND ("supabase" ou "sqlite")"""
+    global _repository
+    if _repository is None:
+        if settings.DB_BACKEND == "sqlite":
+            _repository = SQLiteUserRepository(settings.SQLITE_DB_PATH)
+        else:
+            _repository = PostgRESTUserRepository(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+    return _repository
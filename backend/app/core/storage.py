@@ -0,0 +1,454 @@
+import datetime
+import hashlib
+import hmac
+import logging
+import os
+import shutil
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+from urllib.parse import quote
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Taille des blocs lus/envoyés en flux
+_CHUNK_SIZE = 256 * 1024
+
+
+class StorageError(Exception):
+    """Erreur du stockage distant (le message contient le code HTTP s'il existe)"""
+
+
+class StorageBackend(ABC):
+    """
+    Stockage des fichiers partagé entre les répliques de l'API.
+
+    Les clés sont les chemins relatifs à BASE_DIR ("uploads/blobs/...",
+    "processed/..."), voir storage_key(). Le disque local reste l'espace de
+    travail (décodage audio, rendus): un fichier absent localement est
+    rapatrié depuis le stockage avant usage (ensure_local).
+
+    Implémentations: LocalStorageBackend (disque local, un seul serveur),
+    S3StorageBackend (S3, MinIO, R2...) et MemoryStorageBackend (en mémoire,
+    pour les tests et le développement). Voir get_storage(). Les méthodes
+    sont bloquantes: à appeler depuis un thread.
+    """
+
+    # True si les clés désignent directement les fichiers de BASE_DIR (rien à copier)
+    in_place = False
+
+    @abstractmethod
+    def put_file(self, key: str, path: Path):
+        """Envoie un fichier local, en flux"""
+
+    @abstractmethod
+    def put_bytes(self, key: str, data: bytes):
+        """Enregistre un petit objet"""
+
+    @abstractmethod
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        """Contenu d'un petit objet, ou None s'il n'existe pas"""
+
+    @abstractmethod
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """
+        Contenu en flux, éventuellement limité aux octets start..end (inclus)
+
+        Une plage qui commence après la fin de l'objet ne donne aucun octet.
+
+        Raises:
+            StorageError: l'objet n'existe pas
+        """
+
+    @abstractmethod
+    def size(self, key: str) -> Optional[int]:
+        """Taille de l'objet, ou None s'il n'existe pas"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Supprime l'objet (sans erreur s'il n'existe pas)"""
+
+    def presigned_url(self, key: str, expires_in: Optional[int] = None, filename: Optional[str] = None) -> Optional[str]:
+        """URL de téléchargement direct signée, ou None si le stockage n'en fournit pas"""
+        return None
+
+    def download_to(self, key: str, path: Path) -> bool:
+        """
+        Copie l'objet dans un fichier local (écrit à côté puis renommé)
+
+        Returns:
+            False si l'objet n'existe pas
+        """
+        if self.size(key) is None:
+            return False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+        try:
+            with open(temp_path, "wb") as target:
+                for chunk in self.iter_range(key):
+                    target.write(chunk)
+            os.replace(temp_path, path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+        return True
+
+    def close(self):
+        pass
+
+
+class LocalStorageBackend(StorageBackend):
+    """Fichiers sous un répertoire local (BASE_DIR par défaut: aucune copie)"""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.in_place = root.resolve() == settings.BASE_DIR.resolve()
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise StorageError(f"Invalid storage key: {key}")
+        return path
+
+    def put_file(self, key: str, path: Path):
+        target = self._path(key)
+        if target == path.resolve():
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = target.with_name(f".{target.name}.{uuid.uuid4().hex}.part")
+        try:
+            shutil.copyfile(path, temp_path)
+            os.replace(temp_path, target)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+
+    def put_bytes(self, key: str, data: bytes):
+        target = self._path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = target.with_name(f".{target.name}.{uuid.uuid4().hex}.part")
+        temp_path.write_bytes(data)
+        os.replace(temp_path, target)
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        try:
+            source = open(self._path(key), "rb")
+        except FileNotFoundError:
+            raise StorageError(f"Object not found: {key}")
+        with source:
+            source.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = source.read(_CHUNK_SIZE if remaining is None else min(_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def size(self, key: str) -> Optional[int]:
+        try:
+            return self._path(key).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key: str):
+        self._path(key).unlink(missing_ok=True)
+
+    def download_to(self, key: str, path: Path) -> bool:
+        if self._path(key) == path.resolve():
+            return path.exists()
+        return super().download_to(key, path)
+
+
+class MemoryStorageBackend(StorageBackend):
+    """Objets gardés en mémoire du processus (tests, développement)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._objects: Dict[str, bytes] = {}
+
+    def put_file(self, key: str, path: Path):
+        self.put_bytes(key, path.read_bytes())
+
+    def put_bytes(self, key: str, data: bytes):
+        with self._lock:
+            self._objects[key] = bytes(data)
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._objects.get(key)
+
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        data = self.get_bytes(key)
+        if data is None:
+            raise StorageError(f"Object not found: {key}")
+        stop = len(data) if end is None else end + 1
+        for offset in range(start, stop, _CHUNK_SIZE):
+            yield data[offset:min(offset + _CHUNK_SIZE, stop)]
+
+    def size(self, key: str) -> Optional[int]:
+        data = self.get_bytes(key)
+        return None if data is None else len(data)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._objects.pop(key, None)
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    Bucket compatible S3 (AWS, MinIO, R2...), adressage par chemin.
+
+    Requêtes signées en AWS Signature V4 avec un client httpx partagé
+    (connexions gardées ouvertes). Les envois lisent le fichier en flux
+    (corps non signé: UNSIGNED-PAYLOAD), la taille étant connue d'avance.
+    """
+
+    def __init__(self, endpoint_url: str, bucket: str, region: str, access_key: str, secret_key: str):
+        self.endpoint_url = endpoint_url.rstrip("/")
+        self.host = httpx.URL(self.endpoint_url).netloc.decode("ascii")
+        self.bucket = bucket
+        self.region = region
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self._client = httpx.Client(
+            timeout=settings.STORAGE_TIMEOUT,
+            limits=httpx.Limits(max_connections=settings.STORAGE_POOL_SIZE, max_keepalive_connections=settings.STORAGE_POOL_SIZE)
+        )
+
+    # === Signature V4 ===
+
+    def _canonical_uri(self, key: str) -> str:
+        return "/" + quote(f"{self.bucket}/{key}", safe="/~")
+
+    @staticmethod
+    def _canonical_query(query: Dict[str, str]) -> str:
+        return "&".join(f"{quote(k, safe='~')}={quote(v, safe='~')}" for k, v in sorted(query.items()))
+
+    def _signature(self, string_to_sign: str, date: str) -> str:
+        key = ("AWS4" + self.secret_key).encode("utf-8")
+        for part in (date, self.region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode("utf-8"), hashlib.sha256).digest()
+        return hmac.new(key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def _sign(
+        self,
+        method: str,
+        key: str,
+        query: Dict[str, str],
+        headers: Dict[str, str],
+        payload_hash: str,
+        now: datetime.datetime
+    ) -> Tuple[str, str]:
+        """(en-têtes signés, signature) de la requête canonique"""
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        scope = f"{now:%Y%m%d}/{self.region}/s3/aws4_request"
+        canonical_headers = {name.lower(): value.strip() for name, value in headers.items()}
+        signed_headers = ";".join(sorted(canonical_headers))
+        canonical_request = "\n".join([
+            method,
+            self._canonical_uri(key),
+            self._canonical_query(query),
+            "".join(f"{name}:{canonical_headers[name]}\n" for name in sorted(canonical_headers)),
+            signed_headers,
+            payload_hash
+        ])
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()
+        ])
+        return signed_headers, self._signature(string_to_sign, f"{now:%Y%m%d}")
+
+    def _request(
+        self,
+        method: str,
+        key: str,
+        content=None,
+        headers: Optional[Dict[str, str]] = None,
+        payload_hash: Optional[str] = None,
+        stream: bool = False
+    ) -> httpx.Response:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if payload_hash is None:
+            payload_hash = hashlib.sha256(content if isinstance(content, bytes) else b"").hexdigest()
+        headers = dict(headers or {})
+        headers.update({
+            "host": self.host,
+            "x-amz-date": now.strftime("%Y%m%dT%H%M%SZ"),
+            "x-amz-content-sha256": payload_hash,
+        })
+        signed_headers, signature = self._sign(method, key, {}, headers, payload_hash, now)
+        headers["authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{now:%Y%m%d}/{self.region}/s3/aws4_request, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        )
+        request = self._client.build_request(
+            method, self.endpoint_url + self._canonical_uri(key), content=content, headers=headers
+        )
+        try:
+            response = self._client.send(request, stream=stream)
+        except httpx.HTTPError as e:
+            raise StorageError(f"{method} {key}: {e}") from e
+        if response.status_code >= 400 and response.status_code not in (404, 416):
+            if stream:
+                response.read()
+                response.close()
+            raise StorageError(f"{method} {key}: HTTP {response.status_code} {response.text[:200]}")
+        return response
+
+    # === Opérations ===
+
+    def put_file(self, key: str, path: Path):
+        with open(path, "rb") as source:
+            self._request(
+                "PUT", key,
+                content=iter(lambda: source.read(_CHUNK_SIZE), b""),
+                headers={"content-length": str(path.stat().st_size)},
+                payload_hash="UNSIGNED-PAYLOAD"
+            )
+
+    def put_bytes(self, key: str, data: bytes):
+        self._request("PUT", key, content=data)
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        response = self._request("GET", key)
+        return None if response.status_code == 404 else response.content
+
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        headers = {}
+        if start or end is not None:
+            headers["range"] = f"bytes={start}-{'' if end is None else end}"
+        response = self._request("GET", key, headers=headers, stream=True)
+        try:
+            if response.status_code == 404:
+                raise StorageError(f"Object not found: {key}")
+            if response.status_code == 416:
+                # Plage au-delà de la fin: rien à lire (comme les autres stockages)
+                return
+            yield from response.iter_bytes(_CHUNK_SIZE)
+        finally:
+            response.close()
+
+    def size(self, key: str) -> Optional[int]:
+        response = self._request("HEAD", key)
+        if response.status_code == 404:
+            return None
+        return int(response.headers.get("content-length", 0))
+
+    def delete(self, key: str):
+        self._request("DELETE", key)
+
+    def presigned_url(self, key: str, expires_in: Optional[int] = None, filename: Optional[str] = None) -> Optional[str]:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        query = {
+            "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+            "X-Amz-Credential": f"{self.access_key}/{now:%Y%m%d}/{self.region}/s3/aws4_request",
+            "X-Amz-Date": now.strftime("%Y%m%dT%H%M%SZ"),
+            "X-Amz-Expires": str(expires_in or settings.S3_PRESIGN_TTL),
+            "X-Amz-SignedHeaders": "host",
+        }
+        if filename:
+            query["response-content-disposition"] = f'attachment; filename="{filename}"'
+        amz_date = query["X-Amz-Date"]
+        scope = f"{now:%Y%m%d}/{self.region}/s3/aws4_request"
+        canonical_request = "\n".join([
+            "GET",
+            self._canonical_uri(key),
+            self._canonical_query(query),
+            f"host:{self.host}\n",
+            "host",
+            "UNSIGNED-PAYLOAD"
+        ])
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256", amz_date, scope,
+            hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()
+        ])
+        query["X-Amz-Signature"] = self._signature(string_to_sign, f"{now:%Y%m%d}")
+        return f"{self.endpoint_url}{self._canonical_uri(key)}?{self._canonical_query(query)}"
+
+    def close(self):
+        self._client.close()
+
+
+def storage_key(path: Path) -> str:
+    """Clé de stockage d'un fichier de BASE_DIR (chemin relatif)"""
+    return path.resolve().relative_to(settings.BASE_DIR.resolve()).as_posix()
+
+
+def publish(path: Path):
+    """Envoie un fichier local vers le stockage partagé (rien à faire en local)"""
+    storage = get_storage()
+    if not storage.in_place:
+        storage.put_file(storage_key(path), path)
+
+
+def stored_size(path: Path) -> Optional[int]:
+    """Taille d'un fichier de BASE_DIR, présent ici ou seulement dans le stockage (None: absent)"""
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        pass
+    storage = get_storage()
+    if storage.in_place:
+        return None
+    return storage.size(storage_key(path))
+
+
+def ensure_local(path: Path) -> bool:
+    """
+    Rapatrie un fichier de BASE_DIR depuis le stockage s'il manque sur ce serveur
+
+    Returns:
+        False si le fichier n'existe nulle part
+    """
+    if path.exists():
+        return True
+    storage = get_storage()
+    if storage.in_place:
+        return False
+    found = storage.download_to(storage_key(path), path)
+    if found:
+        logger.debug("Fichier rapatrié depuis le stockage: %s", path.name)
+    return found
+
+
+_storage: Optional[StorageBackend] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> StorageBackend:
+    """Stockage selon STORAGE_BACKEND ("local", "s3" ou "memory")"""
+    global _storage
+    if _storage is not None:
+        return _storage
+    # Appelé depuis plusieurs pools de threads: un seul client (et pool de connexions) créé
+    with _storage_lock:
+        if _storage is None:
+            if settings.STORAGE_BACKEND == "s3":
+                _storage = S3StorageBackend(
+                    settings.S3_ENDPOINT_URL,
+                    settings.S3_BUCKET,
+                    settings.S3_REGION,
+                    settings.S3_ACCESS_KEY_ID,
+                    settings.S3_SECRET_ACCESS_KEY
+                )
+            elif settings.STORAGE_BACKEND == "memory":
+                _storage = MemoryStorageBackend()
+            else:
+                _storage = LocalStorageBackend(settings.STORAGE_LOCAL_ROOT or settings.BASE_DIR)
+        return _storage
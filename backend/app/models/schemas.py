@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, validator
-from typing import Optional
+from typing import List, Optional
 
 # Authentification
 class UserRegister(BaseModel):
@@ -22,6 +22,11 @@ class UserLogin(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class UserResponse(BaseModel):
     id: int
@@ -109,6 +114,8 @@ class ProcessRequest(BaseModel):
 
 class ProcessResponse(BaseModel):
     download_url: str
+    # Uploads inactifs supprimés pour respecter le quota du plan
+    evicted_uploads: List[str] = []
 
 class AIAnalysisRequest(BaseModel):
     features: dict
@@ -117,6 +124,21 @@ class AIAnalysisResponse(BaseModel):
     report: str
     source: str = "gemini-ai"
 
+class AIBatchTrack(BaseModel):
+    name: Optional[str] = None
+    features: dict
+
+class AIBatchAnalysisRequest(BaseModel):
+    tracks: List[AIBatchTrack]
+
+class AIBatchTrackReport(BaseModel):
+    name: str
+    report: str
+    source: str = "gemini-ai"
+
+class AIBatchAnalysisResponse(BaseModel):
+    reports: List[AIBatchTrackReport]
+
 class ComparisonRequest(BaseModel):
     original_filename: str
     reference_filename: str
@@ -127,4 +149,16 @@ class ComparisonResponse(BaseModel):
     global_status_label: str
     comparisons: dict
     original_key: str
-    reference_key: str
\ No newline at end of file
+    reference_key: str
+
+
+class ResumableUploadCreate(BaseModel):
+    filename: str
+    size: int
+
+
+class ResumableUploadStatus(BaseModel):
+    upload_id: str
+    offset: int
+    size: int
+    chunk_size: Optional[int] = None
@@ -0,0 +1,244 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from ..core.config import settings
+from ..models.user import PlanType
+
+# Budgets de chaque client selon son plan: (requêtes par minute, tokens par minute).
+# Un client est un utilisateur connecté ou, pour les visiteurs, une adresse IP.
+PLAN_BUDGETS = {
+    PlanType.FREE: (3, 12_000),
+    PlanType.STARTER: (10, 40_000),
+    PlanType.PRO: (30, 120_000),
+    PlanType.STUDIO: (60, 240_000),
+}
+# Un budget inutilisé depuis ce délai est de nouveau plein: il peut être oublié
+_IDLE_BUDGET_SECONDS = 60.0
+
+
+class _TokenBucket:
+    """Seau à jetons rechargé en continu (capacité = budget par minute)"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated_at = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """Secondes avant que `amount` jetons soient disponibles"""
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def consume(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+
+class _Budget:
+    """Budget de requêtes et de tokens par minute, et ses requêtes en attente, servies dans l'ordre"""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        # Multiplicateur global (ex: tests de charge avec tools/bench_ai.py)
+        scale = settings.AI_BUDGET_SCALE
+        self.requests = _TokenBucket(requests_per_minute * scale)
+        self.tokens = _TokenBucket(tokens_per_minute * scale)
+        # File de (coût, future)
+        self.waiters: Deque = deque()
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.used_at = time.monotonic()
+
+    def wait_time(self, cost: int) -> float:
+        self.requests.refill()
+        self.tokens.refill()
+        return max(self.requests.wait_time(1), self.tokens.wait_time(cost))
+
+    def consume(self, cost: int):
+        self.requests.consume(1)
+        self.tokens.consume(cost)
+        self.used_at = time.monotonic()
+
+    def idle(self, now: float) -> bool:
+        return not self.waiters and self.timer is None and now - self.used_at >= _IDLE_BUDGET_SECONDS
+
+    def dispatch(self):
+        """Réveille les requêtes en attente tant que le budget le permet"""
+        self.timer = None
+        while self.waiters:
+            cost, future = self.waiters[0]
+            if future.done():
+                # Requête abandonnée (délai dépassé ou client déconnecté)
+                self.waiters.popleft()
+                AIRequestScheduler._waiting -= 1
+                continue
+            delay = self.wait_time(cost)
+            if delay > 0:
+                self.timer = asyncio.get_running_loop().call_later(delay, self.dispatch)
+                return
+            self.consume(cost)
+            self.waiters.popleft()
+            AIRequestScheduler._waiting -= 1
+            future.set_result(None)
+
+
+class AIRequestScheduler:
+    """
+    Ordonnanceur des appels à Gemini.
+
+    - Chaque client (utilisateur, ou adresse IP d'un visiteur) a son propre
+      budget de requêtes et de tokens par minute, fixé par son plan: un
+      client qui épuise le sien ne fait pas attendre les autres.
+    - Devant ces budgets, un budget global (AI_GLOBAL_REQUESTS_PER_MINUTE,
+      AI_GLOBAL_TOKENS_PER_MINUTE) borne le débit réellement envoyé à
+      Gemini, quel que soit le nombre de clients.
+    - Au-delà du budget, les requêtes attendent leur tour au lieu d'échouer
+      avec des 429 côté Gemini.
+    - Les requêtes identiques en cours sont fusionnées en un seul appel,
+      mais chaque demandeur est décompté de son propre budget avant de
+      rejoindre l'appel: seul l'appel à Gemini est partagé.
+    """
+
+    _in_flight: Dict[str, asyncio.Future] = {}
+    _budgets: Dict[Tuple[PlanType, str], _Budget] = {}
+    _global_budget: Optional[_Budget] = None
+    # Requêtes en attente, tous budgets confondus (borne: AI_MAX_QUEUE_SIZE)
+    _waiting = 0
+    _pruned_at = 0.0
+
+    @staticmethod
+    def estimate_tokens(prompt: str, reports: int = 1) -> int:
+        """Estimation grossière: ~4 caractères par token + réponse(s) attendue(s)"""
+        return len(prompt) // 4 + reports * settings.AI_OUTPUT_TOKENS_ESTIMATE
+
+    @classmethod
+    def _budget(cls, plan: PlanType, client_id: str) -> _Budget:
+        now = time.monotonic()
+        if now - cls._pruned_at >= _IDLE_BUDGET_SECONDS:
+            # Budgets pleins et sans attente: identiques à des budgets neufs
+            cls._pruned_at = now
+            for key in [key for key, budget in cls._budgets.items() if budget.idle(now)]:
+                del cls._budgets[key]
+        budget = cls._budgets.get((plan, client_id))
+        if budget is None:
+            budget = cls._budgets[(plan, client_id)] = _Budget(*PLAN_BUDGETS[plan])
+        return budget
+
+    @classmethod
+    def _global(cls) -> _Budget:
+        if cls._global_budget is None:
+            cls._global_budget = _Budget(settings.AI_GLOBAL_REQUESTS_PER_MINUTE, settings.AI_GLOBAL_TOKENS_PER_MINUTE)
+        return cls._global_budget
+
+    @classmethod
+    async def _take(cls, budget: _Budget, cost: int, detail: str):
+        """
+        Attend que `budget` permette un appel de `cost` tokens, puis le décompte
+
+        Raises:
+            HTTPException 429: file pleine ou attente supérieure à AI_QUEUE_TIMEOUT
+        """
+        if not budget.waiters and budget.wait_time(cost) == 0:
+            budget.consume(cost)
+            return
+
+        if cls._waiting >= settings.AI_MAX_QUEUE_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Trop de demandes d'analyse IA en attente. Veuillez réessayer plus tard.",
+                headers={"Retry-After": str(int(budget.wait_time(cost)) + 1)}
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        budget.waiters.append((cost, future))
+        cls._waiting += 1
+        if budget.timer is None:
+            budget.dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=settings.AI_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=detail,
+                headers={"Retry-After": str(int(budget.wait_time(cost)) + 1)}
+            )
+        finally:
+            if not future.done():
+                future.cancel()
+
+    @classmethod
+    async def _acquire_client(cls, plan: PlanType, client_id: str, cost: int):
+        await cls._take(
+            cls._budget(plan, client_id), cost,
+            "Quota d'analyses IA atteint pour votre plan. Veuillez réessayer dans un instant."
+        )
+
+    @classmethod
+    async def _acquire_global(cls, cost: int):
+        await cls._take(
+            cls._global(), cost,
+            "Le service d'analyse IA est saturé. Veuillez réessayer dans un instant."
+        )
+
+    @classmethod
+    async def acquire(cls, plan: PlanType, client_id: str, cost: int):
+        """
+        Attend le budget du client, puis le budget global, pour un appel de `cost` tokens
+
+        Raises:
+            HTTPException 429: file pleine ou attente supérieure à AI_QUEUE_TIMEOUT
+        """
+        await cls._acquire_client(plan, client_id, cost)
+        await cls._acquire_global(cost)
+
+    @classmethod
+    async def run(
+        cls,
+        key: str,
+        plan: PlanType,
+        client_id: str,
+        cost: int,
+        call: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Exécute `call` dans le budget du client, ou rejoint l'appel identique en cours
+
+        Chaque appelant attend d'abord son propre budget, hors de l'appel
+        partagé: le 429 ou l'attente d'un client ne s'étend pas à ceux qui
+        rejoignent son appel. Seul l'appel réellement envoyé à Gemini est
+        décompté du budget global.
+
+        Args:
+            key: Identifiant de la requête (les requêtes de même clé sont fusionnées)
+            plan: Plan de l'utilisateur à l'origine de la requête
+            client_id: Identifiant du client dont le budget est décompté
+            cost: Tokens estimés pour l'appel
+            call: Coroutine à exécuter une fois le budget obtenu
+        """
+        await cls._acquire_client(plan, client_id, cost)
+        future = cls._in_flight.get(key)
+        if future is None:
+            async def acquire_and_call():
+                await cls._acquire_global(cost)
+                return await call()
+
+            future = asyncio.ensure_future(acquire_and_call())
+            cls._in_flight[key] = future
+            future.add_done_callback(lambda f: cls._on_done(key, f))
+        # shield: un client qui se déconnecte n'annule pas l'appel partagé
+        return await asyncio.shield(future)
+
+    @classmethod
+    def _on_done(cls, key: str, future: asyncio.Future):
+        cls._in_flight.pop(key, None)
+        # Marquer l'erreur comme lue si tous les appelants sont partis
+        if not future.cancelled():
+            future.exception()
@@ -1,12 +1,25 @@
 import librosa
 import numpy as np
 from pathlib import Path
+from .proxy import ProxyService
+
+# Seules les premières secondes sont analysées (rapidité)
+ANALYSIS_DURATION = 30
 
 class FeatureExtractor:
+    @staticmethod
+    def load(file_path: Path):
+        """Signal à analyser: proxy 22,05 kHz mono généré à l'upload (original décodé s'il manque)"""
+        return ProxyService.load(file_path, duration=ANALYSIS_DURATION)
+
     @staticmethod
     def analyze(file_path: Path):
-        y, sr = librosa.load(file_path, duration=30)  # Analyze first 30s for speed
-        
+        y, sr = FeatureExtractor.load(file_path)
+        return FeatureExtractor.analyze_signal(y, sr)
+
+    @staticmethod
+    def analyze_signal(y: np.ndarray, sr: int):
+        """Métriques d'un signal déjà chargé (exécuté dans le pool de calcul)"""
         # === Métriques de base ===
         tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
         spectral_centroid = np.mean(librosa.feature.spectral_centroid(y=y, sr=sr))
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from ..core.compute import ComputeExecutor
+from ..core.config import settings
+from .analysis import FeatureExtractor
+from .fingerprint import FingerprintService
+from .proxy import ProxyService
+
+logger = logging.getLogger(__name__)
+
+class AnalysisCache:
+    """
+    Cache des analyses audio.
+
+    Le signal est chargé dans un pool de threads dédié puis analysé dans le
+    pool de processus de calcul (la boucle d'événements reste libre); les
+    requêtes simultanées sur le même fichier partagent un seul calcul en cours.
+    """
+
+    _executor = ThreadPoolExecutor(
+        max_workers=settings.ANALYSIS_WORKERS,
+        thread_name_prefix="analysis"
+    )
+    _cache: "OrderedDict[Tuple, Dict]" = OrderedDict()
+    _in_flight: Dict[Tuple, asyncio.Future] = {}
+
+    @staticmethod
+    def _cache_key(file_path: Path) -> Tuple:
+        """Clé de cache: chemin + date de modification + taille du fichier"""
+        stat = file_path.stat()
+        return (str(file_path.resolve()), stat.st_mtime_ns, stat.st_size)
+
+    @classmethod
+    def cached_features(cls, file_path: Path) -> Optional[Dict]:
+        """
+        Métriques déjà calculées, sans lancer d'analyse
+
+        Permet aux endpoints de répondre sans réserver de place de calcul.
+
+        Returns:
+            Dict des métriques (copie), ou None si le fichier n'a pas encore été analysé
+        """
+        key = cls._cache_key(FingerprintService.resolve_path(file_path))
+        features = cls._cache.get(key)
+        if features is None:
+            return None
+        cls._cache.move_to_end(key)
+        return dict(features)
+
+    @classmethod
+    async def get_features(cls, file_path: Path) -> Dict:
+        """
+        Retourne les métriques d'un fichier audio
+
+        Args:
+            file_path: Chemin du fichier à analyser
+
+        Returns:
+            Dict des métriques (copie, modifiable par l'appelant)
+        """
+        features = cls.cached_features(file_path)
+        if features is not None:
+            return features
+
+        # Un doublon détecté à l'upload partage l'analyse de son fichier canonique
+        file_path = FingerprintService.resolve_path(file_path)
+        key = cls._cache_key(file_path)
+
+        if key not in cls._in_flight:
+            # L'analyse lit le proxy: attendre sa génération (lancée à l'upload) plutôt que décoder l'original
+            try:
+                await ProxyService.ensure(file_path)
+            except Exception as e:
+                logger.warning("Proxy indisponible pour %s: %s", file_path.name, e)
+
+        # Réutiliser l'analyse déjà en cours pour ce fichier si elle existe
+        future = cls._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(cls._compute(file_path))
+            cls._in_flight[key] = future
+            future.add_done_callback(lambda f: cls._on_done(key, f))
+
+        # shield: l'annulation d'un appelant ne doit pas annuler le calcul partagé
+        features = await asyncio.shield(future)
+        return dict(features)
+
+    @classmethod
+    async def _compute(cls, file_path: Path) -> Dict:
+        loop = asyncio.get_running_loop()
+        y, sr = await loop.run_in_executor(cls._executor, FeatureExtractor.load, file_path)
+        # Signal transmis au processus par mémoire partagée
+        return await ComputeExecutor.run(FeatureExtractor.analyze_signal, y, sr)
+
+    @classmethod
+    def _on_done(cls, key: Tuple, future: asyncio.Future):
+        cls._in_flight.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        cls._cache[key] = future.result()
+        cls._cache.move_to_end(key)
+        while len(cls._cache) > settings.ANALYSIS_CACHE_SIZE:
+            cls._cache.popitem(last=False)
@@ -5,6 +5,7 @@ from pathlib import Path
 from ..core.config import settings
 import uuid
 from scipy import signal
+from .audio_loader import AudioLoader
 
 class AudioProcessor:
     @staticmethod
@@ -44,7 +45,7 @@ class AudioProcessor:
         eq_treble: float = 0.0
     ) -> Path:
         # Load audio
-        y, sr = librosa.load(file_path, sr=None)
+        y, sr = AudioLoader.load(file_path)
         
         # Gérer le stéréo/mono
         is_stereo = y.ndim > 1
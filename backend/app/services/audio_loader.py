@@ -0,0 +1,121 @@
+import logging
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from ..core.config import settings
+from ..core.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+
+class AudioLoader:
+    """
+    Chargement des fichiers audio, commun à l'analyse, aux rendus et aux empreintes.
+
+    - WAV, FLAC, OGG, MP3: lus directement par libsndfile (pas de décodage
+      complet pour un extrait: `offset` se fait par seek)
+    - autres formats: décodés par audioread, les trames hors de l'extrait
+      sont sautées sans être converties
+    - sortie en float32, (n,) en mono ou (canaux, n) en stéréo comme librosa
+    - rééchantillonnage via librosa.resample, qualité au choix de l'appelant
+      (AUDIO_RESAMPLE_TYPE par défaut)
+
+    Le temps de chargement est publié dans la métrique audio.decode_seconds.
+    """
+
+    @staticmethod
+    def _read_native(path: Path, offset: float, duration: Optional[float]) -> Tuple[np.ndarray, int]:
+        with sf.SoundFile(str(path)) as source:
+            native_sr = source.samplerate
+            start = min(int(round(offset * native_sr)), source.frames) if offset > 0 else 0
+            if start:
+                if source.seekable():
+                    source.seek(start)
+                else:
+                    source.read(start, dtype="float32")
+            frames = -1 if duration is None else int(round(duration * native_sr))
+            data = source.read(frames, dtype="float32", always_2d=True)
+        return data.T, native_sr
+
+    @staticmethod
+    def _read_fallback(path: Path, offset: float, duration: Optional[float]) -> Tuple[np.ndarray, int]:
+        import audioread
+        with audioread.audio_open(str(path)) as source:
+            native_sr = int(source.samplerate)
+            channels = int(source.channels)
+            start = int(round(offset * native_sr)) * channels
+            end = None if duration is None else start + int(round(duration * native_sr)) * channels
+            position = 0
+            blocks = []
+            for buffer in source:
+                # Échantillons entiers 16 bits entrelacés
+                block = np.frombuffer(buffer, dtype="<i2")
+                block_start = position
+                position += len(block)
+                if position <= start:
+                    continue
+                if end is not None and block_start >= end:
+                    break
+                blocks.append(block[max(start - block_start, 0):None if end is None else end - block_start])
+        samples = np.concatenate(blocks) if blocks else np.empty(0, dtype="<i2")
+        data = samples.astype(np.float32) / 32768.0
+        return data.reshape(-1, channels).T, native_sr
+
+    @classmethod
+    def load(
+        cls,
+        path: Path,
+        sr: Optional[int] = None,
+        mono: bool = True,
+        offset: float = 0.0,
+        duration: Optional[float] = None,
+        res_type: Optional[str] = None
+    ) -> Tuple[np.ndarray, int]:
+        """
+        Charge un fichier (ou un extrait) en float32
+
+        Args:
+            sr: fréquence voulue (None: fréquence native du fichier)
+            mono: moyenne des canaux
+            offset, duration: extrait en secondes (duration None: jusqu'à la fin)
+            res_type: rééchantillonneur de librosa ("soxr_hq", "soxr_mq", "soxr_lq"...),
+                AUDIO_RESAMPLE_TYPE par défaut
+
+        Returns:
+            (signal, fréquence)
+
+        Raises:
+            Exception du décodeur si le fichier est illisible
+        """
+        started = time.perf_counter()
+        try:
+            y, native_sr = cls._read_native(path, offset, duration)
+            decoder = "soundfile"
+        except RuntimeError as e:  # sf.LibsndfileError
+            logger.debug("Lecture libsndfile impossible (%s), décodage via audioread: %s", e, path.name)
+            y, native_sr = cls._read_fallback(path, offset, duration)
+            decoder = "audioread"
+
+        if mono:
+            y = y.mean(axis=0)
+        elif y.shape[0] == 1:
+            y = y[0]
+        if sr is not None and sr != native_sr:
+            y = librosa.resample(
+                y,
+                orig_sr=native_sr,
+                target_sr=sr,
+                res_type=res_type or settings.AUDIO_RESAMPLE_TYPE
+            )
+        else:
+            sr = native_sr
+        y = np.ascontiguousarray(y, dtype=np.float32)
+
+        Metrics.observe("audio.decode_seconds", time.perf_counter() - started)
+        Metrics.increment(f"audio.decode.{decoder}")
+        return y, sr
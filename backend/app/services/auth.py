@@ -1,16 +1,26 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
+from fastapi import HTTPException, status
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from supabase import Client
 from app.models.user import User, PlanType
 from app.core.config import settings
-from app.core.database import get_supabase
+from app.core.repository import get_user_repository
+from app.core.metrics import Metrics
+from app.services.user_cache import UserCache
 import secrets
 import os
 import bcrypt
 
+logger = logging.getLogger(__name__)
+
 # Configuration du hachage de mot de passe
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -18,17 +28,17 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # Utiliser la SECRET_KEY depuis les settings (chargée depuis .env)
 if settings.SECRET_KEY:
     SECRET_KEY = settings.SECRET_KEY
-    print("✅ SECRET_KEY chargée depuis les variables d'environnement")
+    logger.info("SECRET_KEY chargée depuis les variables d'environnement")
 else:
     # Fallback pour le développement local
     SECRET_KEY_FILE = Path(__file__).resolve().parent.parent.parent.parent / ".secret_key"
     if SECRET_KEY_FILE.exists():
         SECRET_KEY = SECRET_KEY_FILE.read_text().strip()
-        print("⚠️  SECRET_KEY chargée depuis le fichier local (.secret_key)")
+        logger.warning("SECRET_KEY chargée depuis le fichier local (.secret_key)")
     else:
         SECRET_KEY = secrets.token_urlsafe(32)
         SECRET_KEY_FILE.write_text(SECRET_KEY)
-        print("⚠️  SECRET_KEY générée et sauvegardée localement (développement uniquement)")
+        logger.warning("SECRET_KEY générée et sauvegardée localement (développement uniquement)")
 
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 jours
@@ -48,15 +58,13 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
             hashed_bytes = hashed_password.encode('utf-8')
         else:
             hashed_bytes = hashed_password
-        result = bcrypt.checkpw(password_bytes, hashed_bytes)
-        print(f"Password verification result: {result}")
-        return result
+        return bcrypt.checkpw(password_bytes, hashed_bytes)
     except Exception as e:
-        print(f"bcrypt checkpw failed: {e}, trying passlib fallback")
+        logger.warning("bcrypt checkpw failed: %s, trying passlib fallback", e)
         try:
             return pwd_context.verify(plain_password, hashed_password)
         except Exception as e2:
-            print(f"passlib verify also failed: {e2}")
+            logger.warning("passlib verify also failed: %s", e2)
             return False
 
 def get_password_hash(password: str) -> str:
@@ -66,6 +74,54 @@ def get_password_hash(password: str) -> str:
     hashed = bcrypt.hashpw(password_bytes, salt)
     return hashed.decode('utf-8')
 
+# bcrypt bloque ~100-300 ms par appel: pool dédié et borné, hors de la boucle
+# d'événements et du pool partagé des autres endpoints
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="bcrypt"
+)
+_password_pending = 0
+
+async def _run_password_task(func, *args):
+    """
+    Exécute un calcul bcrypt dans le pool dédié
+
+    Raises:
+        HTTPException 503: trop de calculs en attente (rafale de connexions)
+    """
+    global _password_pending
+    if _password_pending >= settings.PASSWORD_HASH_MAX_QUEUE:
+        Metrics.increment("password_hash.rejected")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Trop de connexions simultanées. Veuillez réessayer dans un instant.",
+            headers={"Retry-After": "1"}
+        )
+
+    submitted_at = time.perf_counter()
+
+    def task():
+        # Temps passé dans la file avant qu'un thread bcrypt ne soit libre
+        Metrics.observe("password_hash.queue_seconds", time.perf_counter() - submitted_at)
+        return func(*args)
+
+    _password_pending += 1
+    Metrics.set_gauge("password_hash.pending", _password_pending)
+    try:
+        return await asyncio.wrap_future(_password_executor.submit(task))
+    finally:
+        _password_pending -= 1
+        Metrics.set_gauge("password_hash.pending", _password_pending)
+        Metrics.observe("password_hash.total_seconds", time.perf_counter() - submitted_at)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password dans le pool bcrypt"""
+    return await _run_password_task(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash dans le pool bcrypt"""
+    return await _run_password_task(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Crée un token JWT"""
     to_encode = data.copy()
@@ -77,63 +133,143 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    print(f"Creating token with data: {to_encode}, SECRET_KEY length: {len(SECRET_KEY)}")
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    print(f"Token created (length: {len(encoded_jwt)})")
-    return encoded_jwt
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+# Version des tokens d'un utilisateur: compteur écrit dans son fichier de révocation
+# (TOKEN_REVOCATION_DIR), 0 sans révocation. Un token portant une version inférieure
+# à la version courante est révoqué, dans tous les workers et après un redémarrage.
+# Avec plusieurs serveurs, le répertoire doit être partagé.
+# Les versions lues sont gardées en mémoire TOKEN_VERSION_CACHE_TTL secondes: une
+# révocation est immédiate dans le worker qui la fait, et vue par les autres après ce délai.
+_token_versions: Dict[int, Tuple[int, float]] = {}
+_token_versions_lock = threading.Lock()
+
+def _revocation_marker(user_id: int) -> Path:
+    return settings.TOKEN_REVOCATION_DIR / str(user_id)
+
+def _read_token_version(user_id: int) -> int:
+    try:
+        return int(_revocation_marker(user_id).read_text() or 0)
+    except FileNotFoundError:
+        return 0
+    except ValueError:
+        logger.warning("Fichier de révocation illisible pour l'utilisateur %s", user_id)
+        return 0
+
+def get_token_version(user_id: int) -> int:
+    now = time.monotonic()
+    with _token_versions_lock:
+        cached = _token_versions.get(user_id)
+    if cached is not None and now - cached[1] < settings.TOKEN_VERSION_CACHE_TTL:
+        return cached[0]
+    version = _read_token_version(user_id)
+    with _token_versions_lock:
+        _token_versions[user_id] = (version, now)
+    return version
+
+def revoke_user_tokens(user_id: int):
+    """Révoque les tokens déjà émis (mot de passe changé, compte désactivé)"""
+    marker = _revocation_marker(user_id)
+    version = _read_token_version(user_id) + 1
+    # Écriture atomique: un lecteur voit l'ancien ou le nouveau compteur, jamais un fichier vide
+    temp_path = marker.with_name(f".{marker.name}.{os.getpid()}.{threading.get_ident()}")
+    temp_path.write_text(str(version))
+    os.replace(temp_path, marker)
+    with _token_versions_lock:
+        _token_versions[user_id] = (version, time.monotonic())
+
+def password_fingerprint(hashed_password: Optional[str]) -> str:
+    """Empreinte courte du hash: un refresh token meurt avec l'ancien mot de passe"""
+    return hashlib.sha256((hashed_password or "").encode("utf-8")).hexdigest()[:16]
+
+def create_token_pair(user: User) -> dict:
+    """
+    Crée le token d'accès et le refresh token d'un utilisateur
+
+    En mode AUTH_MODE=stateless, le token d'accès est court et embarque le
+    plan, l'état du compte et la version: les endpoints l'autorisent sans
+    accès à la base. Le refresh token (long) relit l'utilisateur en base.
+    """
+    version = get_token_version(user.id)
+    if settings.AUTH_MODE == "stateless":
+        access_claims = {
+            "sub": user.id,
+            "email": user.email,
+            "plan": user.plan.value if hasattr(user.plan, 'value') else str(user.plan),
+            "act": user.is_active,
+            "ver": version,
+            "typ": "access"
+        }
+        access_expires = timedelta(minutes=settings.ACCESS_TOKEN_TTL_MINUTES)
+    else:
+        # La version suffit: le reste est relu en base (cache) à chaque requête
+        access_claims = {"sub": user.id, "email": user.email, "ver": version}
+        access_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+
+    refresh_claims = {
+        "sub": user.id,
+        "ver": version,
+        "pwd": password_fingerprint(user.hashed_password),
+        "typ": "refresh"
+    }
+    return {
+        "access_token": create_access_token(access_claims, access_expires),
+        "refresh_token": create_access_token(refresh_claims, timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)),
+        "token_type": "bearer",
+        "expires_in": int(access_expires.total_seconds())
+    }
+
+def is_token_revoked(payload: dict) -> bool:
+    """True si le token porte une version antérieure à une révocation"""
+    version = payload.get("ver")
+    if version is None:
+        return False
+    try:
+        return version < get_token_version(int(payload.get("sub")))
+    except (ValueError, TypeError):
+        return True
 
 def verify_token(token: str) -> Optional[dict]:
     """Vérifie et décode un token JWT"""
     try:
-        print(f"Verifying token (length: {len(token)}), SECRET_KEY length: {len(SECRET_KEY)}")
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        print(f"Token verified successfully, payload: {payload}")
-        return payload
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError as e:
-        print(f"JWT Error: {str(e)}")
-        print(f"Token (first 50 chars): {token[:50] if len(token) > 50 else token}")
+        logger.debug("JWT Error: %s", e)
         return None
-    except Exception as e:
-        print(f"Error verifying token: {str(e)}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Error verifying token")
         return None
 
-def get_user_by_email(email: str) -> Optional[User]:
-    """Récupère un utilisateur par son email depuis Supabase"""
-    supabase = get_supabase()
+async def get_user_by_email(email: str) -> Optional[User]:
+    """Récupère un utilisateur par son email"""
     try:
-        result = supabase.table("users").select("*").eq("email", email).limit(1).execute()
-        if result.data and len(result.data) > 0:
-            return User.from_dict(result.data[0])
-        return None
+        return await get_user_repository().get_by_email(email)
     except Exception as e:
-        print(f"Error fetching user by email: {e}")
+        logger.error("Error fetching user by email: %s", e)
         return None
 
-def get_user_by_id(user_id: int) -> Optional[User]:
-    """Récupère un utilisateur par son ID depuis Supabase"""
-    supabase = get_supabase()
+async def get_user_by_id(user_id: int) -> Optional[User]:
+    """Récupère un utilisateur par son ID"""
     try:
-        print(f"Fetching user with ID: {user_id} (type: {type(user_id)})")
-        result = supabase.table("users").select("*").eq("id", user_id).limit(1).execute()
-        print(f"Supabase query result: {result}")
-        print(f"Result data: {result.data}")
-        if result.data and len(result.data) > 0:
-            print(f"User found: {result.data[0]}")
-            return User.from_dict(result.data[0])
-        print(f"No user found with ID: {user_id}")
+        user = await get_user_repository().get_by_id(user_id)
+        if user is None:
+            logger.debug("No user found with ID: %s", user_id)
+        return user
+    except Exception:
+        logger.exception("Error fetching user by id")
         return None
+
+async def get_users_by_ids(user_ids: List[int]) -> Dict[int, User]:
+    """Récupère plusieurs utilisateurs en une seule requête (ids inconnus absents)"""
+    try:
+        return await get_user_repository().get_many(user_ids)
     except Exception as e:
-        print(f"Error fetching user by id: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
+        logger.error("Error fetching users by ids: %s", e)
+        return {}
 
-def create_user(email: str, password: str, full_name: Optional[str] = None) -> User:
-    """Crée un nouvel utilisateur dans Supabase"""
-    supabase = get_supabase()
-    hashed_password = get_password_hash(password)
+async def create_user(email: str, password: str, full_name: Optional[str] = None) -> User:
+    """Crée un nouvel utilisateur"""
+    hashed_password = await get_password_hash_async(password)
     
     user_data = {
         "email": email,
@@ -145,21 +281,10 @@ def create_user(email: str, password: str, full_name: Optional[str] = None) -> U
     }
     
     try:
-        print(f"Attempting to insert user with email: {email}")
-        result = supabase.table("users").insert(user_data).execute()
-        print(f"Insert result: {result}")
-        if result.data and len(result.data) > 0:
-            print(f"User created successfully: {result.data[0]}")
-            return User.from_dict(result.data[0])
-        raise Exception("No data returned from insert")
+        return await get_user_repository().create(user_data)
     except Exception as e:
         error_msg = str(e)
-        print(f"Error creating user: {error_msg}")
-        # Afficher plus de détails sur l'erreur
-        if hasattr(e, 'args') and e.args:
-            print(f"Error args: {e.args}")
-        if hasattr(e, 'message'):
-            print(f"Error message: {e.message}")
+        logger.error("Error creating user: %s", error_msg)
         # Si c'est une erreur Supabase/PostgREST, donner plus de contexte
         if "PGRST" in error_msg or "permission" in error_msg.lower() or "row-level security" in error_msg.lower():
             raise Exception(
@@ -170,55 +295,55 @@ def create_user(email: str, password: str, full_name: Optional[str] = None) -> U
             )
         raise
 
-def authenticate_user(email: str, password: str) -> Optional[User]:
+async def authenticate_user(email: str, password: str) -> Optional[User]:
     """Authentifie un utilisateur"""
-    print(f"Authenticating user: {email}")
-    user = get_user_by_email(email)
+    user = await get_user_by_email(email)
     if not user:
-        print(f"User not found: {email}")
+        logger.info("Login failed, user not found: %s", email)
         return None
-    print(f"User found: {user.email}, checking password...")
-    if not verify_password(password, user.hashed_password):
-        print(f"Password verification failed for user: {email}")
+    if not await verify_password_async(password, user.hashed_password):
+        logger.info("Login failed, wrong password for user: %s", email)
         return None
-    print(f"Password verified successfully for user: {email}")
     if not user.is_active:
-        print(f"User is not active: {email}")
+        logger.info("Login failed, user is not active: %s", email)
         return None
-    print(f"User authenticated successfully: {email}")
+    logger.debug("User authenticated: %s", email)
     return user
 
-def update_user_profile(user_id: int, update_data: dict) -> Optional[User]:
+async def update_user_profile(user_id: int, update_data: dict) -> Optional[User]:
     """Met à jour le profil d'un utilisateur"""
-    supabase = get_supabase()
     try:
         # Filtrer les valeurs None
         filtered_data = {k: v for k, v in update_data.items() if v is not None}
         if not filtered_data:
-            return get_user_by_id(user_id)
+            return await get_user_by_id(user_id)
         
         filtered_data["updated_at"] = datetime.utcnow().isoformat()
         
-        result = supabase.table("users").update(filtered_data).eq("id", user_id).execute()
-        if result.data and len(result.data) > 0:
-            return User.from_dict(result.data[0])
-        return None
-    except Exception as e:
-        print(f"Error updating user profile: {e}")
-        import traceback
-        traceback.print_exc()
+        user = await get_user_repository().update(user_id, filtered_data)
+        UserCache.invalidate(user_id)
+        if filtered_data.get("is_active") is False:
+            # Compte désactivé: les tokens déjà émis cessent d'être acceptés
+            revoke_user_tokens(user_id)
+        return user
+    except Exception:
+        logger.exception("Error updating user profile")
         return None
 
-def update_user_password(user_id: int, new_password: str) -> bool:
+async def update_user_password(user_id: int, new_password: str) -> bool:
     """Met à jour le mot de passe d'un utilisateur"""
-    supabase = get_supabase()
     try:
-        hashed_password = get_password_hash(new_password)
-        result = supabase.table("users").update({
+        hashed_password = await get_password_hash_async(new_password)
+        user = await get_user_repository().update(user_id, {
             "hashed_password": hashed_password,
             "updated_at": datetime.utcnow().isoformat()
-        }).eq("id", user_id).execute()
-        return result.data is not None and len(result.data) > 0
+        })
+        UserCache.invalidate(user_id)
+        revoke_user_tokens(user_id)
+        return user is not None
+    except HTTPException:
+        # 503 du pool bcrypt saturé: le client doit réessayer, pas recevoir un 400
+        raise
     except Exception as e:
-        print(f"Error updating password: {e}")
+        logger.error("Error updating password: %s", e)
         return False
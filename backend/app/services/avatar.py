@@ -0,0 +1,117 @@
+import io
+import logging
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from fastapi import HTTPException, status
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Côtés des variantes générées (pixels), la plus grande est la taille par défaut
+AVATAR_SIZES = (64, 128, 256)
+DEFAULT_AVATAR_SIZE = 256
+AVATAR_WEBP_QUALITY = 82
+
+
+class AvatarService:
+    """
+    Photos de profil.
+
+    L'image reçue est décodée une seule fois, recadrée au carré puis
+    enregistrée en variantes WebP de taille fixe (AVATAR_SIZES). Les noms
+    contiennent un identifiant unique: un fichier n'est jamais modifié, ce
+    qui permet un cache navigateur de longue durée.
+    """
+
+    @staticmethod
+    def avatars_dir() -> Path:
+        return settings.UPLOAD_DIR / "avatars"
+
+    @staticmethod
+    def variant_path(avatar_id: str, size: int) -> Path:
+        return AvatarService.avatars_dir() / f"{avatar_id}_{size}.webp"
+
+    @staticmethod
+    def create_variants(content: bytes, user_id: int) -> str:
+        """
+        Décode l'image et écrit ses variantes WebP (bloquant: à appeler hors de la boucle)
+
+        Returns:
+            Identifiant de l'avatar (préfixe des fichiers des variantes)
+
+        Raises:
+            HTTPException 400: contenu illisible comme image
+        """
+        try:
+            with Image.open(io.BytesIO(content)) as image:
+                # Orientation EXIF des photos de téléphone, première image d'un GIF animé
+                image = ImageOps.exif_transpose(image)
+                image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+        except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+            logger.info("Avatar refusé pour l'utilisateur %s: %s", user_id, e)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Le fichier n'est pas une image valide"
+            )
+
+        # Carré centré à la taille de la plus grande variante
+        largest = max(AVATAR_SIZES)
+        image = ImageOps.fit(image, (largest, largest), method=Image.Resampling.LANCZOS)
+
+        avatar_id = f"avatar_{user_id}_{uuid.uuid4()}"
+        avatars_dir = AvatarService.avatars_dir()
+        avatars_dir.mkdir(parents=True, exist_ok=True)
+        # De la plus grande à la plus petite: chaque réduction part de la précédente
+        for size in sorted(AVATAR_SIZES, reverse=True):
+            if image.width != size:
+                image = image.resize((size, size), Image.Resampling.LANCZOS)
+            image.save(AvatarService.variant_path(avatar_id, size), "WEBP", quality=AVATAR_WEBP_QUALITY, method=4)
+        return avatar_id
+
+    @staticmethod
+    def avatar_url(avatar_id: str) -> str:
+        return f"/api/auth/avatars/{avatar_id}.webp"
+
+    @staticmethod
+    def resolve(filename: str, size: Optional[int] = None) -> Optional[Path]:
+        """
+        Fichier à servir pour une URL d'avatar, ou None s'il n'existe pas
+
+        Les avatars envoyés avant la génération des variantes sont servis tels quels.
+        """
+        if "/" in filename or "\\" in filename or filename.startswith("."):
+            return None
+        avatar_id, _, ext = filename.rpartition(".")
+        if ext == "webp":
+            if size not in AVATAR_SIZES:
+                # Plus petite variante suffisante pour la taille demandée
+                size = min((s for s in AVATAR_SIZES if size is not None and s >= size), default=DEFAULT_AVATAR_SIZE)
+            path = AvatarService.variant_path(avatar_id, size)
+            if path.exists():
+                return path
+        path = AvatarService.avatars_dir() / filename
+        return path if path.is_file() else None
+
+    @staticmethod
+    def delete(avatar_url: Optional[str], user_id: int):
+        """Supprime les fichiers d'un ancien avatar de l'utilisateur (variantes ou fichier d'origine)"""
+        if not avatar_url:
+            return
+        filename = avatar_url.rsplit("/", 1)[-1]
+        # avatar_url est modifiable via le profil: ne jamais toucher aux fichiers d'un autre
+        if not filename.startswith(f"avatar_{user_id}_") or filename.startswith("."):
+            return
+        avatar_id = filename.rpartition(".")[0]
+        paths = [AvatarService.variant_path(avatar_id, size) for size in AVATAR_SIZES]
+        paths.append(AvatarService.avatars_dir() / filename)
+        for path in paths:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("Impossible de supprimer l'avatar %s: %s", path, e)
@@ -0,0 +1,248 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from ..core.config import settings
+from ..core.storage import get_storage, storage_key
+
+logger = logging.getLogger(__name__)
+
+
+class BlobStore:
+    """
+    Stockage des uploads par contenu.
+
+    Chaque contenu est écrit une seule fois dans BLOB_DIR sous son SHA-256.
+    Les noms donnés aux utilisateurs ({uuid}.{ext}) pointent vers ce blob,
+    qui compte ses références: deux uploads identiques partagent le même
+    fichier, donc aussi l'analyse et l'empreinte déjà calculées.
+
+    Les écritures se font dans une transaction SQLite "IMMEDIATE": entre
+    workers, un blob ne peut pas être supprimé pendant qu'un upload
+    identique le réutilise.
+
+    Avec un stockage partagé (STORAGE_BACKEND=s3...), le blob et un pointeur
+    "uploads/refs/{nom}" y sont aussi envoyés: une autre réplique retrouve
+    l'upload sans avoir l'index local. Le blob partagé est effacé avec la
+    dernière référence, comme le fichier local.
+    """
+
+    _lock = threading.Lock()
+    _connection: Optional[sqlite3.Connection] = None
+
+    @classmethod
+    def _db(cls) -> sqlite3.Connection:
+        if cls._connection is None:
+            # isolation_level=None: transactions explicites (BEGIN IMMEDIATE)
+            connection = sqlite3.connect(str(settings.BLOB_DB), check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                "hash TEXT PRIMARY KEY, ext TEXT NOT NULL, size INTEGER NOT NULL, "
+                "refcount INTEGER NOT NULL, created_at REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                "filename TEXT PRIMARY KEY, hash TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_uploads_hash ON uploads(hash)")
+            # Métadonnées audio relevées à l'upload (JSON), par contenu
+            connection.execute("CREATE TABLE IF NOT EXISTS media (hash TEXT PRIMARY KEY, info TEXT NOT NULL)")
+            cls._connection = connection
+        return cls._connection
+
+    @classmethod
+    @contextmanager
+    def _transaction(cls) -> Iterator[sqlite3.Connection]:
+        db = cls._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    @staticmethod
+    def blob_path(sha256: str, ext: str) -> Path:
+        return settings.BLOB_DIR / f"{sha256}.{ext}"
+
+    @staticmethod
+    def _ref_key(filename: str) -> str:
+        return f"uploads/refs/{filename}"
+
+    @classmethod
+    def _publish(cls, filename: str, blob: Path):
+        """Envoie le blob (s'il n'y est pas déjà) et le pointeur du nom vers le stockage partagé"""
+        storage = get_storage()
+        if storage.in_place:
+            return
+        key = storage_key(blob)
+        if storage.size(key) is None:
+            storage.put_file(key, blob)
+        storage.put_bytes(cls._ref_key(filename), blob.name.encode("utf-8"))
+
+    @classmethod
+    def store(cls, temp_path: Path, sha256: str, ext: str, media: Optional[Dict] = None) -> str:
+        """
+        Enregistre un fichier reçu et lui attribue un nom (bloquant: à appeler hors de la boucle)
+
+        Si le contenu est déjà stocké, le fichier temporaire est supprimé et
+        le blob existant gagne une référence. `media`: métadonnées audio du
+        contenu (voir UploadService.probe).
+
+        Returns:
+            Nom du fichier pour l'utilisateur ({uuid}.{ext})
+        """
+        filename = f"{uuid.uuid4()}.{ext}"
+        now = time.time()
+        with cls._lock, cls._transaction() as db:
+            row = db.execute("SELECT ext FROM blobs WHERE hash = ?", (sha256,)).fetchone()
+            if row is not None and cls.blob_path(sha256, row[0]).exists():
+                db.execute("UPDATE blobs SET refcount = refcount + 1 WHERE hash = ?", (sha256,))
+                temp_path.unlink(missing_ok=True)
+                blob = cls.blob_path(sha256, row[0])
+                logger.info("Upload %s: contenu déjà stocké (%s)", filename, sha256)
+            else:
+                # Nouveau contenu (ou blob disparu du disque: il est réécrit)
+                size = temp_path.stat().st_size
+                blob = cls.blob_path(sha256, ext)
+                os.replace(temp_path, blob)
+                db.execute(
+                    "INSERT INTO blobs VALUES (?, ?, ?, 1, ?) "
+                    "ON CONFLICT(hash) DO UPDATE SET ext = excluded.ext, refcount = refcount + 1",
+                    (sha256, ext, size, now)
+                )
+            db.execute("INSERT INTO uploads VALUES (?, ?, ?)", (filename, sha256, now))
+            if media is not None:
+                db.execute("INSERT OR REPLACE INTO media VALUES (?, ?)", (sha256, json.dumps(media)))
+        try:
+            cls._publish(filename, blob)
+        except Exception:
+            cls.release(filename)
+            raise
+        return filename
+
+    @classmethod
+    def resolve(cls, filename: str) -> Optional[Path]:
+        """
+        Chemin du blob d'un upload, ou None si le nom est inconnu
+
+        Le fichier peut n'exister que dans le stockage partagé (upload reçu
+        par une autre réplique): voir storage.ensure_local.
+        """
+        with cls._lock:
+            row = cls._db().execute(
+                "SELECT b.hash, b.ext FROM uploads u JOIN blobs b ON b.hash = u.hash WHERE u.filename = ?",
+                (filename,)
+            ).fetchone()
+        if row is not None:
+            return cls.blob_path(*row)
+        storage = get_storage()
+        if storage.in_place or "/" in filename:
+            return None
+        blob_name = storage.get_bytes(cls._ref_key(filename))
+        if blob_name is None:
+            return None
+        return settings.BLOB_DIR / Path(blob_name.decode("utf-8")).name
+
+    @classmethod
+    def media_info(cls, filename: str) -> Optional[Dict]:
+        """Métadonnées audio d'un upload, ou None si inconnues"""
+        with cls._lock:
+            row = cls._db().execute(
+                "SELECT m.info FROM uploads u JOIN media m ON m.hash = u.hash WHERE u.filename = ?",
+                (filename,)
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    @classmethod
+    def filenames_for(cls, blob_name: str) -> List[str]:
+        """Noms d'upload pointant vers un blob ("{sha256}.{ext}"), du plus ancien au plus récent"""
+        sha256 = blob_name.partition(".")[0]
+        with cls._lock:
+            rows = cls._db().execute(
+                "SELECT filename FROM uploads WHERE hash = ? ORDER BY created_at, rowid",
+                (sha256,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    @classmethod
+    def total_size(cls) -> int:
+        """Octets occupés par les blobs (chaque contenu compté une fois)"""
+        with cls._lock:
+            return cls._db().execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    @classmethod
+    def release(cls, filename: str) -> int:
+        """
+        Supprime un nom d'upload; le blob est effacé avec sa dernière référence
+
+        Seul le compteur de références est modifié dans la transaction: le
+        blob est mis de côté (renommage local), puis effacé du disque et du
+        stockage partagé après la transaction, sans tenir le verrou pendant
+        les appels réseau.
+
+        Returns:
+            Octets libérés sur le disque (0 si le blob reste référencé ou si le nom est inconnu)
+        """
+        removed: Optional[Path] = None
+        with cls._lock, cls._transaction() as db:
+            row = db.execute(
+                "SELECT b.hash, b.ext, b.refcount FROM uploads u JOIN blobs b ON b.hash = u.hash "
+                "WHERE u.filename = ?",
+                (filename,)
+            ).fetchone()
+            if row is None:
+                return 0
+            sha256, ext, refcount = row
+            db.execute("DELETE FROM uploads WHERE filename = ?", (filename,))
+            if refcount > 1:
+                db.execute("UPDATE blobs SET refcount = refcount - 1 WHERE hash = ?", (sha256,))
+                size = 0
+            else:
+                size = db.execute("SELECT size FROM blobs WHERE hash = ?", (sha256,)).fetchone()[0]
+                db.execute("DELETE FROM blobs WHERE hash = ?", (sha256,))
+                db.execute("DELETE FROM media WHERE hash = ?", (sha256,))
+                # Dans la transaction: un upload identique qui suit réécrit un nouveau blob
+                # au lieu de reprendre celui-ci, que l'on efface ensuite
+                blob = cls.blob_path(sha256, ext)
+                removed = blob.with_name(f".{blob.name}.{uuid.uuid4().hex}.deleted")
+                try:
+                    os.replace(blob, removed)
+                except FileNotFoundError:
+                    removed = None
+
+        storage = get_storage()
+        if not storage.in_place:
+            try:
+                storage.delete(cls._ref_key(filename))
+                if size:
+                    cls._delete_shared(storage, sha256, ext)
+            except Exception as e:
+                logger.warning("Impossible de supprimer %s du stockage partagé: %s", filename, e)
+        if removed is not None:
+            removed.unlink(missing_ok=True)
+        if size:
+            logger.info("Blob supprimé: %s", sha256)
+        return size
+
+    @classmethod
+    def _delete_shared(cls, storage, sha256: str, ext: str):
+        """Efface le blob du stockage partagé, sauf s'il a été réenregistré entre-temps"""
+        blob = cls.blob_path(sha256, ext)
+        key = storage_key(blob)
+        storage.delete(key)
+        with cls._lock:
+            stored_again = cls._db().execute("SELECT 1 FROM blobs WHERE hash = ?", (sha256,)).fetchone()
+        if stored_again is not None and blob.exists():
+            # Upload identique reçu pendant la suppression: il doit rester disponible aux autres répliques
+            storage.put_file(key, blob)
@@ -0,0 +1,238 @@
+import asyncio
+import hashlib
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import anyio
+import soundfile as sf
+from fastapi import HTTPException, status
+from starlette.responses import FileResponse
+from starlette.types import Receive, Scope, Send
+
+from ..core.config import settings
+from .storage_lifecycle import KIND_TRANSCODE, StorageLifecycle
+
+logger = logging.getLogger(__name__)
+
+# Formats servis: extension -> (type MIME, format libsndfile, sous-type imposé)
+DOWNLOAD_FORMATS: Dict[str, Tuple[str, Optional[str], Optional[str]]] = {
+    "wav": ("audio/wav", "WAV", None),
+    "flac": ("audio/flac", "FLAC", None),
+    "ogg": ("audio/ogg", "OGG", "VORBIS"),
+    # Source uniquement (pas de conversion vers le MP3)
+    "mp3": ("audio/mpeg", None, None),
+}
+# Sources en haute résolution: converties en 24 bits plutôt qu'en 16 bits
+_HIGH_RES_SUBTYPES = {"PCM_24", "PCM_32", "FLOAT", "DOUBLE"}
+# Trames lues/écrites par bloc pendant une conversion
+_TRANSCODE_BLOCK_FRAMES = 65536
+
+
+class RangeFileResponse(FileResponse):
+    """
+    FileResponse limitée à une plage d'octets (réponse 206)
+
+    Le fichier est envoyé par le serveur (extension ASGI "zerocopy", sendfile)
+    quand il la propose, sinon lu par blocs: jamais chargé en mémoire.
+    """
+
+    def __init__(self, path: Path, byte_range: Optional[Tuple[int, int]] = None, **kwargs):
+        super().__init__(path, **kwargs)
+        file_size = self.stat_result.st_size
+        self.start, self.end = byte_range if byte_range is not None else (0, file_size - 1)
+        self.headers["content-length"] = str(self.end - self.start + 1)
+        if byte_range is not None:
+            self.status_code = status.HTTP_206_PARTIAL_CONTENT
+            self.headers["content-range"] = f"bytes {self.start}-{self.end}/{file_size}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        remaining = self.end - self.start + 1
+        if scope["method"].upper() == "HEAD" or remaining <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopy" in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": file,
+                    "offset": self.start,
+                    "count": remaining,
+                    "more_body": False
+                })
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                await file.seek(self.start)
+                while remaining > 0:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                if remaining > 0:
+                    # Fichier raccourci pendant l'envoi: terminer la réponse proprement
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+
+class DownloadService:
+    """
+    Téléchargements: choix du format, conversions mises en cache, plages d'octets.
+
+    Une conversion (FLAC, OGG...) est calculée une seule fois par fichier
+    source dans TRANSCODE_CACHE_DIR, dans un pool de threads dédié; les
+    demandes simultanées du même variant partagent le même calcul.
+    """
+
+    _executor = ThreadPoolExecutor(
+        max_workers=settings.TRANSCODE_WORKERS,
+        thread_name_prefix="transcode"
+    )
+    _in_flight: Dict[Path, asyncio.Future] = {}
+
+    @staticmethod
+    def source_key(path: Path, size: Optional[int] = None) -> str:
+        """
+        Identité du fichier source (nom et taille)
+
+        Les fichiers servis ont des noms uniques jamais réécrits (blobs,
+        rendus): la clé est la même sur toutes les répliques.
+        """
+        if size is None:
+            size = path.stat().st_size
+        identity = f"{path.name}:{size}"
+        return hashlib.sha256(identity.encode("utf-8")).hexdigest()[:32]
+
+    @staticmethod
+    def negotiate(source_format: str, requested: Optional[str], accept: Optional[str]) -> str:
+        """
+        Format à servir: paramètre ?format=, sinon en-tête Accept, sinon format source
+
+        Raises:
+            HTTPException 400: format demandé non disponible
+        """
+        if requested:
+            requested = requested.lower()
+            if requested != source_format and DOWNLOAD_FORMATS.get(requested, (None, None))[1] is None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Format not available. Allowed: {[f for f, (_, sf_format, _) in DOWNLOAD_FORMATS.items() if sf_format]}"
+                )
+            return requested
+        if accept:
+            # Types listés par préférence décroissante (q=...)
+            candidates = []
+            for position, item in enumerate(accept.split(",")):
+                media_type, _, params = item.strip().partition(";")
+                quality = 1.0
+                for param in params.split(";"):
+                    name, _, value = param.strip().partition("=")
+                    if name == "q":
+                        try:
+                            quality = float(value)
+                        except ValueError:
+                            quality = 0.0
+                candidates.append((-quality, position, media_type.strip().lower()))
+            for negative_quality, _, media_type in sorted(candidates):
+                if negative_quality == 0:
+                    break
+                if media_type in ("*/*", "audio/*", DOWNLOAD_FORMATS.get(source_format, ("",))[0]):
+                    return source_format
+                for fmt, (fmt_media_type, sf_format, _) in DOWNLOAD_FORMATS.items():
+                    if media_type == fmt_media_type and sf_format is not None:
+                        return fmt
+        return source_format
+
+    @staticmethod
+    def _transcode(source: Path, target: Path, fmt: str):
+        """Convertit le fichier par blocs (bloquant) puis le publie d'un seul coup"""
+        _, sf_format, subtype = DOWNLOAD_FORMATS[fmt]
+        temp_path = target.with_name(f".{target.name}.{uuid.uuid4().hex}.part")
+        try:
+            with sf.SoundFile(str(source)) as src:
+                if subtype is None:
+                    subtype = "PCM_24" if src.subtype in _HIGH_RES_SUBTYPES else "PCM_16"
+                with sf.SoundFile(
+                    str(temp_path), "w",
+                    samplerate=src.samplerate,
+                    channels=src.channels,
+                    format=sf_format,
+                    subtype=subtype
+                ) as dst:
+                    for block in src.blocks(blocksize=_TRANSCODE_BLOCK_FRAMES, dtype="float32", always_2d=True):
+                        dst.write(block)
+            os.replace(temp_path, target)
+            StorageLifecycle.track(KIND_TRANSCODE, target.name, target.stat().st_size)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+
+    @classmethod
+    async def variant(cls, source: Path, fmt: str) -> Path:
+        """
+        Fichier à servir pour le format demandé (le fichier source s'il est déjà au bon format)
+
+        Raises:
+            HTTPException 422: source illisible par libsndfile
+        """
+        if source.suffix.lower().lstrip(".") == fmt:
+            return source
+        target = settings.TRANSCODE_CACHE_DIR / f"{cls.source_key(source)}.{fmt}"
+        if target.exists():
+            StorageLifecycle.touch(KIND_TRANSCODE, target.name)
+            return target
+
+        future = cls._in_flight.get(target)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(cls._executor, cls._transcode, source, target, fmt)
+            cls._in_flight[target] = future
+            future.add_done_callback(lambda _: cls._in_flight.pop(target, None))
+        try:
+            # shield: l'annulation d'un client ne doit pas annuler la conversion partagée
+            await asyncio.shield(future)
+        except RuntimeError as e:  # sf.LibsndfileError
+            logger.warning("Conversion %s -> %s impossible: %s", source.name, fmt, e)
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Cannot convert this file to {fmt}"
+            )
+        return target
+
+    @staticmethod
+    def parse_range(header: Optional[str], file_size: int) -> Optional[Tuple[int, int]]:
+        """
+        Plage demandée (début, fin incluse), ou None pour envoyer tout le fichier
+
+        Seule une plage unique est prise en charge: une demande de plusieurs
+        plages reçoit le fichier complet, ce que permet la RFC 9110.
+
+        Raises:
+            HTTPException 416: plage hors du fichier
+        """
+        if not header or not header.startswith("bytes=") or "," in header:
+            return None
+        first, _, last = header[len("bytes="):].strip().partition("-")
+        try:
+            if first:
+                start = int(first)
+                end = int(last) if last else file_size - 1
+            else:
+                # "bytes=-500": les 500 derniers octets
+                start = max(file_size - int(last), 0)
+                end = file_size - 1
+        except ValueError:
+            return None
+        if start >= file_size:
+            raise HTTPException(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                detail="Requested range not satisfiable",
+                headers={"Content-Range": f"bytes */{file_size}"}
+            )
+        if start > end or start < 0:
+            return None
+        return start, min(end, file_size - 1)
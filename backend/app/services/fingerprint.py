@@ -0,0 +1,395 @@
+import logging
+import sqlite3
+import threading
+from collections import Counter, deque
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import soundfile as sf
+from scipy.ndimage import maximum_filter
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Paramètres de l'empreinte (indépendants de la fréquence d'échantillonnage:
+# fenêtre de 100 ms => résolution de 10 Hz quel que soit le sr)
+WINDOW_SECONDS = 0.1
+HOP_SECONDS = 0.05
+MAX_FREQ_HZ = 4000.0
+# Voisinage pour la détection des pics (en bins de fréquence x trames)
+PEAK_NEIGHBORHOOD_FREQ = 15
+PEAK_NEIGHBORHOOD_TIME = 7
+# Seuil absolu (dB relatif à la pleine échelle) pour ignorer les silences
+PEAK_FLOOR_DB = -60.0
+# Appairage des pics (landmarks): chaque ancre est combinée à ses FAN_OUT
+# premiers voisins situés entre 1 et MAX_DT trames plus loin
+FAN_OUT = 5
+MAX_DT = 63
+# Nombre de trames analysées par bloc lu sur le disque
+FRAMES_PER_BLOCK = 256
+# Morceau apparenté (remix, nouveau master, extrait): hashes alignés sur un
+# même décalage. Le lien est enregistré, chaque fichier garde son analyse
+RELATED_MIN_MATCH_COUNT = 20
+RELATED_MIN_MATCH_RATIO = 0.05
+# Doublon (même analyse): correspondance quasi totale dans les deux sens,
+# même durée et même niveau - un master plus fort a les mêmes pics
+DUPLICATE_MIN_MATCH_RATIO = 0.9
+DUPLICATE_DURATION_TOLERANCE = 0.005
+DUPLICATE_LEVEL_TOLERANCE_DB = 0.1
+# Les hashes trop fréquents (silences, bruit) ne sont pas discriminants
+MAX_POSTINGS_PER_HASH = 500
+
+
+class _PeakPicker:
+    """Détection incrémentale des pics spectraux sur un spectrogramme reçu par blocs"""
+
+    def __init__(self):
+        self.radius = PEAK_NEIGHBORHOOD_TIME // 2
+        self.buffer = None  # log-magnitudes (bins x trames) encore sans contexte complet
+        self.buffer_start = 0  # index de la première trame du buffer
+        self.next_frame = 0  # prochaine trame à émettre
+
+    def push(self, spectrogram: np.ndarray, final: bool = False) -> Iterator[Tuple[int, int]]:
+        if spectrogram.size:
+            if self.buffer is None:
+                self.buffer = spectrogram
+            else:
+                self.buffer = np.concatenate([self.buffer, spectrogram], axis=1)
+        if self.buffer is None or self.buffer.shape[1] == 0:
+            return
+
+        n_frames = self.buffer.shape[1]
+        # Sans la fin du fichier, les dernières trames n'ont pas encore leur contexte
+        ready_until = n_frames if final else n_frames - self.radius
+        if ready_until > self.next_frame - self.buffer_start:
+            local_max = maximum_filter(
+                self.buffer,
+                size=(PEAK_NEIGHBORHOOD_FREQ, PEAK_NEIGHBORHOOD_TIME),
+                mode="constant",
+                cval=-np.inf
+            )
+            peaks = (self.buffer == local_max) & (self.buffer > PEAK_FLOOR_DB)
+            first = self.next_frame - self.buffer_start
+            freqs, frames = np.nonzero(peaks[:, first:ready_until])
+            order = np.lexsort((freqs, frames))
+            for index in order:
+                yield self.buffer_start + first + int(frames[index]), int(freqs[index])
+            self.next_frame = self.buffer_start + ready_until
+
+        # Garder seulement le contexte nécessaire pour le bloc suivant
+        keep_from = max(0, self.next_frame - self.buffer_start - self.radius)
+        self.buffer = self.buffer[:, keep_from:]
+        self.buffer_start += keep_from
+
+
+class FingerprintService:
+    """
+    Empreintes audio par landmarks (paires de pics spectraux) et index inversé
+    pour détecter les fichiers déjà uploadés sous un autre nom ou encodage.
+    """
+
+    # Recherche et indexation d'un upload (tenu pendant tout register())
+    _lock = threading.RLock()
+    # Verrou court des noms en mémoire: les lectures faites depuis la boucle
+    # d'événements n'attendent pas un register() en cours
+    _names_lock = threading.Lock()
+    _connection: Optional[sqlite3.Connection] = None
+    # hash -> [(nom du fichier, trame de l'ancre)]
+    _index: Optional[Dict[int, List[Tuple[str, int]]]] = None
+    # nom du fichier -> nom du fichier canonique (lui-même s'il n'est pas un doublon)
+    _canonical: Optional[Dict[str, str]] = None
+    # nom du fichier -> fichier apparenté le plus proche (remix, autre master...)
+    _related: Optional[Dict[str, str]] = None
+    # nom du fichier -> (nombre de hashes, durée, niveau RMS en dB)
+    _signatures: Optional[Dict[str, Tuple[int, Optional[float], Optional[float]]]] = None
+
+    @classmethod
+    def _db(cls) -> sqlite3.Connection:
+        if cls._connection is None:
+            connection = sqlite3.connect(str(settings.FINGERPRINT_DB), check_same_thread=False)
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS tracks ("
+                "filename TEXT PRIMARY KEY, canonical TEXT NOT NULL, hash_count INTEGER NOT NULL, "
+                "related TEXT, duration REAL, rms_db REAL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS fingerprints ("
+                "hash INTEGER NOT NULL, filename TEXT NOT NULL, offset INTEGER NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_fingerprints_hash ON fingerprints(hash)")
+            connection.commit()
+            cls._connection = connection
+        return cls._connection
+
+    @classmethod
+    def load(cls):
+        """
+        Charge l'index inversé et la table des morceaux en mémoire (une seule fois)
+
+        Bloquant: appelé au démarrage hors de la boucle d'événements.
+        """
+        with cls._lock:
+            if cls._index is not None:
+                return
+            db = cls._db()
+            canonical = {}
+            related = {}
+            signatures = {}
+            for filename, canonical_name, hash_count, related_name, duration, rms_db in db.execute(
+                "SELECT filename, canonical, hash_count, related, duration, rms_db FROM tracks"
+            ):
+                canonical[filename] = canonical_name
+                if related_name is not None:
+                    related[filename] = related_name
+                signatures[filename] = (hash_count, duration, rms_db)
+            index: Dict[int, List[Tuple[str, int]]] = {}
+            for hash_value, filename, offset in db.execute("SELECT hash, filename, offset FROM fingerprints"):
+                index.setdefault(hash_value, []).append((filename, offset))
+            cls._signatures = signatures
+            with cls._names_lock:
+                cls._canonical = canonical
+                cls._related = related
+            cls._index = index
+
+    # === Extraction ===
+
+    @staticmethod
+    def _read_blocks(file_path: Path) -> Iterator[Tuple[np.ndarray, int, int, int]]:
+        """
+        Lit le fichier en flux et produit des blocs de trames contiguës.
+
+        Yields:
+            (bloc mono, sr, taille de fenêtre, pas) - les blocs se chevauchent
+            de façon à ce que les trames se suivent sans trou ni doublon.
+        """
+        try:
+            info = sf.info(str(file_path))
+            sr = info.samplerate
+            n_fft = int(round(sr * WINDOW_SECONDS))
+            hop = int(round(sr * HOP_SECONDS))
+            blocksize = n_fft + (FRAMES_PER_BLOCK - 1) * hop
+            overlap = n_fft - hop
+            frames_left = info.frames
+            for block in sf.blocks(
+                str(file_path),
+                blocksize=blocksize,
+                overlap=overlap,
+                dtype="float32",
+                always_2d=True
+            ):
+                # sf.blocks complète le dernier bloc par des zéros: ne garder que le fichier
+                carried = overlap if frames_left < info.frames else 0
+                valid = min(len(block), frames_left + carried)
+                frames_left -= valid - carried
+                yield block[:valid].mean(axis=1), sr, n_fft, hop
+        except RuntimeError:
+            # Format non supporté par libsndfile: décodage complet via audioread
+            from .audio_loader import AudioLoader
+            y, sr = AudioLoader.load(file_path, sr=8000)
+            n_fft = int(round(sr * WINDOW_SECONDS))
+            hop = int(round(sr * HOP_SECONDS))
+            step = FRAMES_PER_BLOCK * hop
+            for start in range(0, len(y), step):
+                yield y[start:start + step + n_fft - hop], sr, n_fft, hop
+
+    @staticmethod
+    def _spectrogram(block: np.ndarray, sr: int, n_fft: int, hop: int) -> np.ndarray:
+        """Spectrogramme en dB (bins de 10 Hz jusqu'à MAX_FREQ_HZ) d'un bloc"""
+        if len(block) < n_fft:
+            return np.empty((0, 0), dtype=np.float32)
+        frames = np.lib.stride_tricks.sliding_window_view(block, n_fft)[::hop]
+        window = np.hanning(n_fft).astype(np.float32)
+        magnitude = np.abs(np.fft.rfft(frames * window, axis=1)) / (window.sum() / 2)
+        n_bins = min(magnitude.shape[1], int(MAX_FREQ_HZ * WINDOW_SECONDS) + 1)
+        return (20 * np.log10(magnitude[:, :n_bins] + 1e-10)).T
+
+    @staticmethod
+    def fingerprint(file_path: Path) -> List[Tuple[int, int]]:
+        """
+        Calcule les hashes de landmarks d'un fichier audio en un seul passage
+
+        Returns:
+            Liste de (hash, trame de l'ancre)
+        """
+        return FingerprintService.signature(file_path)[0]
+
+    @staticmethod
+    def signature(file_path: Path) -> Tuple[List[Tuple[int, int]], float, float]:
+        """
+        Empreinte, durée (secondes) et niveau RMS (dB) d'un fichier, en un seul passage
+
+        Returns:
+            (liste de (hash, trame de l'ancre), durée, niveau RMS)
+        """
+        picker = _PeakPicker()
+        anchors = deque()  # [trame, bin, nombre de cibles déjà appairées]
+        hashes: List[Tuple[int, int]] = []
+
+        def pair(peaks):
+            for frame, freq in peaks:
+                while anchors and frame - anchors[0][0] > MAX_DT:
+                    anchors.popleft()
+                for anchor in anchors:
+                    dt = frame - anchor[0]
+                    if dt < 1 or anchor[2] >= FAN_OUT:
+                        continue
+                    hashes.append(((anchor[1] << 18) | (freq << 8) | dt, anchor[0]))
+                    anchor[2] += 1
+                anchors.append([frame, freq, 0])
+
+        n_samples = 0
+        energy = 0.0
+        sr = 1
+        for block, sr, n_fft, hop in FingerprintService._read_blocks(file_path):
+            pair(picker.push(FingerprintService._spectrogram(block, sr, n_fft, hop)))
+            # Les blocs se chevauchent de n_fft - hop échantillons: ne compter que les nouveaux
+            new_samples = block if n_samples == 0 else block[n_fft - hop:]
+            n_samples += len(new_samples)
+            energy += float(np.dot(new_samples, new_samples))
+        pair(picker.push(np.empty((0, 0), dtype=np.float32), final=True))
+        rms = np.sqrt(energy / n_samples) if n_samples else 0.0
+        return hashes, n_samples / sr, float(20 * np.log10(rms + 1e-10))
+
+    # === Index et détection des doublons ===
+
+    @classmethod
+    def match(cls, hashes: List[Tuple[int, int]]) -> Optional[Tuple[str, int]]:
+        """
+        Cherche le fichier indexé le plus proche
+
+        Returns:
+            (nom du fichier, nombre de hashes alignés) ou None
+        """
+        with cls._lock:
+            cls.load()
+            votes = Counter()
+            for hash_value, offset in hashes:
+                postings = cls._index.get(hash_value)
+                if not postings or len(postings) > MAX_POSTINGS_PER_HASH:
+                    continue
+                for filename, indexed_offset in postings:
+                    votes[(filename, indexed_offset - offset)] += 1
+        if not votes:
+            return None
+        (filename, _), count = votes.most_common(1)[0]
+        return filename, count
+
+    @classmethod
+    def _is_duplicate(
+        cls,
+        matched: str,
+        count: int,
+        hashes: List[Tuple[int, int]],
+        duration: float,
+        rms_db: float
+    ) -> bool:
+        """Correspondance quasi totale avec le fichier indexé (appelant: verrou tenu)"""
+        hash_count, matched_duration, matched_rms_db = cls._signatures.get(matched, (0, None, None))
+        if matched_duration is None or matched_rms_db is None:
+            return False
+        return (
+            count >= DUPLICATE_MIN_MATCH_RATIO * max(len(hashes), hash_count)
+            and abs(duration - matched_duration) <= DUPLICATE_DURATION_TOLERANCE * max(duration, matched_duration)
+            and abs(rms_db - matched_rms_db) <= DUPLICATE_LEVEL_TOLERANCE_DB
+        )
+
+    @classmethod
+    def register(cls, file_path: Path) -> Optional[str]:
+        """
+        Calcule l'empreinte d'un fichier uploadé et l'ajoute à l'index
+
+        Un doublon (même audio) partage ensuite l'analyse de son fichier
+        canonique. Un morceau seulement apparenté (remix, autre master) est
+        indexé comme nouveau, avec un lien vers le plus proche (`related`).
+
+        Returns:
+            Le nom du fichier canonique si c'est un doublon, sinon None
+        """
+        hashes, duration, rms_db = cls.signature(file_path)
+        filename = file_path.name
+
+        # Recherche et insertion sous le même verrou: deux uploads identiques
+        # simultanés ne peuvent pas être indexés tous deux comme nouveaux
+        with cls._lock:
+            cls.load()
+            if filename in cls._canonical:
+                canonical = cls._canonical[filename]
+                return canonical if canonical != filename else None
+            best = cls.match(hashes) if hashes else None
+            related = None
+            db = cls._db()
+            if best is not None:
+                matched, count = best
+                if cls._is_duplicate(matched, count, hashes, duration, rms_db):
+                    canonical = cls._canonical.get(matched, matched)
+                    db.execute(
+                        "INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?)",
+                        (filename, canonical, len(hashes), matched, duration, rms_db)
+                    )
+                    db.commit()
+                    with cls._names_lock:
+                        cls._canonical[filename] = canonical
+                    cls._signatures[filename] = (len(hashes), duration, rms_db)
+                    logger.info("Duplicate detected: %s -> %s (%d/%d hashes)", filename, canonical, count, len(hashes))
+                    return canonical
+                if count >= RELATED_MIN_MATCH_COUNT and count >= RELATED_MIN_MATCH_RATIO * len(hashes):
+                    related = cls._canonical.get(matched, matched)
+                    logger.info("Related track: %s ~ %s (%d/%d hashes)", filename, related, count, len(hashes))
+
+            # Nouveau morceau: indexer ses hashes
+            db.execute(
+                "INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?)",
+                (filename, filename, len(hashes), related, duration, rms_db)
+            )
+            db.executemany(
+                "INSERT INTO fingerprints VALUES (?, ?, ?)",
+                ((hash_value, filename, offset) for hash_value, offset in hashes)
+            )
+            db.commit()
+            with cls._names_lock:
+                cls._canonical[filename] = filename
+                if related is not None:
+                    cls._related[filename] = related
+            cls._signatures[filename] = (len(hashes), duration, rms_db)
+            for hash_value, offset in hashes:
+                cls._index.setdefault(hash_value, []).append((filename, offset))
+        return None
+
+    @classmethod
+    def _names(cls):
+        """Tables en mémoire (chargées au démarrage; sinon au premier appel)"""
+        if cls._canonical is None:
+            cls.load()
+
+    @classmethod
+    def related_name(cls, filename: str) -> Optional[str]:
+        """Fichier apparenté le plus proche (remix, autre master...), ou None"""
+        cls._names()
+        with cls._names_lock:
+            return cls._related.get(filename)
+
+    @classmethod
+    def is_registered(cls, filename: str) -> bool:
+        """True si l'empreinte du fichier est déjà indexée"""
+        cls._names()
+        with cls._names_lock:
+            return filename in cls._canonical
+
+    @classmethod
+    def canonical_name(cls, filename: str) -> str:
+        """Retourne le fichier de référence d'un upload (lui-même s'il est unique)"""
+        cls._names()
+        with cls._names_lock:
+            return cls._canonical.get(filename, filename)
+
+    @classmethod
+    def resolve_path(cls, file_path: Path) -> Path:
+        """Chemin du fichier canonique, utilisé comme clé par les caches d'analyse"""
+        canonical = cls.canonical_name(file_path.name)
+        if canonical != file_path.name:
+            canonical_path = file_path.with_name(canonical)
+            if canonical_path.exists():
+                return canonical_path
+        return file_path
@@ -1,128 +1,62 @@
-import os
-import warnings
-from typing import Dict, Optional
-
-# Essayer d'importer le nouveau package, sinon utiliser l'ancien
-try:
-    import google.genai as genai
-    USE_NEW_PACKAGE = True
-except ImportError:
-    # Supprimer le warning FutureWarning pour l'ancien package
-    warnings.filterwarnings('ignore', category=FutureWarning, message='.*google.generativeai.*')
-    import google.generativeai as genai
-    USE_NEW_PACKAGE = False
+import asyncio
+import logging
+import re
+from typing import Dict, Iterator, List, Optional
 
-class GeminiAIService:
-    """Service pour interagir avec l'API Gemini AI de Google"""
-    
-    @staticmethod
-    def initialize():
-        """Initialise l'API Gemini avec la clé API"""
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY environment variable is not set")
-        
-        if USE_NEW_PACKAGE:
-            # Le nouveau package utilise Client
-            return genai.Client(api_key=api_key)
-        else:
-            # L'ancien package utilise configure
-            genai.configure(api_key=api_key)
-            return None
-    
-    @staticmethod
-    def generate_audio_analysis(features: Dict) -> str:
-        """
-        Génère une analyse audio professionnelle avec Gemini AI
-        
-        Args:
-            features: Dictionnaire contenant les caractéristiques audio (bpm, key, rms_level, spectral_centroid)
-        
-        Returns:
-            str: Rapport d'analyse généré par l'IA
-        """
-        try:
-            # Charger la clé API depuis la configuration (qui charge le .env)
-            from ..core.config import settings
-            api_key = settings.GEMINI_API_KEY
-            
-            if not api_key:
-                raise ValueError("GEMINI_API_KEY n'est pas configurée. Vérifiez votre fichier .env dans le dossier backend/")
-            
-            # Configurer l'API Gemini selon le package utilisé
-            if USE_NEW_PACKAGE:
-                client = genai.Client(api_key=api_key)
-            else:
-                genai.configure(api_key=api_key)
-            
-            # Obtenir la liste des modèles disponibles
-            try:
-                available_models = []
-                if USE_NEW_PACKAGE:
-                    # Nouveau package
-                    models = client.models.list()
-                    for m in models:
-                        model_name = m.name
-                        if model_name.startswith('models/'):
-                            model_name = model_name.replace('models/', '')
-                        available_models.append(model_name)
-                else:
-                    # Ancien package
-                    for m in genai.list_models():
-                        if 'generateContent' in m.supported_generation_methods:
-                            model_name = m.name
-                            if model_name.startswith('models/'):
-                                model_name = model_name.replace('models/', '')
-                            available_models.append(model_name)
-                
-                print(f"Modèles Gemini disponibles: {available_models}")
-                
-                if not available_models:
-                    raise Exception("Aucun modèle Gemini disponible. Vérifiez votre clé API.")
-                
-            except Exception as list_error:
-                # Si la liste des modèles échoue, utiliser les modèles par défaut
-                print(f"Impossible de lister les modèles: {str(list_error)}. Utilisation des modèles par défaut.")
-                available_models = ['gemini-2.5-flash', 'gemini-2.0-flash-exp', 'gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-pro']
-            
-            # Construire le prompt avec toutes les métriques
-            prompt = f"""Tu es un ingénieur du son professionnel et critique musical exigeant. Analyse ces données audio techniques :
+from ..core.config import settings
+from .gemini_client import genai, USE_NEW_PACKAGE, GeminiClientManager
 
-**MÉTRIQUES RYTHMIQUES & HARMONIQUES :**
-- BPM: {features.get('bpm', 'N/A')}
-- Stabilité du tempo: {features.get('tempo_stability', 'N/A')} (1.0 = parfaitement stable)
-- Tonalité: {features.get('key', 'N/A')}
+logger = logging.getLogger(__name__)
 
-**MÉTRIQUES DE NIVEAU & DYNAMIQUE :**
-- Niveau RMS: {features.get('rms_level', 'N/A')} (linéaire) / {features.get('rms_level_db', 'N/A')} dB
-- Niveau Peak: {features.get('peak_level_db', 'N/A')} dB
-- Crest Factor: {features.get('crest_factor', 'N/A')} ({features.get('crest_factor_db', 'N/A')} dB) - Ratio peak/RMS (indicateur de dynamique)
-- Dynamic Range: {features.get('dynamic_range_db', 'N/A')} dB (différence peak-RMS)
-
-**MÉTRIQUES SPECTRALES :**
-- Centroïde spectral: {features.get('spectral_centroid', 'N/A')} Hz (brillance moyenne)
-- Bande passante spectrale: {features.get('spectral_bandwidth', 'N/A')} Hz
-- Spectral Rolloff: {features.get('spectral_rolloff', 'N/A')} Hz (fréquence où 85% de l'énergie est concentrée)
-- Spectral Contrast: {features.get('spectral_contrast', 'N/A')} (contraste fréquentiel)
-- Spectral Flatness: {features.get('spectral_flatness', 'N/A')} (0=tonal, 1=bruité)
-- Taux de passage par zéro: {features.get('zero_crossing_rate', 'N/A')}
-
-**ANALYSE PAR BANDES FRÉQUENTIELLES (pourcentages d'énergie) :**
-- Basses (20-250 Hz): {features.get('bass_energy_pct', 'N/A')}%
-- Bas-médiums (250-500 Hz): {features.get('low_mid_energy_pct', 'N/A')}%
-- Médiums (500-2000 Hz): {features.get('mid_energy_pct', 'N/A')}%
-- Hauts-médiums (2000-4000 Hz): {features.get('high_mid_energy_pct', 'N/A')}%
-- Aigus (4000-20000 Hz): {features.get('treble_energy_pct', 'N/A')}%
+# À incrémenter à chaque modification du prompt (invalide le cache des rapports)
+PROMPT_VERSION = 1
 
-**ANALYSE HARMONIQUE/PERCUSSIVE :**
-- Ratio harmonique: {features.get('harmonic_ratio', 'N/A')} (1.0 = 100% harmonique)
-- Ratio percussif: {features.get('percussive_ratio', 'N/A')} (1.0 = 100% percussif)
+# Nombre de décimales affichées dans le prompt pour chaque métrique
+PROMPT_PRECISION = {
+    'bpm': 1,
+    'tempo_stability': 3,
+    'rms_level': 4,
+    'rms_level_db': 2,
+    'peak_level_db': 2,
+    'crest_factor': 2,
+    'crest_factor_db': 2,
+    'dynamic_range_db': 2,
+    'spectral_centroid': 0,
+    'spectral_bandwidth': 0,
+    'spectral_rolloff': 0,
+    'spectral_contrast': 2,
+    'spectral_flatness': 3,
+    'zero_crossing_rate': 4,
+    'bass_energy_pct': 1,
+    'low_mid_energy_pct': 1,
+    'mid_energy_pct': 1,
+    'high_mid_energy_pct': 1,
+    'treble_energy_pct': 1,
+    'harmonic_ratio': 3,
+    'percussive_ratio': 3,
+    'stereo_width': 3,
+}
+# Métriques non numériques utilisées telles quelles dans le prompt
+PROMPT_TEXT_FIELDS = ('key', 'is_stereo')
 
-**INFORMATIONS STÉRÉO :**
-- Format: {'Stéréo' if features.get('is_stereo', False) else 'Mono'}
-- Largeur stéréo: {features.get('stereo_width', 'N/A')} (corrélation L/R, -1 à 1, proche de 1 = mono, proche de 0 = large)
+def quantize_features(features: Dict) -> Dict:
+    """Garde les métriques du prompt, arrondies à la précision affichée"""
+    quantized = {}
+    for name, digits in PROMPT_PRECISION.items():
+        value = features.get(name)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = round(float(value), digits)
+            # 0 décimale: afficher "1234" plutôt que "1234.0"
+            quantized[name] = int(value) if digits == 0 else value
+        elif value is not None:
+            quantized[name] = value
+    for name in PROMPT_TEXT_FIELDS:
+        if features.get(name) is not None:
+            quantized[name] = features[name]
+    return quantized
 
-**CONSIGNES D'ANALYSE :**
+# Consignes et format de réponse communs à toutes les analyses
+ANALYSIS_INSTRUCTIONS = """**CONSIGNES D'ANALYSE :**
 - Sois TRÈS critique et honnête
 - **VULGARISATION IMPORTANTE** : Explique les concepts techniques de façon courante et accessible, tout en restant rigoureux et précis. Utilise des analogies et des termes compréhensibles pour un musicien ou producteur non-expert, mais garde la précision technique nécessaire.
 - Utilise TOUTES les métriques fournies pour une analyse complète
@@ -186,116 +120,410 @@ Utilise le format Markdown suivant avec une hiérarchie claire :
 - Structure clairement avec des titres de niveaux appropriés
 - Sois spécifique avec les valeurs numériques (ex: "Crest Factor de X dB indique..." en utilisant les valeurs réelles fournies)"""
 
-            # Utiliser le premier modèle disponible (prioriser les modèles récents)
-            # Ordre de priorité : flash (rapide) > pro (puissant) > autres
-            preferred_order = ['gemini-2.0-flash-exp', 'gemini-2.5-flash', 'gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-pro', 'gemini-1.0-pro']
-            
-            # Trier les modèles disponibles selon l'ordre de préférence
-            sorted_models = []
-            for preferred in preferred_order:
-                for model in available_models:
-                    if preferred in model.lower() and model not in sorted_models:
-                        sorted_models.append(model)
-            
-            # Ajouter les autres modèles non listés
-            for model in available_models:
-                if model not in sorted_models:
-                    sorted_models.append(model)
+# Tableau compact des analyses groupées: (métrique, en-tête de colonne)
+BATCH_COLUMNS = [
+    ('bpm', 'BPM'), ('key', 'Tonalité'), ('tempo_stability', 'Stab. tempo'),
+    ('rms_level_db', 'RMS dB'), ('peak_level_db', 'Peak dB'), ('crest_factor_db', 'Crest dB'),
+    ('dynamic_range_db', 'DR dB'), ('spectral_centroid', 'Centroïde Hz'),
+    ('spectral_bandwidth', 'Bande Hz'), ('spectral_rolloff', 'Rolloff Hz'),
+    ('spectral_contrast', 'Contraste'), ('spectral_flatness', 'Flatness'), ('zero_crossing_rate', 'ZCR'),
+    ('bass_energy_pct', 'Basses %'), ('low_mid_energy_pct', 'Bas-méd %'), ('mid_energy_pct', 'Méd %'),
+    ('high_mid_energy_pct', 'Haut-méd %'), ('treble_energy_pct', 'Aigus %'),
+    ('harmonic_ratio', 'Harmo'), ('percussive_ratio', 'Perc'),
+    ('is_stereo', 'Stéréo'), ('stereo_width', 'Largeur st.'),
+]
+
+BATCH_LEGEND = """Légende : Stab. tempo (1.0 = parfaitement stable) ; RMS, Peak en dB ; Crest = ratio peak/RMS en dB (indicateur de dynamique) ; DR = Dynamic Range (différence peak-RMS) ; Centroïde = brillance moyenne ; Rolloff = fréquence où 85% de l'énergie est concentrée ; Flatness (0=tonal, 1=bruité) ; ZCR = taux de passage par zéro ; énergie par bandes en % : Basses 20-250 Hz, Bas-méd 250-500 Hz, Méd 500-2000 Hz, Haut-méd 2000-4000 Hz, Aigus 4000-20000 Hz ; Harmo / Perc (1.0 = 100%) ; Largeur st. = corrélation L/R (-1 à 1, proche de 1 = mono, proche de 0 = large)."""
+
+# Séparateur demandé au modèle entre les rapports d'une analyse groupée
+BATCH_SEPARATOR_RE = re.compile(r'^\s*=+\s*MORCEAU\s+(\d+)\s*=+\s*$', re.MULTILINE | re.IGNORECASE)
+
+class GeminiAIService:
+    """Service pour interagir avec l'API Gemini AI de Google"""
+    
+    # Limite les appels simultanés à Gemini (requêtes de secours comprises)
+    _semaphore = asyncio.Semaphore(settings.GEMINI_MAX_CONCURRENCY)
+    
+    @staticmethod
+    def initialize():
+        """Initialise l'API Gemini avec la clé API (client partagé)"""
+        return GeminiClientManager.get_client()
+    
+    @staticmethod
+    def build_prompt(features: Dict) -> str:
+        """Construit le prompt avec toutes les métriques"""
+        features = quantize_features(features)
+        return f"""Tu es un ingénieur du son professionnel et critique musical exigeant. Analyse ces données audio techniques :
+
+**MÉTRIQUES RYTHMIQUES & HARMONIQUES :**
+- BPM: {features.get('bpm', 'N/A')}
+- Stabilité du tempo: {features.get('tempo_stability', 'N/A')} (1.0 = parfaitement stable)
+- Tonalité: {features.get('key', 'N/A')}
+
+**MÉTRIQUES DE NIVEAU & DYNAMIQUE :**
+- Niveau RMS: {features.get('rms_level', 'N/A')} (linéaire) / {features.get('rms_level_db', 'N/A')} dB
+- Niveau Peak: {features.get('peak_level_db', 'N/A')} dB
+- Crest Factor: {features.get('crest_factor', 'N/A')} ({features.get('crest_factor_db', 'N/A')} dB) - Ratio peak/RMS (indicateur de dynamique)
+- Dynamic Range: {features.get('dynamic_range_db', 'N/A')} dB (différence peak-RMS)
+
+**MÉTRIQUES SPECTRALES :**
+- Centroïde spectral: {features.get('spectral_centroid', 'N/A')} Hz (brillance moyenne)
+- Bande passante spectrale: {features.get('spectral_bandwidth', 'N/A')} Hz
+- Spectral Rolloff: {features.get('spectral_rolloff', 'N/A')} Hz (fréquence où 85% de l'énergie est concentrée)
+- Spectral Contrast: {features.get('spectral_contrast', 'N/A')} (contraste fréquentiel)
+- Spectral Flatness: {features.get('spectral_flatness', 'N/A')} (0=tonal, 1=bruité)
+- Taux de passage par zéro: {features.get('zero_crossing_rate', 'N/A')}
+
+**ANALYSE PAR BANDES FRÉQUENTIELLES (pourcentages d'énergie) :**
+- Basses (20-250 Hz): {features.get('bass_energy_pct', 'N/A')}%
+- Bas-médiums (250-500 Hz): {features.get('low_mid_energy_pct', 'N/A')}%
+- Médiums (500-2000 Hz): {features.get('mid_energy_pct', 'N/A')}%
+- Hauts-médiums (2000-4000 Hz): {features.get('high_mid_energy_pct', 'N/A')}%
+- Aigus (4000-20000 Hz): {features.get('treble_energy_pct', 'N/A')}%
+
+**ANALYSE HARMONIQUE/PERCUSSIVE :**
+- Ratio harmonique: {features.get('harmonic_ratio', 'N/A')} (1.0 = 100% harmonique)
+- Ratio percussif: {features.get('percussive_ratio', 'N/A')} (1.0 = 100% percussif)
+
+**INFORMATIONS STÉRÉO :**
+- Format: {'Stéréo' if features.get('is_stereo', False) else 'Mono'}
+- Largeur stéréo: {features.get('stereo_width', 'N/A')} (corrélation L/R, -1 à 1, proche de 1 = mono, proche de 0 = large)
+
+{ANALYSIS_INSTRUCTIONS}"""
+    
+    @staticmethod
+    def build_batch_prompt(names: List[str], features_list: List[Dict]) -> str:
+        """Construit un prompt unique pour plusieurs morceaux (consignes envoyées une fois)"""
+        header = "| # | Titre | " + " | ".join(title for _, title in BATCH_COLUMNS) + " |"
+        separator = "|---|---|" + "---|" * len(BATCH_COLUMNS)
+        rows = []
+        for index, (name, features) in enumerate(zip(names, features_list), start=1):
+            quantized = quantize_features(features)
+            cells = []
+            for column, _ in BATCH_COLUMNS:
+                value = quantized.get(column, 'N/A')
+                if column == 'is_stereo':
+                    value = 'Oui' if value is True else 'Non'
+                cells.append(str(value))
+            title = " ".join(str(name).replace("|", "/").split())
+            rows.append(f"| {index} | {title} | " + " | ".join(cells) + " |")
+        table = "\n".join([header, separator] + rows)
+        
+        return f"""Tu es un ingénieur du son professionnel et critique musical exigeant. Analyse séparément chacun des {len(rows)} morceaux suivants à partir de leurs données audio techniques :
+
+{table}
+
+{BATCH_LEGEND}
+
+{ANALYSIS_INSTRUCTIONS}
+
+**ANALYSES MULTIPLES :**
+- Rédige un rapport complet et indépendant pour CHAQUE morceau du tableau, en respectant les consignes et le format ci-dessus (maximum 400 mots par morceau)
+- Commence chaque rapport par une ligne contenant uniquement `=== MORCEAU N ===` (N = numéro du morceau dans le tableau), sans aucun texte avant le premier séparateur"""
+    
+    @staticmethod
+    def split_batch_report(text: str, count: int) -> List[Optional[str]]:
+        """Découpe la réponse groupée en rapports individuels (None si un morceau manque)"""
+        reports: List[Optional[str]] = [None] * count
+        matches = list(BATCH_SEPARATOR_RE.finditer(text))
+        for position, match in enumerate(matches):
+            index = int(match.group(1)) - 1
+            end = matches[position + 1].start() if position + 1 < len(matches) else len(text)
+            section = text[match.end():end].strip()
+            if 0 <= index < count and section and reports[index] is None:
+                reports[index] = section
+        return reports
+    
+    @staticmethod
+    def _generate(client, model_name: str, prompt: str):
+        """Un appel de génération sur un modèle donné"""
+        if USE_NEW_PACKAGE:
+            # Nouveau package google.genai
+            return client.models.generate_content(
+                model=model_name,
+                contents=prompt
+            )
+        # Ancien package google.generativeai
+        model = genai.GenerativeModel(model_name)
+        return model.generate_content(prompt)
+    
+    @staticmethod
+    def _generate_stream(client, model_name: str, prompt: str):
+        """Un appel de génération en streaming sur un modèle donné"""
+        if USE_NEW_PACKAGE:
+            return client.models.generate_content_stream(
+                model=model_name,
+                contents=prompt
+            )
+        model = genai.GenerativeModel(model_name)
+        return model.generate_content(prompt, stream=True)
+    
+    @staticmethod
+    def response_text(response) -> Optional[str]:
+        """
+        Texte généré par le modèle, de manière robuste
+
+        Returns:
+            None si la réponse ne contient pas de texte (réponse bloquée, vide...)
+        """
+        # Le nouveau package peut avoir une structure différente
+        text_content = None
+        
+        # Méthode 1: Accès direct à .text
+        if hasattr(response, 'text') and response.text:
+            text_content = response.text
+        # Méthode 2: Via candidates (ancien format)
+        elif hasattr(response, 'candidates') and len(response.candidates) > 0:
+            candidate = response.candidates[0]
+            if hasattr(candidate, 'content'):
+                if hasattr(candidate.content, 'parts'):
+                    # Extraire le texte de toutes les parts
+                    parts_text = []
+                    for part in candidate.content.parts:
+                        if hasattr(part, 'text') and part.text:
+                            parts_text.append(part.text)
+                        elif isinstance(part, str):
+                            parts_text.append(part)
+                    if parts_text:
+                        text_content = ' '.join(parts_text)
+                elif hasattr(candidate.content, 'text'):
+                    text_content = candidate.content.text
+                elif isinstance(candidate.content, str):
+                    text_content = candidate.content
+        # Méthode 3: Nouveau format du package google.genai
+        elif hasattr(response, 'candidates') and len(response.candidates) > 0:
+            # Essayer d'accéder au texte via la nouvelle structure
+            try:
+                text_content = response.candidates[0].content.parts[0].text
+            except (AttributeError, IndexError):
+                pass
+        
+        return str(text_content) if text_content else None
+    
+    @staticmethod
+    def extract_text(response) -> str:
+        """Extrait le texte de la réponse, avec un texte de repli s'il n'y en a pas"""
+        text_content = GeminiAIService.response_text(response)
+        
+        # Si on n'a toujours pas de texte, convertir en string
+        if not text_content:
+            # Essayer de convertir l'objet en string de manière sécurisée
+            try:
+                text_content = str(response)
+            except:
+                text_content = "Erreur: Impossible d'extraire le texte de la réponse de l'IA."
+        
+        # S'assurer que c'est bien une string
+        return str(text_content) if text_content else "Aucune analyse disponible."
+
+    @staticmethod
+    def generate_audio_analysis(features: Dict) -> str:
+        """
+        Génère une analyse audio professionnelle avec Gemini AI
+        
+        Args:
+            features: Dictionnaire contenant les caractéristiques audio (bpm, key, rms_level, spectral_centroid)
+        
+        Returns:
+            str: Rapport d'analyse généré par l'IA
+        """
+        try:
+            # Client partagé et catalogue des modèles en cache (aucun appel réseau ici)
+            client = GeminiClientManager.get_client()
+            prompt = GeminiAIService.build_prompt(features)
+            sorted_models = GeminiClientManager.candidate_models()
             
             if not sorted_models:
-                raise Exception(f"Aucun modèle compatible trouvé. Modèles disponibles: {available_models}")
+                raise Exception("Aucun modèle compatible trouvé.")
             
-            # Essayer les modèles dans l'ordre de préférence
+            # Essayer les modèles dans l'ordre de préférence (le dernier modèle
+            # ayant répondu en premier: un seul appel dans le cas nominal)
             response = None
             last_error = None
-            used_model = None
             
             for model_name in sorted_models:
-                try:
-                    # Essayer avec et sans préfixe "models/"
-                    for model_variant in [model_name, f'models/{model_name}']:
-                        try:
-                            if USE_NEW_PACKAGE:
-                                # Nouveau package google.genai
-                                response = client.models.generate_content(
-                                    model=model_variant,
-                                    contents=prompt
-                                )
-                            else:
-                                # Ancien package google.generativeai
-                                model = genai.GenerativeModel(model_variant)
-                                response = model.generate_content(prompt)
-                            
-                            used_model = model_variant
-                            print(f"Modèle utilisé avec succès: {model_variant}")
-                            break
-                        except Exception as e:
-                            # Si ça échoue, essayer la variante suivante
-                            last_error = e
-                            continue
-                    
-                    if response:
+                # Essayer avec et sans préfixe "models/"
+                variants = [model_name] if model_name.startswith('models/') else [model_name, f'models/{model_name}']
+                for model_variant in variants:
+                    try:
+                        response = GeminiAIService._generate(client, model_variant, prompt)
+                        GeminiClientManager.mark_success(model_variant)
+                        logger.debug("Modèle utilisé avec succès: %s", model_variant)
                         break
-                        
-                except Exception as e:
-                    last_error = e
-                    print(f"Modèle {model_name} non disponible: {str(e)}")
-                    continue
+                    except Exception as e:
+                        # Si ça échoue, essayer la variante suivante
+                        last_error = e
+                        GeminiClientManager.mark_failure(model_variant)
+                        continue
+                
+                if response:
+                    break
             
             if response is None:
                 error_msg = f"Aucun modèle Gemini n'a pu être utilisé.\n"
-                error_msg += f"Modèles disponibles détectés: {', '.join(available_models)}\n"
                 error_msg += f"Modèles testés: {', '.join(sorted_models)}\n"
                 error_msg += f"Dernière erreur: {str(last_error) if last_error else 'Inconnue'}"
                 raise Exception(error_msg)
             
-            # Extraire le texte de la réponse de manière robuste
-            # Le nouveau package peut avoir une structure différente
-            text_content = None
-            
-            # Méthode 1: Accès direct à .text
-            if hasattr(response, 'text') and response.text:
-                text_content = response.text
-            # Méthode 2: Via candidates (ancien format)
-            elif hasattr(response, 'candidates') and len(response.candidates) > 0:
-                candidate = response.candidates[0]
-                if hasattr(candidate, 'content'):
-                    if hasattr(candidate.content, 'parts'):
-                        # Extraire le texte de toutes les parts
-                        parts_text = []
-                        for part in candidate.content.parts:
-                            if hasattr(part, 'text') and part.text:
-                                parts_text.append(part.text)
-                            elif isinstance(part, str):
-                                parts_text.append(part)
-                        if parts_text:
-                            text_content = ' '.join(parts_text)
-                    elif hasattr(candidate.content, 'text'):
-                        text_content = candidate.content.text
-                    elif isinstance(candidate.content, str):
-                        text_content = candidate.content
-            # Méthode 3: Nouveau format du package google.genai
-            elif hasattr(response, 'candidates') and len(response.candidates) > 0:
-                # Essayer d'accéder au texte via la nouvelle structure
-                try:
-                    text_content = response.candidates[0].content.parts[0].text
-                except (AttributeError, IndexError):
-                    pass
-            
-            # Si on n'a toujours pas de texte, convertir en string
-            if not text_content:
-                # Essayer de convertir l'objet en string de manière sécurisée
-                try:
-                    text_content = str(response)
-                except:
-                    text_content = "Erreur: Impossible d'extraire le texte de la réponse de l'IA."
-            
-            # S'assurer que c'est bien une string
-            return str(text_content) if text_content else "Aucune analyse disponible."
+            return GeminiAIService.extract_text(response)
             
         except Exception as e:
             raise Exception(f"Erreur lors de la génération de l'analyse IA: {str(e)}")
-
-
-
-
+    
+    @staticmethod
+    def stream_audio_analysis(features: Dict) -> Iterator[str]:
+        """
+        Génère l'analyse audio en streaming
+        
+        Le modèle suivant n'est essayé que si l'échec survient avant le
+        premier fragment: une fois le texte commencé, l'erreur est propagée.
+        
+        Yields:
+            str: Fragments de texte du rapport, dans l'ordre
+        """
+        client = GeminiClientManager.get_client()
+        prompt = GeminiAIService.build_prompt(features)
+        sorted_models = GeminiClientManager.candidate_models()
+        last_error = None
+        
+        for model_name in sorted_models:
+            variants = [model_name] if model_name.startswith('models/') else [model_name, f'models/{model_name}']
+            for model_variant in variants:
+                try:
+                    stream = iter(GeminiAIService._generate_stream(client, model_variant, prompt))
+                    first_chunk = next(stream, None)
+                except Exception as e:
+                    last_error = e
+                    GeminiClientManager.mark_failure(model_variant)
+                    continue
+                
+                GeminiClientManager.mark_success(model_variant)
+                logger.debug("Modèle utilisé avec succès (streaming): %s", model_variant)
+                if first_chunk is not None and getattr(first_chunk, 'text', None):
+                    yield first_chunk.text
+                for chunk in stream:
+                    text = getattr(chunk, 'text', None)
+                    if text:
+                        yield text
+                return
+        
+        raise Exception(
+            f"Aucun modèle Gemini n'a pu être utilisé. "
+            f"Dernière erreur: {str(last_error) if last_error else 'Inconnue'}"
+        )
+    
+    @staticmethod
+    async def _agenerate(client, model_name: str, prompt: str):
+        """Un appel de génération asynchrone (variantes avec et sans "models/")"""
+        variants = [model_name] if model_name.startswith('models/') else [model_name, f'models/{model_name}']
+        last_error = None
+        for model_variant in variants:
+            try:
+                async with GeminiAIService._semaphore:
+                    if USE_NEW_PACKAGE:
+                        response = await client.aio.models.generate_content(
+                            model=model_variant,
+                            contents=prompt
+                        )
+                    else:
+                        model = genai.GenerativeModel(model_variant)
+                        response = await model.generate_content_async(prompt)
+                GeminiClientManager.mark_success(model_variant)
+                logger.debug("Modèle utilisé avec succès: %s", model_variant)
+                return response
+            except Exception as e:
+                last_error = e
+                GeminiClientManager.mark_failure(model_variant)
+        raise last_error
+    
+    @staticmethod
+    async def _hedged_generate(client, models: List[str], prompt: str):
+        """
+        Lance la génération sur le premier modèle, puis une requête de secours
+        sur le modèle suivant si aucune réponse n'est arrivée après
+        GEMINI_HEDGE_DELAY secondes (ou immédiatement en cas d'échec).
+        La première réponse valide l'emporte, les autres sont annulées.
+        """
+        remaining = list(models)
+        pending = set()
+        last_error = None
+        
+        def launch():
+            pending.add(asyncio.create_task(
+                GeminiAIService._agenerate(client, remaining.pop(0), prompt)
+            ))
+        
+        try:
+            launch()
+            while pending:
+                can_hedge = remaining and len(pending) < settings.GEMINI_MAX_HEDGED_REQUESTS
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=settings.GEMINI_HEDGE_DELAY if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # Pas de réponse dans le budget de latence: requête de secours
+                    launch()
+                    continue
+                for task in done:
+                    pending.discard(task)
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+                # Échec: basculer tout de suite sur le modèle suivant
+                if remaining and len(pending) < settings.GEMINI_MAX_HEDGED_REQUESTS:
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        
+        raise Exception(
+            f"Aucun modèle Gemini n'a pu être utilisé.\n"
+            f"Modèles testés: {', '.join(models)}\n"
+            f"Dernière erreur: {str(last_error) if last_error else 'Inconnue'}"
+        )
+    
+    @staticmethod
+    async def _generate_text_async(prompt: str, deadline: float) -> Optional[str]:
+        """Texte de la première réponse valide (None si elle n'en contient pas)"""
+        client = GeminiClientManager.get_client()
+        sorted_models = GeminiClientManager.candidate_models()
+        if not sorted_models:
+            raise Exception("Aucun modèle compatible trouvé.")
+        
+        response = await asyncio.wait_for(
+            GeminiAIService._hedged_generate(client, sorted_models, prompt),
+            timeout=deadline
+        )
+        return GeminiAIService.response_text(response)
+    
+    @staticmethod
+    async def generate_audio_analysis_async(features: Dict) -> Optional[str]:
+        """
+        Version asynchrone de generate_audio_analysis (ne bloque pas la boucle
+        d'événements), avec requêtes de secours et délai maximal
+        
+        Returns:
+            Le rapport, ou None si la réponse ne contient pas de texte
+        
+        Raises:
+            asyncio.TimeoutError: si aucune réponse n'est arrivée avant GEMINI_DEADLINE
+        """
+        prompt = GeminiAIService.build_prompt(features)
+        return await GeminiAIService._generate_text_async(prompt, settings.GEMINI_DEADLINE)
+    
+    @staticmethod
+    async def generate_batch_analysis_async(names: List[str], features_list: List[Dict]) -> List[Optional[str]]:
+        """
+        Génère les rapports de plusieurs morceaux en un seul appel
+        
+        Returns:
+            Un rapport par morceau, dans l'ordre (None si absent de la réponse)
+        
+        Raises:
+            asyncio.TimeoutError: si aucune réponse n'est arrivée avant GEMINI_BATCH_DEADLINE
+        """
+        prompt = GeminiAIService.build_batch_prompt(names, features_list)
+        text = await GeminiAIService._generate_text_async(prompt, settings.GEMINI_BATCH_DEADLINE)
+        return GeminiAIService.split_batch_report(text or "", len(features_list))
@@ -0,0 +1,188 @@
+import logging
+import threading
+import time
+import warnings
+from typing import List, Optional
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Essayer d'importer le nouveau package, sinon utiliser l'ancien
+try:
+    import google.genai as genai
+    USE_NEW_PACKAGE = True
+except ImportError:
+    # Supprimer le warning FutureWarning pour l'ancien package
+    warnings.filterwarnings('ignore', category=FutureWarning, message='.*google.generativeai.*')
+    import google.generativeai as genai
+    USE_NEW_PACKAGE = False
+
+# Ordre de priorité : flash (rapide) > pro (puissant) > autres
+PREFERRED_ORDER = ['gemini-2.0-flash-exp', 'gemini-2.5-flash', 'gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-pro', 'gemini-1.0-pro']
+# Modèles utilisés tant que le catalogue n'a pas pu être récupéré
+DEFAULT_MODELS = ['gemini-2.5-flash', 'gemini-2.0-flash-exp', 'gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-pro']
+
+
+def sort_models(available_models: List[str]) -> List[str]:
+    """Trie les modèles disponibles selon l'ordre de préférence"""
+    sorted_models = []
+    for preferred in PREFERRED_ORDER:
+        for model in available_models:
+            if preferred in model.lower() and model not in sorted_models:
+                sorted_models.append(model)
+
+    # Ajouter les autres modèles non listés
+    for model in available_models:
+        if model not in sorted_models:
+            sorted_models.append(model)
+    return sorted_models
+
+
+class GeminiClientManager:
+    """
+    Client Gemini unique pour tout le processus.
+
+    Le catalogue des modèles est rafraîchi en arrière-plan (TTL) et le dernier
+    modèle ayant répondu est gardé comme choix préféré: une requête de
+    génération ne fait donc qu'un seul appel à l'API.
+    """
+
+    _lock = threading.Lock()
+    _client = None
+    _configured = False
+    _models: Optional[List[str]] = None
+    _models_fetched_at: float = 0.0
+    _refreshing = False
+    _preferred_model: Optional[str] = None
+
+    @classmethod
+    def get_client(cls):
+        """Retourne le client partagé (None avec l'ancien package, configuré globalement)"""
+        if cls._configured:
+            return cls._client
+
+        with cls._lock:
+            if not cls._configured:
+                api_key = settings.GEMINI_API_KEY
+                if not api_key:
+                    raise ValueError("GEMINI_API_KEY n'est pas configurée. Vérifiez votre fichier .env dans le dossier backend/")
+
+                base_url = settings.GEMINI_BASE_URL
+                if USE_NEW_PACKAGE:
+                    # Le nouveau package utilise Client
+                    if base_url:
+                        # Serveur alternatif (ex: tools/fake_gemini.py pour les tests de charge)
+                        from google.genai import types
+                        cls._client = genai.Client(
+                            api_key=api_key,
+                            http_options=types.HttpOptions(base_url=base_url)
+                        )
+                    else:
+                        cls._client = genai.Client(api_key=api_key)
+                else:
+                    # L'ancien package utilise configure
+                    if base_url:
+                        genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": base_url})
+                    else:
+                        genai.configure(api_key=api_key)
+                cls._configured = True
+        return cls._client
+
+    @classmethod
+    def _fetch_models(cls) -> List[str]:
+        """Interroge l'API pour obtenir la liste des modèles de génération"""
+        client = cls.get_client()
+        available_models = []
+        if USE_NEW_PACKAGE:
+            # Nouveau package
+            for m in client.models.list():
+                actions = getattr(m, 'supported_actions', None)
+                if actions and 'generateContent' not in actions:
+                    continue
+                model_name = m.name
+                if model_name.startswith('models/'):
+                    model_name = model_name.replace('models/', '')
+                available_models.append(model_name)
+        else:
+            # Ancien package
+            for m in genai.list_models():
+                if 'generateContent' in m.supported_generation_methods:
+                    model_name = m.name
+                    if model_name.startswith('models/'):
+                        model_name = model_name.replace('models/', '')
+                    available_models.append(model_name)
+        return available_models
+
+    @classmethod
+    def refresh_models(cls):
+        """Rafraîchit le catalogue des modèles (bloquant)"""
+        try:
+            available_models = cls._fetch_models()
+            if not available_models:
+                raise Exception("Aucun modèle Gemini disponible. Vérifiez votre clé API.")
+            logger.info("Modèles Gemini disponibles: %s", available_models)
+            with cls._lock:
+                cls._models = sort_models(available_models)
+                cls._models_fetched_at = time.monotonic()
+                if cls._preferred_model and cls._preferred_model.replace('models/', '') not in cls._models:
+                    cls._preferred_model = None
+        except Exception as e:
+            logger.warning("Impossible de lister les modèles: %s. Utilisation des modèles par défaut.", e)
+            with cls._lock:
+                if cls._models is None:
+                    cls._models = sort_models(DEFAULT_MODELS)
+                # Réessayer plus tôt qu'un rafraîchissement normal
+                cls._models_fetched_at = time.monotonic() - settings.GEMINI_MODELS_TTL + 60
+        finally:
+            cls._refreshing = False
+
+    @classmethod
+    def _refresh_in_background(cls):
+        with cls._lock:
+            if cls._refreshing:
+                return
+            cls._refreshing = True
+        threading.Thread(target=cls.refresh_models, name="gemini-models", daemon=True).start()
+
+    @classmethod
+    def warm_up(cls):
+        """Prépare le client et lance la récupération du catalogue (au démarrage)"""
+        if not settings.GEMINI_API_KEY:
+            return
+        cls.get_client()
+        cls._refresh_in_background()
+
+    @classmethod
+    def get_models(cls) -> List[str]:
+        """
+        Liste des modèles triés par priorité, sans appel réseau.
+
+        Un catalogue expiré est servi tel quel pendant son rafraîchissement
+        en arrière-plan; avant le premier chargement, les modèles par défaut
+        sont utilisés.
+        """
+        models = cls._models
+        if models is None or time.monotonic() - cls._models_fetched_at > settings.GEMINI_MODELS_TTL:
+            cls._refresh_in_background()
+        if models is None:
+            return sort_models(DEFAULT_MODELS)
+        return list(models)
+
+    @classmethod
+    def candidate_models(cls) -> List[str]:
+        """Modèles à essayer dans l'ordre, le modèle préféré en premier"""
+        models = cls.get_models()
+        preferred = cls._preferred_model
+        if preferred:
+            models = [preferred] + [m for m in models if m != preferred.replace('models/', '')]
+        return models
+
+    @classmethod
+    def mark_success(cls, model_name: str):
+        cls._preferred_model = model_name
+
+    @classmethod
+    def mark_failure(cls, model_name: str):
+        if cls._preferred_model == model_name:
+            cls._preferred_model = None
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import soundfile as sf
+
+from ..core.config import settings
+from ..core.metrics import Metrics
+from .audio_loader import AudioLoader
+from .storage_lifecycle import KIND_TRANSCODE, StorageLifecycle
+
+logger = logging.getLogger(__name__)
+
+# Fréquence des proxies (celle de l'analyse)
+PROXY_SAMPLE_RATE = 22050
+# Trames écrites par bloc dans l'aperçu OGG
+_PREVIEW_BLOCK_FRAMES = 65536
+
+
+class ProxyService:
+    """
+    Versions légères d'un upload, calculées une fois par contenu.
+
+    - proxy: signal mono float32 à 22,05 kHz (.npy), lu par l'analyse sans
+      décoder ni rééchantillonner l'original
+    - aperçu: le même signal en OGG Vorbis, pour l'écoute dans le navigateur
+
+    Les fichiers sont nommés d'après le blob (SHA-256 du contenu) et rangés
+    avec les conversions de téléchargement: même cycle de vie, recalculés
+    s'ils ont été évincés. La génération tourne dans un pool dédié; les
+    demandes simultanées pour le même fichier partagent le même calcul.
+    """
+
+    _executor = ThreadPoolExecutor(
+        max_workers=settings.PROXY_WORKERS,
+        thread_name_prefix="proxy"
+    )
+    _in_flight: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def proxy_path(source: Path) -> Path:
+        return settings.TRANSCODE_CACHE_DIR / f"{source.stem}.proxy.npy"
+
+    @staticmethod
+    def preview_path(source: Path) -> Path:
+        return settings.TRANSCODE_CACHE_DIR / f"{source.stem}.preview.ogg"
+
+    @classmethod
+    def _generate(cls, source: Path):
+        """Décode l'original une fois et écrit proxy et aperçu (bloquant)"""
+        y, sr = AudioLoader.load(source, sr=PROXY_SAMPLE_RATE)
+        proxy_path = cls.proxy_path(source)
+        preview_path = cls.preview_path(source)
+        suffix = uuid.uuid4().hex
+        temp_proxy = proxy_path.with_name(f".{proxy_path.name}.{suffix}.part")
+        temp_preview = preview_path.with_name(f".{preview_path.name}.{suffix}.part")
+        try:
+            with open(temp_proxy, "wb") as proxy_file:
+                np.save(proxy_file, y)
+            with sf.SoundFile(
+                str(temp_preview), "w",
+                samplerate=sr,
+                channels=1,
+                format="OGG",
+                subtype="VORBIS"
+            ) as preview:
+                # Par blocs: libsndfile ne supporte pas un gros tableau en une fois
+                for start in range(0, len(y), _PREVIEW_BLOCK_FRAMES):
+                    preview.write(y[start:start + _PREVIEW_BLOCK_FRAMES])
+            os.replace(temp_proxy, proxy_path)
+            os.replace(temp_preview, preview_path)
+        except BaseException:
+            temp_proxy.unlink(missing_ok=True)
+            temp_preview.unlink(missing_ok=True)
+            raise
+        for path in (proxy_path, preview_path):
+            StorageLifecycle.track(KIND_TRANSCODE, path.name, path.stat().st_size)
+        logger.info("Proxy généré: %s (%.1f s)", source.name, len(y) / sr)
+
+    @classmethod
+    def schedule(cls, source: Path) -> Optional[asyncio.Future]:
+        """Lance la génération si besoin, sans l'attendre (None si proxy et aperçu existent)"""
+        if cls.proxy_path(source).exists() and cls.preview_path(source).exists():
+            return None
+        key = source.stem
+        future = cls._in_flight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(cls._executor, cls._generate, source)
+            cls._in_flight[key] = future
+            future.add_done_callback(lambda f: cls._on_done(key, source, f))
+        return future
+
+    @classmethod
+    def _on_done(cls, key: str, source: Path, future: asyncio.Future):
+        cls._in_flight.pop(key, None)
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning("Proxy impossible pour %s: %s", source.name, future.exception())
+
+    @classmethod
+    async def ensure(cls, source: Path):
+        """
+        Attend que proxy et aperçu existent
+
+        Raises:
+            Exception du décodeur si l'original est illisible
+        """
+        future = cls.schedule(source)
+        if future is not None:
+            # shield: l'annulation d'un client ne doit pas annuler la génération partagée
+            await asyncio.shield(future)
+
+    @classmethod
+    def load(cls, source: Path, duration: Optional[float] = None) -> Tuple[np.ndarray, int]:
+        """
+        Signal mono à PROXY_SAMPLE_RATE: le proxy s'il existe, sinon décodage de l'original
+
+        Args:
+            duration: ne garder que les premières secondes
+        """
+        proxy_path = cls.proxy_path(source)
+        try:
+            proxy = np.load(proxy_path, mmap_mode="r")
+        except (FileNotFoundError, ValueError):
+            Metrics.increment("audio.proxy.misses")
+            return AudioLoader.load(source, sr=PROXY_SAMPLE_RATE, duration=duration)
+        Metrics.increment("audio.proxy.hits")
+        StorageLifecycle.touch(KIND_TRANSCODE, proxy_path.name)
+        if duration is not None:
+            proxy = proxy[:int(round(duration * PROXY_SAMPLE_RATE))]
+        # Copie: le tableau ne dépend plus du fichier (qui peut être évincé)
+        return np.array(proxy, dtype=np.float32), PROXY_SAMPLE_RATE
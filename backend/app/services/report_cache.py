@@ -0,0 +1,147 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from ..core.config import settings
+from .gemini_ai import PROMPT_VERSION, quantize_features
+
+
+def report_key(features: Dict) -> str:
+    """
+    Clé de cache d'un rapport IA.
+
+    Les métriques sont arrondies à la précision utilisée dans le prompt: deux
+    analyses qui produiraient le même prompt partagent le même rapport.
+    """
+    canonical = json.dumps(
+        {"prompt_version": PROMPT_VERSION, "features": quantize_features(features)},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class AIReportCache:
+    """
+    Cache des rapports générés par Gemini (LRU + TTL).
+
+    Les entrées sont gardées en mémoire et persistées dans SQLite pour
+    survivre aux redémarrages. get() est appelé depuis la boucle
+    d'événements et ne touche pas à SQLite: les dates d'accès (ordre LRU
+    au rechargement) sont notées en mémoire et écrites par lot avec le
+    prochain put() ou par flush(), à appeler hors de la boucle.
+    """
+
+    _lock = threading.Lock()
+    _connection: Optional[sqlite3.Connection] = None
+    # clé -> (rapport, date de création)
+    _entries: Optional["OrderedDict[str, Tuple[str, float]]"] = None
+    # clé -> date du dernier accès pas encore écrite en base
+    _pending_accesses: Dict[str, float] = {}
+
+    @classmethod
+    def _db(cls) -> sqlite3.Connection:
+        if cls._connection is None:
+            connection = sqlite3.connect(str(settings.AI_REPORT_CACHE_DB), check_same_thread=False)
+            # WAL: les mises à jour de date d'accès ne coûtent pas un fsync
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS reports ("
+                "key TEXT PRIMARY KEY, report TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            connection.commit()
+            cls._connection = connection
+        return cls._connection
+
+    @classmethod
+    def load(cls):
+        """Charge le cache depuis le disque (bloquant: au démarrage, hors de la boucle)"""
+        with cls._lock:
+            cls._load()
+
+    @classmethod
+    def _load(cls):
+        """Charge les entrées encore valides depuis le disque (une seule fois)"""
+        if cls._entries is not None:
+            return
+        db = cls._db()
+        min_created = time.time() - settings.AI_REPORT_CACHE_TTL
+        db.execute("DELETE FROM reports WHERE created_at < ?", (min_created,))
+        db.commit()
+        rows = db.execute(
+            "SELECT key, report, created_at FROM reports ORDER BY accessed_at DESC LIMIT ?",
+            (settings.AI_REPORT_CACHE_SIZE,)
+        ).fetchall()
+        # Du moins récemment utilisé au plus récent
+        cls._entries = OrderedDict((key, (report, created_at)) for key, report, created_at in reversed(rows))
+
+    @classmethod
+    def get(cls, key: str) -> Optional[str]:
+        """Retourne le rapport en cache, ou None s'il est absent ou expiré"""
+        with cls._lock:
+            cls._load()
+            entry = cls._entries.get(key)
+            if entry is None:
+                return None
+            report, created_at = entry
+            now = time.time()
+            if now - created_at > settings.AI_REPORT_CACHE_TTL:
+                # La ligne est supprimée au prochain flush
+                del cls._entries[key]
+                cls._pending_accesses.pop(key, None)
+                return None
+            cls._entries.move_to_end(key)
+            cls._pending_accesses[key] = now
+            return report
+
+    @classmethod
+    def _flush(cls, db: sqlite3.Connection):
+        """Écrit les dates d'accès notées et supprime les lignes expirées (appelant: verrou tenu)"""
+        accesses, cls._pending_accesses = cls._pending_accesses, {}
+        if accesses:
+            db.executemany(
+                "UPDATE reports SET accessed_at = ? WHERE key = ?",
+                ((accessed_at, key) for key, accessed_at in accesses.items())
+            )
+        db.execute("DELETE FROM reports WHERE created_at < ?", (time.time() - settings.AI_REPORT_CACHE_TTL,))
+
+    @classmethod
+    def flush(cls):
+        """Écrit les accès en attente (bloquant: à l'arrêt, hors de la boucle)"""
+        with cls._lock:
+            if cls._entries is None:
+                return
+            db = cls._db()
+            cls._flush(db)
+            db.commit()
+
+    @classmethod
+    def put(cls, key: str, report: str):
+        """
+        Ajoute un rapport au cache et évince les entrées les moins utilisées
+
+        Bloquant (écriture SQLite): à appeler hors de la boucle d'événements.
+        """
+        with cls._lock:
+            cls._load()
+            now = time.time()
+            db = cls._db()
+            cls._entries[key] = (report, now)
+            cls._entries.move_to_end(key)
+            db.execute("INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?)", (key, report, now, now))
+            evicted = []
+            while len(cls._entries) > settings.AI_REPORT_CACHE_SIZE:
+                evicted_key, _ = cls._entries.popitem(last=False)
+                cls._pending_accesses.pop(evicted_key, None)
+                evicted.append((evicted_key,))
+            if evicted:
+                db.executemany("DELETE FROM reports WHERE key = ?", evicted)
+            cls._flush(db)
+            db.commit()
@@ -0,0 +1,253 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, status
+
+from ..core.config import settings
+from ..models.user import PlanType
+from .storage_lifecycle import StorageLifecycle
+from .upload import UploadService
+
+logger = logging.getLogger(__name__)
+
+# Taille maximale d'un upload reprenable par plan (masters WAV pour Studio)
+PLAN_UPLOAD_LIMITS = {
+    PlanType.FREE: settings.MAX_UPLOAD_SIZE,
+    PlanType.STARTER: 100 * 1024 * 1024,
+    PlanType.PRO: 500 * 1024 * 1024,
+    PlanType.STUDIO: 2 * 1024 * 1024 * 1024,
+}
+
+
+class ResumableUploadService:
+    """
+    Uploads reprenables par blocs (protocole inspiré de tus).
+
+    1. create: ouvre une session (nom et taille totale annoncés)
+    2. append: ajoute un bloc à l'offset courant (PATCH + Upload-Offset)
+    3. offset: permet au client de reprendre après une coupure (HEAD)
+    4. complete: valide et range le fichier via UploadService.finalize
+
+    Les sessions sont stockées dans UPLOAD_TMP_DIR: un fichier JSON de
+    métadonnées et le fichier partiel, dont la taille fait foi pour l'offset
+    (ce qui a été écrit avant une coupure est conservé).
+
+    Un client (utilisateur, ou adresse IP d'un visiteur) ouvre au plus
+    RESUMABLE_MAX_SESSIONS sessions, et la taille annoncée des sessions
+    ouvertes est comptée dans le quota de stockage de son propriétaire dès
+    leur création (StorageLifecycle.check_quota).
+    """
+
+    _locks: Dict[str, asyncio.Lock] = {}
+    # Vérification des limites et création de la session sans entrelacement
+    _create_lock: Optional[asyncio.Lock] = None
+
+    @staticmethod
+    def _meta_path(upload_id: str) -> Path:
+        return settings.UPLOAD_TMP_DIR / f"{upload_id}.json"
+
+    @staticmethod
+    def _part_path(upload_id: str) -> Path:
+        return settings.UPLOAD_TMP_DIR / f"{upload_id}.upload"
+
+    @classmethod
+    def _lock(cls, upload_id: str) -> asyncio.Lock:
+        lock = cls._locks.get(upload_id)
+        if lock is None:
+            lock = cls._locks[upload_id] = asyncio.Lock()
+        return lock
+
+    @staticmethod
+    def max_size(plan: PlanType) -> int:
+        return PLAN_UPLOAD_LIMITS.get(plan, settings.MAX_UPLOAD_SIZE)
+
+    @classmethod
+    async def create(cls, filename: str, size: int, plan: PlanType, owner: Optional[int], client: str) -> Dict:
+        """
+        Ouvre une session d'upload
+
+        Args:
+            client: Identifiant du demandeur ("user:{id}" ou "ip:{adresse}"), borne le nombre de sessions
+
+        Raises:
+            HTTPException 400: extension refusée
+            HTTPException 413: trop gros pour le plan, ou quota de stockage dépassé
+            HTTPException 429: trop de sessions ouvertes pour ce client
+        """
+        UploadService.validate_extension(filename)
+        max_size = cls.max_size(plan)
+        if size <= 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid upload size")
+        if size > max_size:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File too large for your plan. Maximum size: {max_size / (1024*1024)}MB"
+            )
+
+        if cls._create_lock is None:
+            cls._create_lock = asyncio.Lock()
+        async with cls._create_lock:
+            sessions = await cls.purge_expired()
+            if sum(1 for meta in sessions if meta.get("client") == client) >= settings.RESUMABLE_MAX_SESSIONS:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many open upload sessions. Complete or cancel one first."
+                )
+            # Octets annoncés par les sessions ouvertes du même propriétaire (ou des anonymes)
+            staged = sum(meta["size"] for meta in sessions if meta["owner"] == owner)
+            await asyncio.to_thread(StorageLifecycle.check_quota, owner, plan, staged + size)
+
+            upload_id = uuid.uuid4().hex
+            meta = {
+                "filename": filename,
+                "size": size,
+                "max_size": max_size,
+                "owner": owner,
+                "client": client,
+                "created_at": time.time(),
+            }
+            async with aiofiles.open(cls._part_path(upload_id), "wb"):
+                pass
+            async with aiofiles.open(cls._meta_path(upload_id), "w") as meta_file:
+                await meta_file.write(json.dumps(meta))
+        return {"upload_id": upload_id, "offset": 0, "size": size, "chunk_size": settings.UPLOAD_CHUNK_SIZE}
+
+    @classmethod
+    async def _load(cls, upload_id: str, owner: Optional[int]) -> Dict:
+        """Métadonnées de la session avec l'offset courant (404 si inconnue ou expirée)"""
+        not_found = HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload session not found")
+        if not upload_id.isalnum():
+            raise not_found
+        try:
+            async with aiofiles.open(cls._meta_path(upload_id)) as meta_file:
+                meta = json.loads(await meta_file.read())
+            offset = (await aiofiles.os.stat(cls._part_path(upload_id))).st_size
+        except FileNotFoundError:
+            raise not_found
+        if time.time() - meta["created_at"] > settings.RESUMABLE_UPLOAD_TTL:
+            await cls._remove(upload_id)
+            raise not_found
+        # Une session créée par un utilisateur connecté lui est réservée
+        if meta["owner"] is not None and meta["owner"] != owner:
+            raise not_found
+        meta["offset"] = offset
+        return meta
+
+    @classmethod
+    async def status(cls, upload_id: str, owner: Optional[int]) -> Dict:
+        meta = await cls._load(upload_id, owner)
+        return {"upload_id": upload_id, "offset": meta["offset"], "size": meta["size"]}
+
+    @classmethod
+    async def append(cls, upload_id: str, offset: int, chunks: AsyncIterator[bytes], owner: Optional[int]) -> int:
+        """
+        Ajoute le bloc reçu à la position `offset`
+
+        Returns:
+            Nouvel offset
+
+        Raises:
+            HTTPException 409: offset différent de l'offset courant (bloc déjà reçu ou manquant)
+            HTTPException 413: le bloc dépasse la taille annoncée
+        """
+        async with cls._lock(upload_id):
+            meta = await cls._load(upload_id, owner)
+            if offset != meta["offset"]:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Upload-Offset does not match the current offset",
+                    headers={"Upload-Offset": str(meta["offset"])}
+                )
+            written = offset
+            async with aiofiles.open(cls._part_path(upload_id), "ab") as part:
+                try:
+                    async for chunk in chunks:
+                        if written + len(chunk) > meta["size"]:
+                            # Rien au-delà de la taille annoncée: annuler le bloc entier
+                            await part.truncate(offset)
+                            raise HTTPException(
+                                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                detail="Chunk exceeds the declared upload size"
+                            )
+                        await part.write(chunk)
+                        written += len(chunk)
+                finally:
+                    # Coupure réseau: les octets déjà reçus restent acquis
+                    await part.flush()
+            return written
+
+    @classmethod
+    async def complete(cls, upload_id: str, owner: Optional[int]) -> str:
+        """Vérifie que tout est reçu et transmet le fichier à UploadService.finalize"""
+        async with cls._lock(upload_id):
+            meta = await cls._load(upload_id, owner)
+            if meta["offset"] != meta["size"]:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"Upload incomplete: {meta['offset']}/{meta['size']} bytes received",
+                    headers={"Upload-Offset": str(meta["offset"])}
+                )
+            filename = await UploadService.finalize(cls._part_path(upload_id), meta["filename"], meta["max_size"])
+            await cls._remove(upload_id)
+            return filename
+
+    @classmethod
+    async def cancel(cls, upload_id: str, owner: Optional[int]):
+        """Abandonne une session et supprime les octets reçus"""
+        await cls._load(upload_id, owner)
+        await cls._remove(upload_id)
+
+    @classmethod
+    async def _remove(cls, upload_id: str):
+        for path in (cls._part_path(upload_id), cls._meta_path(upload_id)):
+            try:
+                await aiofiles.os.remove(path)
+            except FileNotFoundError:
+                pass
+        cls._locks.pop(upload_id, None)
+
+    @classmethod
+    def _scan(cls) -> Tuple[List[Dict], List[str]]:
+        """
+        Parcourt les sessions et supprime les fichiers de celles plus anciennes que RESUMABLE_UPLOAD_TTL
+
+        Bloquant (lecture du répertoire): exécuté dans un thread.
+
+        Returns:
+            (métadonnées des sessions ouvertes, ids des sessions supprimées)
+        """
+        min_created = time.time() - settings.RESUMABLE_UPLOAD_TTL
+        sessions = []
+        expired = []
+        for meta_path in settings.UPLOAD_TMP_DIR.glob("*.json"):
+            try:
+                if meta_path.stat().st_mtime < min_created:
+                    logger.info("Session d'upload expirée supprimée: %s", meta_path.stem)
+                    for path in (cls._part_path(meta_path.stem), meta_path):
+                        path.unlink(missing_ok=True)
+                    expired.append(meta_path.stem)
+                else:
+                    sessions.append(json.loads(meta_path.read_text()))
+            except (FileNotFoundError, ValueError):
+                pass
+        return sessions, expired
+
+    @classmethod
+    async def purge_expired(cls) -> List[Dict]:
+        """
+        Supprime les sessions plus anciennes que RESUMABLE_UPLOAD_TTL
+
+        Returns:
+            Métadonnées des sessions encore ouvertes
+        """
+        sessions, expired = await asyncio.to_thread(cls._scan)
+        for upload_id in expired:
+            cls._locks.pop(upload_id, None)
+        return sessions
@@ -0,0 +1,440 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from ..core.config import settings
+from ..core.metrics import Metrics
+from ..core.storage import get_storage, storage_key
+from ..models.user import PlanType
+from .blob_store import BlobStore
+
+logger = logging.getLogger(__name__)
+
+# Espace disque par utilisateur (uploads + rendus), selon le plan
+PLAN_STORAGE_QUOTAS = {
+    PlanType.FREE: 500 * 1024 * 1024,
+    PlanType.STARTER: 2 * 1024 * 1024 * 1024,
+    PlanType.PRO: 10 * 1024 * 1024 * 1024,
+    PlanType.STUDIO: 50 * 1024 * 1024 * 1024,
+}
+
+# Types de fichiers suivis
+KIND_TRANSCODE = "transcode"
+KIND_RENDER = "render"
+KIND_UPLOAD = "upload"
+# Fichiers recalculables, seuls évincés par le balayage global (du premier au dernier)
+EVICTION_ORDER = (KIND_TRANSCODE, KIND_RENDER)
+
+
+class StorageLifecycle:
+    """
+    Cycle de vie des fichiers sur disque: uploads, rendus (processed/) et
+    conversions de téléchargement.
+
+    Chaque fichier est suivi (taille, propriétaire, dernier accès) dans
+    STORAGE_DB. Un fichier qui ferait dépasser son quota à un utilisateur
+    évince d'abord ses rendus les moins récemment utilisés, puis ses uploads
+    inactifs depuis STORAGE_UPLOAD_MIN_IDLE: les uploads supprimés sont
+    renvoyés par admit() pour être signalés dans la réponse. Les fichiers
+    des visiteurs anonymes partagent un seul quota (STORAGE_ANONYMOUS_QUOTA).
+
+    Le balayage en arrière-plan supprime les rendus expirés et les uploads
+    anonymes inutilisés depuis STORAGE_ANONYMOUS_UPLOAD_TTL; au-delà du seuil
+    haut (STORAGE_HIGH_WATER x STORAGE_MAX_BYTES), il évince par ordre LRU les
+    conversions puis les rendus, jusqu'au seuil bas. Il ne supprime jamais
+    l'upload d'un utilisateur connecté: ce sont ses fichiers, pas un cache.
+
+    Les accès sont notés en mémoire et écrits en base par lot à chaque
+    balayage: servir un fichier ne coûte pas d'écriture SQLite.
+    """
+
+    _lock = threading.Lock()
+    _connection: Optional[sqlite3.Connection] = None
+    # (type, nom) -> date du dernier accès pas encore écrite en base
+    _pending_touches: Dict[Tuple[str, str], float] = {}
+    # Verrou court propre aux accès: touch() est appelé depuis la boucle et ne doit
+    # pas attendre un balayage qui tient _lock
+    _touches_lock = threading.Lock()
+    _task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def _db(cls) -> sqlite3.Connection:
+        if cls._connection is None:
+            connection = sqlite3.connect(str(settings.STORAGE_DB), check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "kind TEXT NOT NULL, name TEXT NOT NULL, owner INTEGER, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL, PRIMARY KEY (kind, name))"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_files_accessed ON files(kind, accessed_at)")
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_files_owner ON files(owner)")
+            connection.commit()
+            cls._connection = connection
+        return cls._connection
+
+    @staticmethod
+    def quota(plan: PlanType) -> int:
+        return PLAN_STORAGE_QUOTAS.get(plan, PLAN_STORAGE_QUOTAS[PlanType.FREE])
+
+    # === Suivi ===
+
+    @classmethod
+    def _insert(cls, kind: str, name: str, size: int, owner: Optional[int]):
+        """Écrit le suivi d'un fichier (appelant: verrou tenu)"""
+        now = time.time()
+        db = cls._db()
+        db.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+            (kind, name, owner, size, now, now)
+        )
+        db.commit()
+
+    @classmethod
+    def track(cls, kind: str, name: str, size: int, owner: Optional[int] = None):
+        """Enregistre un nouveau fichier (bloquant, écriture SQLite)"""
+        with cls._lock:
+            cls._insert(kind, name, size, owner)
+
+    @classmethod
+    def touch(cls, kind: str, name: str):
+        """Note un accès (en mémoire, écrit au prochain balayage)"""
+        with cls._touches_lock:
+            cls._pending_touches[(kind, name)] = time.time()
+
+    @classmethod
+    def _flush_touches(cls):
+        with cls._touches_lock:
+            touches, cls._pending_touches = cls._pending_touches, {}
+        if touches:
+            cls._db().executemany(
+                "UPDATE files SET accessed_at = MAX(accessed_at, ?) WHERE kind = ? AND name = ?",
+                ((accessed_at, kind, name) for (kind, name), accessed_at in touches.items())
+            )
+            cls._db().commit()
+
+    @classmethod
+    def usage(cls, owner: int) -> int:
+        """Octets occupés par un utilisateur (uploads et rendus)"""
+        with cls._lock:
+            row = cls._db().execute(
+                "SELECT COALESCE(SUM(size), 0) FROM files WHERE owner = ? AND kind IN (?, ?)",
+                (owner, KIND_UPLOAD, KIND_RENDER)
+            ).fetchone()
+        return row[0]
+
+    @classmethod
+    def owned(cls, kind: str, names: List[str], owner: int) -> List[str]:
+        """Fichiers de la liste appartenant à l'utilisateur (ordre conservé)"""
+        if not names:
+            return []
+        with cls._lock:
+            rows = cls._db().execute(
+                f"SELECT name FROM files WHERE kind = ? AND owner = ? AND name IN ({', '.join('?' * len(names))})",
+                (kind, owner, *names)
+            ).fetchall()
+        found = {row[0] for row in rows}
+        return [name for name in names if name in found]
+
+    # === Quotas ===
+
+    @classmethod
+    def _quota_for(cls, owner: Optional[int], plan: PlanType) -> int:
+        return cls.quota(plan) if owner is not None else settings.STORAGE_ANONYMOUS_QUOTA
+
+    @staticmethod
+    def _quota_exceeded(owner: Optional[int], quota: int) -> HTTPException:
+        if owner is None:
+            detail = "Storage quota for anonymous uploads exceeded. Please sign in or try again later."
+        else:
+            detail = f"Storage quota exceeded for your plan ({quota / (1024*1024):.0f}MB)"
+        return HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail)
+
+    @classmethod
+    def _room(cls, owner: Optional[int], kind: str = "", name: str = "") -> Tuple[int, List[Tuple[str, str, int]]]:
+        """
+        Octets occupés par l'utilisateur (ou les anonymes) et fichiers évinçables (appelant: verrou tenu)
+
+        Le fichier (kind, name) en cours d'admission n'est compté dans aucun des deux.
+
+        Returns:
+            (octets occupés, [(type, nom, taille)] dans l'ordre d'éviction)
+        """
+        db = cls._db()
+        # "owner IS ?": même requête pour un utilisateur et pour les anonymes (NULL)
+        used = db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM files WHERE owner IS ? AND kind IN (?, ?) AND NOT (kind = ? AND name = ?)",
+            (owner, KIND_UPLOAD, KIND_RENDER, kind, name)
+        ).fetchone()[0]
+        candidates = [
+            (KIND_RENDER, render_name, render_size) for render_name, render_size in db.execute(
+                "SELECT name, size FROM files WHERE owner IS ? AND kind = ? AND name != ? ORDER BY accessed_at",
+                (owner, KIND_RENDER, name)
+            )
+        ]
+        if owner is not None:
+            candidates += [
+                (KIND_UPLOAD, upload_name, upload_size) for upload_name, upload_size in db.execute(
+                    "SELECT name, size FROM files WHERE owner = ? AND kind = ? AND accessed_at < ? "
+                    "AND name != ? ORDER BY accessed_at",
+                    (owner, KIND_UPLOAD, time.time() - settings.STORAGE_UPLOAD_MIN_IDLE, name)
+                )
+            ]
+        return used, candidates
+
+    @classmethod
+    def check_quota(cls, owner: Optional[int], plan: PlanType, size: int):
+        """
+        Vérifie que `size` octets de plus tiendraient dans le quota, sans rien évincer ni enregistrer
+
+        Utilisé à l'ouverture d'un upload reprenable: les octets annoncés par
+        les sessions ouvertes sont comptés avant d'être reçus (bloquant).
+
+        Raises:
+            HTTPException 413: quota du plan dépassé même après éviction
+        """
+        quota = cls._quota_for(owner, plan)
+        with cls._lock:
+            cls._flush_touches()
+            used, candidates = cls._room(owner)
+        if used + size - sum(candidate_size for _, _, candidate_size in candidates) > quota:
+            raise cls._quota_exceeded(owner, quota)
+
+    @classmethod
+    def admit(cls, kind: str, name: str, size: int, owner: Optional[int], plan: PlanType) -> List[str]:
+        """
+        Enregistre un fichier qui vient d'être créé, dans la limite du quota du plan
+
+        Pour faire de la place, les rendus les moins récemment utilisés de
+        l'utilisateur sont évincés, puis ses uploads inactifs depuis
+        STORAGE_UPLOAD_MIN_IDLE; si cela ne suffit pas, le nouveau fichier est
+        supprimé (bloquant: à appeler hors de la boucle). Les fichiers
+        anonymes (owner None) partagent STORAGE_ANONYMOUS_QUOTA et n'évincent
+        que des rendus: leurs uploads expirent au balayage.
+
+        La vérification et l'enregistrement se font dans la même section
+        critique: deux fichiers admis en même temps ne peuvent pas dépasser
+        ensemble le quota.
+
+        Returns:
+            Noms des uploads de l'utilisateur supprimés (à lui signaler)
+
+        Raises:
+            HTTPException 413: quota du plan dépassé
+        """
+        evicted_uploads = []
+        quota = cls._quota_for(owner, plan)
+        with cls._lock:
+            cls._flush_touches()
+            used, candidates = cls._room(owner, kind, name)
+            freeable = sum(candidate_size for _, _, candidate_size in candidates)
+            if used + size - freeable > quota:
+                cls._delete(kind, name)
+                raise cls._quota_exceeded(owner, quota)
+            for candidate_kind, candidate_name, candidate_size in candidates:
+                if used + size <= quota:
+                    break
+                cls._delete(candidate_kind, candidate_name)
+                used -= candidate_size
+                Metrics.increment(f"storage.evictions.quota.{candidate_kind}")
+                if candidate_kind == KIND_UPLOAD:
+                    evicted_uploads.append(candidate_name)
+            # Réservé dans la section critique: l'admission suivante compte déjà ce fichier
+            try:
+                cls._insert(kind, name, size, owner)
+            except Exception:
+                # Suivi impossible: le fichier ne doit pas occuper de place sans être compté
+                cls._db().rollback()
+                cls._delete(kind, name)
+                raise
+        if evicted_uploads:
+            logger.info("Quota de l'utilisateur %s: uploads inactifs supprimés %s", owner, evicted_uploads)
+        return evicted_uploads
+
+    # === Suppression ===
+
+    @staticmethod
+    def _path(kind: str, name: str) -> Optional[Path]:
+        if kind == KIND_RENDER:
+            return settings.PROCESSED_DIR / name
+        if kind == KIND_TRANSCODE:
+            return settings.TRANSCODE_CACHE_DIR / name
+        return None
+
+    @classmethod
+    def _delete(cls, kind: str, name: str) -> int:
+        """
+        Supprime le fichier et son suivi (appelant: verrou tenu)
+
+        Returns:
+            Octets libérés sur le disque
+        """
+        if kind == KIND_UPLOAD:
+            # Le blob n'est effacé qu'avec sa dernière référence
+            freed = BlobStore.release(name)
+        else:
+            path = cls._path(kind, name)
+            try:
+                freed = path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                freed = 0
+            except OSError as e:
+                logger.warning("Impossible de supprimer %s: %s", name, e)
+                return 0
+            storage = get_storage()
+            if kind == KIND_RENDER and not storage.in_place:
+                try:
+                    storage.delete(storage_key(path))
+                except Exception as e:
+                    logger.warning("Impossible de supprimer %s du stockage: %s", name, e)
+        cls._db().execute("DELETE FROM files WHERE kind = ? AND name = ?", (kind, name))
+        cls._db().commit()
+        return freed
+
+    # === Balayage ===
+
+    @classmethod
+    def _adopt_untracked(cls):
+        """Suit les rendus et conversions créés avant le gestionnaire (date d'accès: mtime)"""
+        with cls._lock:
+            db = cls._db()
+            for kind, directory in ((KIND_RENDER, settings.PROCESSED_DIR), (KIND_TRANSCODE, settings.TRANSCODE_CACHE_DIR)):
+                known = {row[0] for row in db.execute("SELECT name FROM files WHERE kind = ?", (kind,))}
+                rows = []
+                for path in directory.iterdir():
+                    if path.name in known or path.name.startswith(".") or not path.is_file():
+                        continue
+                    stat = path.stat()
+                    rows.append((kind, path.name, None, stat.st_size, stat.st_mtime, stat.st_mtime))
+                if rows:
+                    db.executemany("INSERT OR IGNORE INTO files VALUES (?, ?, ?, ?, ?, ?)", rows)
+                    logger.info("%d fichiers %s existants suivis", len(rows), kind)
+            db.commit()
+
+    @staticmethod
+    def _staged_bytes() -> int:
+        """Octets des uploads en cours de réception (UPLOAD_TMP_DIR)"""
+        total = 0
+        for path in settings.UPLOAD_TMP_DIR.iterdir():
+            try:
+                total += path.stat().st_size
+            except FileNotFoundError:
+                pass
+        return total
+
+    @classmethod
+    def stats(cls) -> Dict[str, int]:
+        """Octets suivis par type de fichier (uploads: place réelle des blobs partagés)"""
+        with cls._lock:
+            rows = cls._db().execute("SELECT kind, COALESCE(SUM(size), 0), COUNT(*) FROM files GROUP BY kind").fetchall()
+        stats = {f"{kind}_bytes": total for kind, total, _ in rows}
+        stats.update({f"{kind}_files": count for kind, _, count in rows})
+        stats[f"{KIND_UPLOAD}_disk_bytes"] = BlobStore.total_size()
+        # Uploads reprenables en cours: pas encore suivis, mais déjà sur le disque
+        stats["staged_bytes"] = cls._staged_bytes()
+        stats["total_bytes"] = (
+            stats[f"{KIND_UPLOAD}_disk_bytes"]
+            + stats["staged_bytes"]
+            + stats.get(f"{KIND_RENDER}_bytes", 0)
+            + stats.get(f"{KIND_TRANSCODE}_bytes", 0)
+        )
+        return stats
+
+    @classmethod
+    def sweep(cls) -> int:
+        """
+        Un passage du balayage (bloquant)
+
+        Returns:
+            Nombre de fichiers supprimés
+        """
+        removed = 0
+        now = time.time()
+        with cls._lock:
+            cls._flush_touches()
+            db = cls._db()
+            # Rendus et conversions inutilisés depuis STORAGE_RENDER_TTL: recalculables
+            expired = db.execute(
+                "SELECT kind, name FROM files WHERE kind IN (?, ?) AND accessed_at < ?",
+                (KIND_RENDER, KIND_TRANSCODE, now - settings.STORAGE_RENDER_TTL)
+            ).fetchall()
+            for kind, name in expired:
+                cls._delete(kind, name)
+            removed += len(expired)
+            Metrics.increment("storage.evictions.expired", len(expired))
+            # Uploads anonymes inutilisés: personne ne peut les gérer ni les supprimer
+            anonymous = db.execute(
+                "SELECT name FROM files WHERE kind = ? AND owner IS NULL AND accessed_at < ?",
+                (KIND_UPLOAD, now - settings.STORAGE_ANONYMOUS_UPLOAD_TTL)
+            ).fetchall()
+            for (name,) in anonymous:
+                cls._delete(KIND_UPLOAD, name)
+            removed += len(anonymous)
+            Metrics.increment("storage.evictions.anonymous", len(anonymous))
+
+        total = cls.stats()["total_bytes"]
+        high_water = settings.STORAGE_MAX_BYTES * settings.STORAGE_HIGH_WATER
+        if total > high_water:
+            low_water = settings.STORAGE_MAX_BYTES * settings.STORAGE_LOW_WATER
+            logger.warning("Stockage au-dessus du seuil haut: %d / %d octets", total, settings.STORAGE_MAX_BYTES)
+            with cls._lock:
+                for kind in EVICTION_ORDER:
+                    candidates = cls._db().execute(
+                        "SELECT name, size FROM files WHERE kind = ? ORDER BY accessed_at",
+                        (kind,)
+                    ).fetchall()
+                    for name, _ in candidates:
+                        if total <= low_water:
+                            break
+                        total -= cls._delete(kind, name)
+                        removed += 1
+                        Metrics.increment(f"storage.evictions.{kind}")
+                    if total <= low_water:
+                        break
+            if total > low_water:
+                # Le reste est fait d'uploads: à régler par les quotas ou STORAGE_MAX_BYTES
+                logger.warning("Seuil bas non atteint après éviction: %d octets", total)
+        cls._publish_metrics()
+        return removed
+
+    @classmethod
+    def _publish_metrics(cls):
+        for name, value in cls.stats().items():
+            Metrics.set_gauge(f"storage.{name}", value)
+        Metrics.set_gauge("storage.max_bytes", settings.STORAGE_MAX_BYTES)
+
+    @classmethod
+    async def _run(cls):
+        await asyncio.to_thread(cls._adopt_untracked)
+        while True:
+            try:
+                removed = await asyncio.to_thread(cls.sweep)
+                if removed:
+                    logger.info("Balayage du stockage: %d fichiers supprimés", removed)
+            except Exception as e:
+                logger.error("Erreur du balayage du stockage: %s", e)
+            await asyncio.sleep(settings.STORAGE_SWEEP_INTERVAL)
+
+    @classmethod
+    def start(cls):
+        """Lance le balayage périodique (au démarrage de l'application)"""
+        if cls._task is None:
+            cls._task = asyncio.get_running_loop().create_task(cls._run())
+
+    @classmethod
+    async def stop(cls):
+        if cls._task is not None:
+            cls._task.cancel()
+            try:
+                await cls._task
+            except asyncio.CancelledError:
+                pass
+            cls._task = None
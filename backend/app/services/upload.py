@@ -1,53 +1,219 @@
+import asyncio
+import hashlib
+import logging
 import uuid
 from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import aiofiles
+import aiofiles.os
+import soundfile as sf
 from fastapi import UploadFile, HTTPException, status
 from ..core.config import settings
+from ..core.storage import ensure_local
+from .blob_store import BlobStore
+
+logger = logging.getLogger(__name__)
+
+# Bornes vérifiées à l'upload, d'après l'en-tête du fichier
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 384000
+MAX_CHANNELS = 8
 
 class UploadService:
     @staticmethod
-    async def save_upload(file: UploadFile) -> Path:
-        # Validate extension
-        filename = file.filename
+    def validate_extension(filename: str) -> str:
+        """Retourne l'extension du fichier (400 si absente ou non autorisée)"""
         if not filename:
             raise HTTPException(status_code=400, detail="Filename is missing")
-            
+
         ext = filename.split(".")[-1].lower()
         if ext not in settings.ALLOWED_EXTENSIONS:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"File type not allowed. Allowed: {settings.ALLOWED_EXTENSIONS}"
             )
-        
-        # Generate unique filename
-        file_id = str(uuid.uuid4())
-        saved_filename = f"{file_id}.{ext}"
-        file_path = settings.UPLOAD_DIR / saved_filename
-        
-        # Save file
+        return ext
+
+    @staticmethod
+    def _too_large() -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large. Maximum size: {settings.MAX_UPLOAD_SIZE / (1024*1024)}MB"
+        )
+
+    @staticmethod
+    async def _stream_to_temp(file: UploadFile) -> Tuple[Path, str, int]:
+        """
+        Copie le fichier reçu par blocs dans un fichier temporaire
+
+        La taille est vérifiée à chaque bloc (arrêt dès que MAX_UPLOAD_SIZE est
+        dépassée) et le SHA-256 est calculé au passage: la mémoire utilisée ne
+        dépasse pas quelques blocs, quelle que soit la taille du fichier.
+
+        Returns:
+            (fichier temporaire, sha256 hexadécimal, taille en octets)
+        """
+        temp_path = settings.UPLOAD_TMP_DIR / f"{uuid.uuid4()}.part"
+        digest = hashlib.sha256()
+        size = 0
         try:
-            # Read file content asynchronously
-            content = await file.read()
-            
-            # Check file size
-            if len(content) > settings.MAX_UPLOAD_SIZE:
+            async with aiofiles.open(temp_path, "wb") as buffer:
+                while True:
+                    chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > settings.MAX_UPLOAD_SIZE:
+                        raise UploadService._too_large()
+                    digest.update(chunk)
+                    await buffer.write(chunk)
+        except BaseException:
+            # Erreur, dépassement de taille ou client déconnecté: pas de fichier partiel
+            try:
+                await aiofiles.os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        return temp_path, digest.hexdigest(), size
+
+    @staticmethod
+    def _hash_file(path: Path) -> str:
+        """SHA-256 d'un fichier lu par blocs (bloquant)"""
+        digest = hashlib.sha256()
+        with open(path, "rb") as source:
+            while chunk := source.read(settings.UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def probe(path: Path) -> Dict:
+        """
+        Lit les métadonnées audio dans l'en-tête du fichier, sans le décoder (bloquant)
+
+        libsndfile (WAV, FLAC, OGG, MP3) puis audioread pour les autres cas.
+
+        Returns:
+            {"duration", "samplerate", "channels", "format", "codec"}
+
+        Raises:
+            HTTPException 422: fichier illisible, vide, trop long ou hors bornes
+        """
+        try:
+            info = sf.info(str(path))
+            media = {
+                "duration": info.duration,
+                "samplerate": info.samplerate,
+                "channels": info.channels,
+                "format": info.format,
+                "codec": info.subtype,
+            }
+        except RuntimeError as sf_error:  # sf.LibsndfileError
+            try:
+                import audioread
+                with audioread.audio_open(str(path)) as source:
+                    media = {
+                        "duration": float(source.duration),
+                        "samplerate": int(source.samplerate),
+                        "channels": int(source.channels),
+                        "format": None,
+                        "codec": None,
+                    }
+            except Exception as e:
+                logger.info("Upload illisible (%s / %s)", sf_error, e)
                 raise HTTPException(
-                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                    detail=f"File too large. Maximum size: {settings.MAX_UPLOAD_SIZE / (1024*1024)}MB"
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="Unreadable or corrupt audio file"
                 )
-            
-            # Write to disk
-            with open(file_path, "wb") as buffer:
-                buffer.write(content)
+
+        if media["duration"] <= 0:
+            reason = "Audio file contains no samples"
+        elif media["duration"] > settings.MAX_AUDIO_DURATION:
+            reason = f"Audio too long. Maximum duration: {settings.MAX_AUDIO_DURATION / 60:.0f} minutes"
+        elif not MIN_SAMPLE_RATE <= media["samplerate"] <= MAX_SAMPLE_RATE:
+            reason = f"Unsupported sample rate: {media['samplerate']} Hz"
+        elif not 1 <= media["channels"] <= MAX_CHANNELS:
+            reason = f"Unsupported channel count: {media['channels']}"
+        else:
+            return media
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=reason)
+
+    @staticmethod
+    async def finalize(
+        temp_path: Path,
+        filename: str,
+        max_size: Optional[int] = None,
+        sha256: Optional[str] = None
+    ) -> str:
+        """
+        Valide un fichier reçu (extension, taille, en-tête audio) et le range dans le stockage par contenu
+
+        Args:
+            temp_path: Fichier complet dans UPLOAD_TMP_DIR (supprimé en cas de refus)
+            filename: Nom d'origine du fichier
+            max_size: Taille maximale (MAX_UPLOAD_SIZE par défaut)
+            sha256: Empreinte déjà calculée pendant la réception (sinon relue ici)
+
+        Returns:
+            Nom attribué à l'upload ({uuid}.{ext})
+        """
+        max_size = max_size if max_size is not None else settings.MAX_UPLOAD_SIZE
+        try:
+            ext = UploadService.validate_extension(filename)
+            if (await aiofiles.os.stat(temp_path)).st_size > max_size:
+                raise UploadService._too_large()
+            # Fichier corrompu ou hors limites refusé avant tout décodage
+            media = await asyncio.to_thread(UploadService.probe, temp_path)
+        except HTTPException:
+            await aiofiles.os.remove(temp_path)
+            raise
+
+        if sha256 is None:
+            sha256 = await asyncio.to_thread(UploadService._hash_file, temp_path)
+        # Même système de fichiers: le blob apparaît complet ou pas du tout
+        return await asyncio.to_thread(BlobStore.store, temp_path, sha256, ext, media)
+
+    @staticmethod
+    async def save_upload(file: UploadFile) -> str:
+        # Validate extension
+        UploadService.validate_extension(file.filename)
+
+        # Save file
+        try:
+            temp_path, sha256, _ = await UploadService._stream_to_temp(file)
+            return await UploadService.finalize(temp_path, file.filename, sha256=sha256)
         except HTTPException:
             raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Could not save file: {str(e)}")
-            
-        return file_path
 
     @staticmethod
-    def get_file_path(filename: str) -> Path:
-        path = settings.UPLOAD_DIR / filename
-        if not path.exists():
+    def media_info(filename: str) -> Optional[Dict]:
+        """
+        Métadonnées relevées à l'upload (durée, sr, canaux, codec), sans lire le fichier
+
+        Permet d'estimer le coût d'un traitement avant de le lancer. None pour
+        les uploads antérieurs à la sonde.
+        """
+        return BlobStore.media_info(filename)
+
+    @staticmethod
+    def resolve_path(filename: str) -> Path:
+        """Chemin local d'un upload, pas forcément présent sur ce serveur (bloquant)"""
+        path = BlobStore.resolve(filename)
+        if path is None:
+            # Uploads antérieurs au stockage par contenu
+            path = settings.UPLOAD_DIR / filename
+        return path
+
+    @staticmethod
+    def _local_path(filename: str) -> Path:
+        path = UploadService.resolve_path(filename)
+        if not ensure_local(path):
             raise HTTPException(status_code=404, detail="File not found")
         return path
+
+    @staticmethod
+    async def get_file_path(filename: str) -> Path:
+        """Chemin local d'un upload, rapatrié du stockage partagé si besoin (404 si inconnu)"""
+        return await asyncio.to_thread(UploadService._local_path, filename)
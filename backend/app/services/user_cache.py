@@ -0,0 +1,108 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from ..core.config import settings
+from ..models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+class UserCache:
+    """
+    Cache des utilisateurs authentifiés (LRU + TTL), devant get_user_by_id.
+
+    Les mises à jour du profil ou du mot de passe invalident l'entrée. Pour
+    les autres workers, l'invalidation passe par un fichier marqueur par
+    utilisateur (USER_CACHE_DIR): une entrée plus ancienne que son marqueur
+    est ignorée. Le TTL borne la durée pendant laquelle une modification
+    faite hors de l'API (ex: plan changé dans Supabase) reste invisible.
+    """
+
+    _lock = threading.Lock()
+    # id -> (utilisateur, date de lecture en base)
+    _entries: "OrderedDict[int, Tuple[User, float]]" = OrderedDict()
+    # id -> date de la dernière invalidation dans ce worker, de la plus ancienne à la plus récente
+    _invalidated_at: Dict[int, float] = {}
+
+    @staticmethod
+    def _marker(user_id: int) -> Path:
+        return settings.USER_CACHE_DIR / str(user_id)
+
+    @classmethod
+    def _invalidated_since(cls, user_id: int, fetched_at: float) -> bool:
+        """True si l'utilisateur a été modifié après sa lecture en base"""
+        if cls._invalidated_at.get(user_id, 0.0) >= fetched_at:
+            return True
+        if settings.USER_CACHE_SHARED_INVALIDATION:
+            try:
+                return os.stat(cls._marker(user_id)).st_mtime >= fetched_at
+            except FileNotFoundError:
+                return False
+        return False
+
+    @classmethod
+    def get(cls, user_id: int) -> Optional[User]:
+        """Retourne l'utilisateur en cache, ou None s'il est absent, expiré ou invalidé"""
+        with cls._lock:
+            entry = cls._entries.get(user_id)
+            if entry is None:
+                return None
+            user, fetched_at = entry
+            if time.time() - fetched_at > settings.USER_CACHE_TTL or cls._invalidated_since(user_id, fetched_at):
+                del cls._entries[user_id]
+                return None
+            cls._entries.move_to_end(user_id)
+            return user
+
+    @classmethod
+    def put(cls, user: User, fetched_at: float):
+        """
+        Ajoute un utilisateur lu en base à la date `fetched_at` (début de la requête)
+
+        Une lecture commencée avant une invalidation n'est pas mise en cache.
+        """
+        with cls._lock:
+            if cls._invalidated_since(user.id, fetched_at):
+                return
+            cls._invalidated_at.pop(user.id, None)
+            cls._entries[user.id] = (user, fetched_at)
+            cls._entries.move_to_end(user.id)
+            while len(cls._entries) > settings.USER_CACHE_SIZE:
+                cls._entries.popitem(last=False)
+
+    @classmethod
+    def _prune_invalidations(cls, now: float):
+        """
+        Oublie les invalidations plus anciennes que le TTL (appelant: verrou tenu)
+
+        Une entrée lue avant elles aurait de toute façon expiré.
+        """
+        min_time = now - settings.USER_CACHE_TTL
+        while cls._invalidated_at:
+            user_id, invalidated_at = next(iter(cls._invalidated_at.items()))
+            if invalidated_at >= min_time:
+                break
+            del cls._invalidated_at[user_id]
+
+    @classmethod
+    def invalidate(cls, user_id: int):
+        """Oublie l'utilisateur dans ce worker et le signale aux autres"""
+        now = time.time()
+        with cls._lock:
+            cls._entries.pop(user_id, None)
+            # Réinsérée en fin de dictionnaire: l'ordre reste chronologique
+            cls._invalidated_at.pop(user_id, None)
+            cls._invalidated_at[user_id] = now
+            cls._prune_invalidations(now)
+        if settings.USER_CACHE_SHARED_INVALIDATION:
+            try:
+                marker = cls._marker(user_id)
+                marker.touch()
+                os.utime(marker, (now, now))
+            except OSError as e:
+                logger.warning("Impossible de signaler l'invalidation de l'utilisateur %s: %s", user_id, e)
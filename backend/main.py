@@ -1,6 +1,12 @@
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+# Logs asynchrones (file + thread d'écriture), avant l'import des services
+from app.core.log import setup_logging
+setup_logging()
+
 app = FastAPI(
     title="Brainwave Audio API",
     description="Backend for Brainwave Audio Micro-SaaS",
@@ -31,6 +37,38 @@ from app.api.auth import router as auth_router
 app.include_router(api_router, prefix="/api")
 app.include_router(auth_router, prefix="/api")  # Le router auth a déjà le prefix "/auth", donc ça devient "/api/auth"
 
+@app.on_event("startup")
+async def warm_up_services():
+    # Client Gemini partagé et catalogue des modèles chargé en arrière-plan
+    from app.services.gemini_client import GeminiClientManager
+    GeminiClientManager.warm_up()
+    # Rapports IA en cache chargés hors de la boucle (les lectures ne touchent plus au disque)
+    from app.services.report_cache import AIReportCache
+    await asyncio.to_thread(AIReportCache.load)
+    # Index des empreintes: les recherches de doublons se font ensuite en mémoire
+    from app.services.fingerprint import FingerprintService
+    await asyncio.to_thread(FingerprintService.load)
+    # Balayage périodique des fichiers (quotas, seuil haut, rendus expirés)
+    from app.services.storage_lifecycle import StorageLifecycle
+    StorageLifecycle.start()
+    # Pool de processus des calculs lourds, modules de calcul chargés dans chaque processus
+    from app.core.compute import ComputeExecutor
+    ComputeExecutor.start(preload=("app.services.analysis", "app.services.audio"))
+
+@app.on_event("shutdown")
+async def close_services():
+    # Connexions gardées ouvertes vers la base
+    from app.core.repository import get_user_repository
+    await get_user_repository().close()
+    from app.services.storage_lifecycle import StorageLifecycle
+    await StorageLifecycle.stop()
+    from app.services.report_cache import AIReportCache
+    await asyncio.to_thread(AIReportCache.flush)
+    from app.core.compute import ComputeExecutor
+    ComputeExecutor.stop()
+    from app.core.storage import get_storage
+    get_storage().close()
+
 @app.get("/")
 async def root():
     return {"message": "Brainwave Audio API is running"}
@@ -0,0 +1,65 @@
+import os
+
+# Avant tout import de app.core.config: base SQLite, pas de Supabase
+os.environ.setdefault("DB_BACKEND", "sqlite")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import pytest
+
+from app.core.config import settings
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def tmp_settings(tmp_path, monkeypatch):
+    """Répertoires et bases de données du backend dans un dossier temporaire"""
+    directories = {
+        "UPLOAD_DIR": tmp_path / "uploads",
+        "PROCESSED_DIR": tmp_path / "processed",
+        "CACHE_DIR": tmp_path / "cache",
+        "USER_CACHE_DIR": tmp_path / "cache" / "user_invalidations",
+        "TRANSCODE_CACHE_DIR": tmp_path / "cache" / "transcoded",
+        "UPLOAD_TMP_DIR": tmp_path / "uploads" / ".incoming",
+        "BLOB_DIR": tmp_path / "uploads" / "blobs",
+        "TOKEN_REVOCATION_DIR": tmp_path / "token_revocations",
+    }
+    for name, path in directories.items():
+        path.mkdir(parents=True, exist_ok=True)
+        monkeypatch.setattr(settings, name, path)
+    for name in ("BLOB_DB", "STORAGE_DB", "FINGERPRINT_DB", "AI_REPORT_CACHE_DB"):
+        if hasattr(settings, name):
+            monkeypatch.setattr(settings, name, tmp_path / f"{name.lower()}.db")
+    monkeypatch.setattr(settings, "BASE_DIR", tmp_path)
+    return settings
+
+
+@pytest.fixture
+def blob_store(tmp_settings, monkeypatch):
+    """BlobStore sur une base neuve, avec le stockage local (BASE_DIR temporaire)"""
+    from app.core import storage
+    from app.services.blob_store import BlobStore
+
+    monkeypatch.setattr(storage, "_storage", storage.LocalStorageBackend(tmp_settings.BASE_DIR))
+    monkeypatch.setattr(BlobStore, "_connection", None)
+    yield BlobStore
+    if BlobStore._connection is not None:
+        BlobStore._connection.close()
+
+
+
+@pytest.fixture
+def store_upload(blob_store, tmp_path):
+    """Enregistre un upload (contenu donné) dans le BlobStore et retourne son nom"""
+    import hashlib
+    import uuid
+
+    def store(content: bytes, ext: str = "wav") -> str:
+        temp_path = tmp_path / f".incoming-{uuid.uuid4().hex}"
+        temp_path.write_bytes(content)
+        return blob_store.store(temp_path, hashlib.sha256(content).hexdigest(), ext)
+
+    return store
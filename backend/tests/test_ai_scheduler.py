@@ -0,0 +1,201 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.models.user import PlanType
+from app.services import ai_scheduler
+from app.services.ai_scheduler import AIRequestScheduler
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setattr(AIRequestScheduler, "_in_flight", {})
+    monkeypatch.setattr(AIRequestScheduler, "_budgets", {})
+    monkeypatch.setattr(AIRequestScheduler, "_global_budget", None)
+    monkeypatch.setattr(AIRequestScheduler, "_waiting", 0)
+    monkeypatch.setattr(AIRequestScheduler, "_pruned_at", time.monotonic())
+    monkeypatch.setattr(settings, "AI_BUDGET_SCALE", 1)
+    monkeypatch.setattr(settings, "AI_QUEUE_TIMEOUT", 0.05)
+    monkeypatch.setattr(settings, "AI_MAX_QUEUE_SIZE", 100)
+    monkeypatch.setattr(settings, "AI_GLOBAL_REQUESTS_PER_MINUTE", 1000)
+    monkeypatch.setattr(settings, "AI_GLOBAL_TOKENS_PER_MINUTE", 10 ** 9)
+    # FREE: 2 requêtes et 1000 tokens par minute et par client
+    monkeypatch.setitem(ai_scheduler.PLAN_BUDGETS, PlanType.FREE, (2, 1000))
+    return AIRequestScheduler
+
+
+def requests_left(scheduler, client_id: str, plan: PlanType = PlanType.FREE) -> float:
+    budget = scheduler._budgets[(plan, client_id)]
+    budget.requests.refill()
+    return budget.requests.level
+
+
+async def exhaust(scheduler, client_id: str):
+    for _ in range(2):
+        await scheduler.acquire(PlanType.FREE, client_id, 10)
+
+
+@pytest.mark.anyio
+async def test_budget_is_per_client(scheduler):
+    await exhaust(scheduler, "ip:1")
+    with pytest.raises(HTTPException) as excinfo:
+        await scheduler.acquire(PlanType.FREE, "ip:1", 10)
+    assert excinfo.value.status_code == 429
+    assert int(excinfo.value.headers["Retry-After"]) >= 1
+    # Un autre client du même plan n'est pas concerné
+    await scheduler.acquire(PlanType.FREE, "ip:2", 10)
+    await scheduler.acquire(PlanType.FREE, "user:7", 10)
+
+
+@pytest.mark.anyio
+async def test_token_budget(scheduler):
+    await scheduler.acquire(PlanType.FREE, "user:1", 900)
+    with pytest.raises(HTTPException):
+        await scheduler.acquire(PlanType.FREE, "user:1", 200)
+
+
+@pytest.mark.anyio
+async def test_same_client_on_another_plan_has_its_own_budget(scheduler):
+    await exhaust(scheduler, "user:1")
+    await scheduler.acquire(PlanType.PRO, "user:1", 10)
+
+
+@pytest.mark.anyio
+async def test_waiting_request_is_served_after_refill(scheduler, monkeypatch):
+    monkeypatch.setattr(settings, "AI_QUEUE_TIMEOUT", 5)
+    await exhaust(scheduler, "user:1")
+    waiter = asyncio.ensure_future(scheduler.acquire(PlanType.FREE, "user:1", 10))
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+    assert scheduler._waiting == 1
+
+    # Une minute plus tard: budget rechargé
+    budget = scheduler._budgets[(PlanType.FREE, "user:1")]
+    budget.requests.updated_at -= 60
+    budget.tokens.updated_at -= 60
+    budget.timer.cancel()
+    budget.dispatch()
+    await asyncio.wait_for(waiter, 1)
+    assert scheduler._waiting == 0
+
+
+@pytest.mark.anyio
+async def test_queue_size_is_bounded(scheduler, monkeypatch):
+    monkeypatch.setattr(settings, "AI_MAX_QUEUE_SIZE", 1)
+    monkeypatch.setattr(settings, "AI_QUEUE_TIMEOUT", 5)
+    await exhaust(scheduler, "user:1")
+    await exhaust(scheduler, "user:2")
+    waiter = asyncio.ensure_future(scheduler.acquire(PlanType.FREE, "user:1", 10))
+    await asyncio.sleep(0.01)
+    with pytest.raises(HTTPException) as excinfo:
+        await scheduler.acquire(PlanType.FREE, "user:2", 10)
+    assert excinfo.value.status_code == 429
+    waiter.cancel()
+
+
+@pytest.mark.anyio
+async def test_identical_requests_share_one_call_and_both_pay(scheduler):
+    calls = []
+    release = asyncio.Event()
+
+    async def call():
+        calls.append(1)
+        await release.wait()
+        return "report"
+
+    first = asyncio.ensure_future(scheduler.run("key", PlanType.FREE, "user:1", 10, call))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(scheduler.run("key", PlanType.FREE, "user:2", 10, call))
+    await asyncio.sleep(0.01)
+    release.set()
+    assert await asyncio.gather(first, second) == ["report", "report"]
+    assert calls == [1]
+    assert requests_left(scheduler, "user:1") == pytest.approx(1, abs=0.01)
+    assert requests_left(scheduler, "user:2") == pytest.approx(1, abs=0.01)
+
+
+@pytest.mark.anyio
+async def test_joiner_does_not_inherit_creators_429(scheduler):
+    calls = []
+    release = asyncio.Event()
+
+    async def call():
+        calls.append(1)
+        await release.wait()
+        return "report"
+
+    await exhaust(scheduler, "user:1")
+    # user:1 attend son propre budget, sans bloquer user:2 qui a de la marge
+    first = asyncio.ensure_future(scheduler.run("key", PlanType.FREE, "user:1", 10, call))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(scheduler.run("key", PlanType.FREE, "user:2", 10, call))
+    await asyncio.sleep(0.01)
+    release.set()
+    assert await second == "report"
+    with pytest.raises(HTTPException) as excinfo:
+        await first
+    assert excinfo.value.status_code == 429
+    assert calls == [1]
+
+
+@pytest.mark.anyio
+async def test_global_budget_caps_distinct_clients(scheduler, monkeypatch):
+    monkeypatch.setattr(settings, "AI_GLOBAL_REQUESTS_PER_MINUTE", 3)
+    for client in range(3):
+        await scheduler.acquire(PlanType.FREE, f"ip:{client}", 10)
+    with pytest.raises(HTTPException) as excinfo:
+        await scheduler.acquire(PlanType.FREE, "ip:3", 10)
+    assert excinfo.value.status_code == 429
+    assert int(excinfo.value.headers["Retry-After"]) >= 1
+
+
+@pytest.mark.anyio
+async def test_shared_call_is_charged_once_globally(scheduler, monkeypatch):
+    monkeypatch.setattr(settings, "AI_GLOBAL_REQUESTS_PER_MINUTE", 60)
+    release = asyncio.Event()
+
+    async def call():
+        await release.wait()
+        return "report"
+
+    first = asyncio.ensure_future(scheduler.run("key", PlanType.FREE, "user:1", 10, call))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(scheduler.run("key", PlanType.FREE, "user:2", 10, call))
+    await asyncio.sleep(0.01)
+    release.set()
+    await asyncio.gather(first, second)
+    budget = scheduler._global()
+    budget.requests.refill()
+    assert budget.requests.level == pytest.approx(59, abs=0.1)
+
+
+@pytest.mark.anyio
+async def test_joining_does_not_bypass_budget(scheduler):
+    release = asyncio.Event()
+
+    async def call():
+        await release.wait()
+        return "report"
+
+    await exhaust(scheduler, "user:2")
+    first = asyncio.ensure_future(scheduler.run("key", PlanType.FREE, "user:1", 10, call))
+    await asyncio.sleep(0)
+    with pytest.raises(HTTPException) as excinfo:
+        await scheduler.run("key", PlanType.FREE, "user:2", 10, call)
+    assert excinfo.value.status_code == 429
+    # L'appel partagé continue pour le premier client
+    release.set()
+    assert await first == "report"
+
+
+@pytest.mark.anyio
+async def test_idle_budgets_are_forgotten(scheduler, monkeypatch):
+    await scheduler.acquire(PlanType.FREE, "ip:1", 10)
+    await scheduler.acquire(PlanType.FREE, "ip:2", 10)
+    scheduler._budgets[(PlanType.FREE, "ip:1")].used_at -= 120
+    monkeypatch.setattr(AIRequestScheduler, "_pruned_at", time.monotonic() - 120)
+    await scheduler.acquire(PlanType.FREE, "ip:3", 10)
+    assert set(scheduler._budgets) == {(PlanType.FREE, "ip:2"), (PlanType.FREE, "ip:3")}
@@ -0,0 +1,105 @@
+import pytest
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.services import auth
+
+
+@pytest.mark.anyio
+async def test_password_task_rejected_when_queue_full(monkeypatch):
+    monkeypatch.setattr(auth, "_password_pending", settings.PASSWORD_HASH_MAX_QUEUE)
+    with pytest.raises(HTTPException) as exc_info:
+        await auth.get_password_hash_async("secret")
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.headers["Retry-After"] == "1"
+
+
+@pytest.mark.anyio
+async def test_update_password_propagates_backpressure(monkeypatch):
+    monkeypatch.setattr(auth, "_password_pending", settings.PASSWORD_HASH_MAX_QUEUE)
+    with pytest.raises(HTTPException) as exc_info:
+        await auth.update_user_password(1, "new-secret")
+    assert exc_info.value.status_code == 503
+
+
+@pytest.mark.anyio
+async def test_password_hash_roundtrip():
+    hashed = await auth.get_password_hash_async("secret")
+    assert await auth.verify_password_async("secret", hashed)
+    assert not await auth.verify_password_async("other", hashed)
+
+
+# === Révocation des tokens ===
+
+@pytest.fixture
+def revocations(tmp_settings, monkeypatch):
+    """Fichiers de révocation dans un dossier temporaire, versions en mémoire vidées"""
+    monkeypatch.setattr(auth, "_token_versions", {})
+    return tmp_settings.TOKEN_REVOCATION_DIR
+
+
+@pytest.fixture
+def users(revocations, tmp_settings, monkeypatch):
+    from app.core.repository import SQLiteUserRepository
+    from app.services.user_cache import UserCache
+
+    repository = SQLiteUserRepository(tmp_settings.BASE_DIR / "users.db")
+    monkeypatch.setattr(auth, "get_user_repository", lambda: repository)
+    monkeypatch.setattr(UserCache, "_entries", type(UserCache._entries)())
+    monkeypatch.setattr(UserCache, "_invalidated_at", {})
+    return repository
+
+
+def test_revocation_is_stored_as_a_counter(revocations):
+    assert auth.get_token_version(1) == 0
+    auth.revoke_user_tokens(1)
+    assert (revocations / "1").read_text() == "1"
+    auth.revoke_user_tokens(1)
+    assert auth.get_token_version(1) == 2
+    assert auth.get_token_version(2) == 0
+    assert sorted(path.name for path in revocations.iterdir()) == ["1"]
+
+
+def test_token_version_is_cached_in_memory(revocations, monkeypatch):
+    auth.revoke_user_tokens(1)
+
+    def no_io(user_id):
+        raise AssertionError("revocation marker read on a cached version")
+
+    monkeypatch.setattr(auth, "_read_token_version", no_io)
+    assert auth.get_token_version(1) == 1
+
+
+def test_other_worker_revocation_is_seen_after_ttl(revocations, monkeypatch):
+    assert auth.get_token_version(1) == 0
+    # Révocation écrite par un autre worker (ou un autre serveur)
+    (revocations / "1").write_text("3")
+    assert auth.get_token_version(1) == 0
+    monkeypatch.setattr(settings, "TOKEN_VERSION_CACHE_TTL", 0)
+    assert auth.get_token_version(1) == 3
+
+
+@pytest.mark.anyio
+async def test_password_change_revokes_issued_tokens(users):
+    user = await users.create({"email": "a@example.com", "hashed_password": auth.get_password_hash("old")})
+    old_tokens = auth.create_token_pair(user)
+    assert await auth.update_user_password(user.id, "new-secret")
+
+    old_access = auth.verify_token(old_tokens["access_token"])
+    old_refresh = auth.verify_token(old_tokens["refresh_token"])
+    assert auth.is_token_revoked(old_access)
+    assert auth.is_token_revoked(old_refresh)
+
+    new_tokens = auth.create_token_pair(await users.get_by_id(user.id))
+    assert not auth.is_token_revoked(auth.verify_token(new_tokens["access_token"]))
+
+
+@pytest.mark.anyio
+async def test_deactivation_revokes_issued_tokens(users):
+    user = await users.create({"email": "a@example.com", "hashed_password": "x"})
+    tokens = auth.create_token_pair(user)
+    await auth.update_user_profile(user.id, {"full_name": "Alice"})
+    assert not auth.is_token_revoked(auth.verify_token(tokens["access_token"]))
+
+    await auth.update_user_profile(user.id, {"is_active": False})
+    assert auth.is_token_revoked(auth.verify_token(tokens["access_token"]))
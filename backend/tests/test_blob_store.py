@@ -0,0 +1,143 @@
+import hashlib
+
+import pytest
+
+from app.core import storage
+from app.core.storage import MemoryStorageBackend, storage_key
+
+CONTENT = b"RIFF" + bytes(range(256)) * 8
+
+
+def refcount(blob_store, content: bytes) -> int:
+    row = blob_store._db().execute(
+        "SELECT refcount FROM blobs WHERE hash = ?", (hashlib.sha256(content).hexdigest(),)
+    ).fetchone()
+    return row[0] if row is not None else 0
+
+
+def test_identical_uploads_share_one_blob(blob_store, store_upload, tmp_settings):
+    first = store_upload(CONTENT)
+    second = store_upload(CONTENT)
+    assert first != second
+    assert blob_store.resolve(first) == blob_store.resolve(second)
+    assert blob_store.resolve(first).read_bytes() == CONTENT
+    assert refcount(blob_store, CONTENT) == 2
+    assert list(tmp_settings.BLOB_DIR.iterdir()) == [blob_store.resolve(first)]
+    # Chaque contenu n'est compté qu'une fois
+    assert blob_store.total_size() == len(CONTENT)
+
+
+def test_blob_is_kept_until_last_release(blob_store, store_upload):
+    first = store_upload(CONTENT)
+    second = store_upload(CONTENT)
+    blob = blob_store.resolve(first)
+
+    assert blob_store.release(first) == 0
+    assert blob.exists()
+    assert blob_store.resolve(first) is None
+    assert blob_store.resolve(second) == blob
+    assert refcount(blob_store, CONTENT) == 1
+
+    assert blob_store.release(second) == len(CONTENT)
+    assert not blob.exists()
+    assert refcount(blob_store, CONTENT) == 0
+    assert blob_store.total_size() == 0
+
+
+@pytest.mark.parametrize("filename", ["unknown.wav", "../secret.wav"])
+def test_release_of_unknown_name_frees_nothing(blob_store, store_upload, filename):
+    name = store_upload(CONTENT)
+    assert blob_store.release(filename) == 0
+    assert blob_store.release(name) == len(CONTENT)
+    # Une seconde libération du même nom est sans effet
+    assert blob_store.release(name) == 0
+
+
+def test_content_stored_again_after_deletion(blob_store, store_upload):
+    name = store_upload(CONTENT)
+    blob_store.release(name)
+    again = store_upload(CONTENT)
+    assert blob_store.resolve(again).read_bytes() == CONTENT
+    assert refcount(blob_store, CONTENT) == 1
+
+
+def test_media_info_follows_the_content(blob_store, store_upload, tmp_path):
+    temp_path = tmp_path / "upload.part"
+    temp_path.write_bytes(CONTENT)
+    media = {"duration": 12.5, "sample_rate": 44100}
+    name = blob_store.store(temp_path, hashlib.sha256(CONTENT).hexdigest(), "wav", media)
+    duplicate = store_upload(CONTENT)
+    assert blob_store.media_info(duplicate) == media
+
+    blob_store.release(name)
+    assert blob_store.media_info(duplicate) == media
+    blob_store.release(duplicate)
+    assert blob_store.media_info(duplicate) is None
+
+
+def test_filenames_for_blob(blob_store, store_upload):
+    first = store_upload(CONTENT)
+    second = store_upload(CONTENT)
+    assert blob_store.filenames_for(blob_store.resolve(first).name) == [first, second]
+    # Upload antérieur au stockage par contenu: aucun nom
+    assert blob_store.filenames_for("legacy.wav") == []
+
+
+class CheckingStorage(MemoryStorageBackend):
+    """Stockage partagé qui vérifie qu'aucun appel n'est fait sous le verrou du BlobStore"""
+
+    def __init__(self, blob_store):
+        super().__init__()
+        self.blob_store = blob_store
+
+    def delete(self, key: str):
+        assert not self.blob_store._lock.locked(), "storage call made under BlobStore._lock"
+        assert not self.blob_store._db().in_transaction, "storage call made inside the transaction"
+        super().delete(key)
+
+
+@pytest.fixture
+def shared(blob_store, monkeypatch):
+    backend = CheckingStorage(blob_store)
+    monkeypatch.setattr(storage, "_storage", backend)
+    return backend
+
+
+def test_last_release_deletes_shared_blob(blob_store, store_upload, shared):
+    first = store_upload(CONTENT)
+    second = store_upload(CONTENT)
+    key = storage_key(blob_store.resolve(first))
+    assert shared.size(key) == len(CONTENT)
+
+    assert blob_store.release(first) == 0
+    assert shared.size(key) == len(CONTENT)
+    assert shared.get_bytes(f"uploads/refs/{first}") is None
+    assert shared.get_bytes(f"uploads/refs/{second}") is not None
+
+    assert blob_store.release(second) == len(CONTENT)
+    assert shared.size(key) is None
+    assert shared.get_bytes(f"uploads/refs/{second}") is None
+
+
+def test_content_stored_during_release_stays_shared(blob_store, store_upload, shared, monkeypatch):
+    name = store_upload(CONTENT)
+    key = storage_key(blob_store.resolve(name))
+    delete = shared.delete
+    stored = []
+
+    def store_then_delete(key_to_delete):
+        # Upload identique reçu après la transaction de release(), avant l'effacement
+        # du blob partagé: il le trouve encore et ne l'envoie pas
+        if key_to_delete == key and not stored:
+            stored.append(store_upload(CONTENT))
+        delete(key_to_delete)
+
+    monkeypatch.setattr(shared, "delete", store_then_delete)
+    blob_store.release(name)
+    assert blob_store.resolve(stored[0]).read_bytes() == CONTENT
+    assert shared.size(key) == len(CONTENT)
+
+
+def test_release_leaves_no_set_aside_file(blob_store, store_upload, tmp_settings):
+    blob_store.release(store_upload(CONTENT))
+    assert list(tmp_settings.BLOB_DIR.iterdir()) == []
@@ -0,0 +1,157 @@
+import asyncio
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from app.api import endpoints
+from app.core import compute
+from app.core.compute import ComputeExecutor, parse_limits
+from app.core.config import settings
+from app.core.metrics import Metrics
+
+
+def record_metrics(value: float) -> float:
+    """Exécutée dans un processus du pool: métriques à renvoyer au serveur"""
+    Metrics.increment("test.compute.calls")
+    Metrics.observe("test.compute.value", value)
+    return value * 2
+
+
+def total(signal: np.ndarray) -> float:
+    return float(signal.sum())
+
+
+@pytest.fixture
+def admission(monkeypatch):
+    monkeypatch.setattr(ComputeExecutor, "_limits", {"analyze": 1})
+    monkeypatch.setattr(ComputeExecutor, "_semaphores", {})
+    monkeypatch.setattr(ComputeExecutor, "_waiting", {})
+    monkeypatch.setattr(Metrics, "_counters", {})
+    return ComputeExecutor
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(ComputeExecutor, "_pool", None)
+    monkeypatch.setattr(ComputeExecutor, "worker_count", staticmethod(lambda: 1))
+    ComputeExecutor.start()
+    yield ComputeExecutor
+    ComputeExecutor.stop()
+
+
+def test_parse_limits():
+    assert parse_limits("analyze=4, process=2,bad,compare=x,zero=0") == {"analyze": 4, "process": 2, "zero": 1}
+
+
+# === Admission ===
+
+@pytest.mark.anyio
+async def test_full_queue_is_rejected_with_retry_after(admission, monkeypatch):
+    monkeypatch.setattr(settings, "COMPUTE_MAX_QUEUE", 0)
+    monkeypatch.setattr(settings, "COMPUTE_RETRY_AFTER", 7)
+    async with admission.slot("analyze"):
+        with pytest.raises(HTTPException) as excinfo:
+            async with admission.slot("analyze"):
+                pass
+    assert excinfo.value.status_code == 503
+    assert excinfo.value.headers["Retry-After"] == "7"
+    assert Metrics.snapshot()["counters"]["compute.analyze.rejected"] == 1
+
+
+@pytest.mark.anyio
+async def test_queue_timeout_is_rejected(admission, monkeypatch):
+    monkeypatch.setattr(settings, "COMPUTE_MAX_QUEUE", 4)
+    monkeypatch.setattr(settings, "COMPUTE_QUEUE_TIMEOUT", 0.05)
+    async with admission.slot("analyze"):
+        with pytest.raises(HTTPException) as excinfo:
+            async with admission.slot("analyze"):
+                pass
+    assert excinfo.value.status_code == 503
+    assert admission._waiting["analyze"] == 0
+
+
+@pytest.mark.anyio
+async def test_queued_request_runs_when_slot_frees(admission, monkeypatch):
+    monkeypatch.setattr(settings, "COMPUTE_MAX_QUEUE", 4)
+    monkeypatch.setattr(settings, "COMPUTE_QUEUE_TIMEOUT", 5)
+    order = []
+
+    async def request(name: str):
+        async with admission.slot("analyze"):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(request("a"), request("b"), request("c"))
+    assert order == ["a", "b", "c"]
+    assert not admission._semaphore("analyze").locked()
+
+
+@pytest.mark.anyio
+async def test_cached_analysis_skips_admission(admission, monkeypatch, tmp_path):
+    path = tmp_path / "song.wav"
+    path.write_bytes(b"RIFF")
+
+    async def get_file_path(filename):
+        return path
+
+    def no_slot(endpoint):
+        raise AssertionError("compute slot reserved for a cache hit")
+
+    monkeypatch.setattr(endpoints.UploadService, "get_file_path", get_file_path)
+    monkeypatch.setattr(endpoints.AnalysisCache, "cached_features", classmethod(lambda cls, p: {"bpm": 120.0}))
+    monkeypatch.setattr(endpoints.StorageLifecycle, "touch", classmethod(lambda cls, kind, name: None))
+    monkeypatch.setattr(ComputeExecutor, "slot", no_slot)
+    response = await endpoints.analyze_audio(filename="song.wav")
+    assert response.features == {"bpm": 120.0}
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("configured, header, expected", [
+    ("", "Bearer anything", 404),
+    ("secret", None, 401),
+    ("secret", "Bearer wrong", 401),
+    ("secret", "Bearer secret", 200),
+])
+async def test_metrics_require_the_monitoring_token(monkeypatch, configured, header, expected):
+    from starlette.requests import Request
+
+    monkeypatch.setattr(settings, "METRICS_TOKEN", configured)
+    headers = [(b"authorization", header.encode())] if header else []
+    request = Request({"type": "http", "method": "GET", "path": "/api/metrics", "headers": headers})
+    if expected == 200:
+        assert "counters" in await endpoints.get_metrics(request)
+    else:
+        with pytest.raises(HTTPException) as excinfo:
+            await endpoints.get_metrics(request)
+        assert excinfo.value.status_code == expected
+
+
+# === Pool de processus ===
+
+@pytest.mark.anyio
+async def test_worker_metrics_reach_the_server(pool, monkeypatch):
+    monkeypatch.setattr(Metrics, "_counters", {})
+    monkeypatch.setattr(Metrics, "_summaries", {})
+    assert await pool.run(record_metrics, 1.5) == 3.0
+    assert await pool.run(record_metrics, 2.5) == 5.0
+    snapshot = Metrics.snapshot()
+    assert snapshot["counters"]["test.compute.calls"] == 2
+    assert snapshot["summaries"]["test.compute.value"]["count"] == 2
+    assert snapshot["summaries"]["test.compute.value"]["max"] == 2.5
+
+
+@pytest.mark.anyio
+async def test_large_arrays_go_through_shared_memory(pool, monkeypatch):
+    shared = []
+    share = compute._share
+
+    def tracking_share(value, segments):
+        result = share(value, segments)
+        shared.append(result)
+        return result
+
+    monkeypatch.setattr(compute, "_share", tracking_share)
+    signal = np.ones(1_000_000, dtype=np.float32)
+    assert await pool.run(total, signal) == 1_000_000.0
+    assert isinstance(shared[0], compute.SharedArray)
@@ -0,0 +1,121 @@
+import threading
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from app.services.fingerprint import FingerprintService
+
+SR = 22050
+
+
+@pytest.fixture
+def fingerprints(tmp_settings, monkeypatch):
+    for name in ("_connection", "_index", "_canonical", "_related", "_signatures"):
+        monkeypatch.setattr(FingerprintService, name, None)
+    yield FingerprintService
+    if FingerprintService._connection is not None:
+        FingerprintService._connection.close()
+
+
+def melody(seed: int, seconds: float = 8.0) -> np.ndarray:
+    """Suite de notes aléatoires (déterministe) avec un peu de bruit"""
+    rng = np.random.default_rng(seed)
+    note_length = int(0.25 * SR)
+    t = np.arange(note_length) / SR
+    notes = [
+        0.3 * np.sin(2 * np.pi * rng.uniform(200, 2000) * t) + 0.2 * np.sin(2 * np.pi * rng.uniform(200, 2000) * t)
+        for _ in range(int(seconds / 0.25))
+    ]
+    signal = np.concatenate(notes)
+    return (signal + 0.01 * rng.standard_normal(len(signal))).astype(np.float32)
+
+
+def write(path, signal, **kwargs):
+    sf.write(str(path), signal, SR, **kwargs)
+    return path
+
+
+def test_first_upload_is_new(fingerprints, tmp_path):
+    path = write(tmp_path / "a.wav", melody(1))
+    assert fingerprints.register(path) is None
+    assert fingerprints.is_registered("a.wav")
+    assert fingerprints.canonical_name("a.wav") == "a.wav"
+
+
+def test_same_audio_in_another_container_is_duplicate(fingerprints, tmp_path):
+    signal = melody(1)
+    original = write(tmp_path / "a.wav", signal)
+    copy = write(tmp_path / "b.flac", signal)
+    fingerprints.register(original)
+    assert fingerprints.register(copy) == "a.wav"
+    # L'analyse du doublon est celle du fichier canonique
+    assert fingerprints.resolve_path(copy) == original
+
+
+def test_louder_master_is_related_not_duplicate(fingerprints, tmp_path):
+    signal = melody(1)
+    original = write(tmp_path / "a.wav", signal)
+    louder = write(tmp_path / "b.wav", signal * 2.0)
+    fingerprints.register(original)
+    assert fingerprints.register(louder) is None
+    assert fingerprints.related_name("b.wav") == "a.wav"
+    # Chaque version garde sa propre analyse
+    assert fingerprints.resolve_path(louder) == louder
+
+
+def test_excerpt_is_related_not_duplicate(fingerprints, tmp_path):
+    signal = melody(1)
+    fingerprints.register(write(tmp_path / "a.wav", signal))
+    assert fingerprints.register(write(tmp_path / "b.wav", signal[:len(signal) // 2])) is None
+    assert fingerprints.related_name("b.wav") == "a.wav"
+
+
+def test_unrelated_track(fingerprints, tmp_path):
+    fingerprints.register(write(tmp_path / "a.wav", melody(1)))
+    assert fingerprints.register(write(tmp_path / "b.wav", melody(2))) is None
+    assert fingerprints.related_name("b.wav") is None
+
+
+def test_concurrent_identical_uploads_index_one_track(fingerprints, tmp_path):
+    signal = melody(1)
+    paths = [write(tmp_path / f"{name}.wav", signal) for name in ("a", "b")]
+    results = {}
+    threads = [threading.Thread(target=lambda p=p: results.update({p.name: fingerprints.register(p)})) for p in paths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Un seul des deux est indexé comme nouveau morceau, l'autre en est le doublon
+    assert sorted(value is None for value in results.values()) == [False, True]
+    canonical = next(name for name, value in results.items() if value is None)
+    indexed = {row[0] for row in fingerprints._db().execute("SELECT DISTINCT filename FROM fingerprints")}
+    assert indexed == {canonical}
+
+
+
+def test_lookups_do_not_wait_for_register(fingerprints, tmp_path):
+    fingerprints.register(write(tmp_path / "a.wav", melody(1)))
+    fingerprints.register(write(tmp_path / "b.wav", melody(1) * 2.0))
+    # Un register() en cours tient _lock (recherche + écritures SQLite)
+    with fingerprints._lock:
+        result = []
+        thread = threading.Thread(target=lambda: result.append(
+            (fingerprints.is_registered("a.wav"), fingerprints.canonical_name("b.wav"), fingerprints.related_name("b.wav"))
+        ))
+        thread.start()
+        thread.join(timeout=5)
+        assert result == [(True, "b.wav", "a.wav")]
+
+
+def test_load_restores_names(fingerprints, tmp_path, monkeypatch):
+    signal = melody(1)
+    fingerprints.register(write(tmp_path / "a.wav", signal))
+    fingerprints.register(write(tmp_path / "b.flac", signal))
+    fingerprints.register(write(tmp_path / "c.wav", signal * 2.0))
+    for name in ("_index", "_canonical", "_related", "_signatures"):
+        monkeypatch.setattr(FingerprintService, name, None)
+    fingerprints.load()
+    assert fingerprints.canonical_name("b.flac") == "a.wav"
+    assert fingerprints.related_name("c.wav") == "a.wav"
+    assert fingerprints.related_name("a.wav") is None
@@ -0,0 +1,162 @@
+import time
+
+import pytest
+
+from app.api import endpoints
+from app.services import report_cache
+from app.services.gemini_ai import GeminiAIService
+from app.services.report_cache import AIReportCache, report_key
+
+
+@pytest.fixture
+def cache(tmp_settings, monkeypatch):
+    monkeypatch.setattr(AIReportCache, "_connection", None)
+    monkeypatch.setattr(AIReportCache, "_entries", None)
+    monkeypatch.setattr(AIReportCache, "_pending_accesses", {})
+    monkeypatch.setattr(tmp_settings, "AI_REPORT_CACHE_TTL", 3600)
+    monkeypatch.setattr(tmp_settings, "AI_REPORT_CACHE_SIZE", 3)
+    yield AIReportCache
+    if AIReportCache._connection is not None:
+        AIReportCache._connection.close()
+
+
+def restart(cache, monkeypatch):
+    """Simule un redémarrage: le cache mémoire est rechargé depuis SQLite"""
+    cache._connection.close()
+    monkeypatch.setattr(AIReportCache, "_connection", None)
+    monkeypatch.setattr(AIReportCache, "_entries", None)
+    cache.load()
+
+
+def accessed_at(cache, key: str) -> float:
+    return cache._db().execute("SELECT accessed_at FROM reports WHERE key = ?", (key,)).fetchone()[0]
+
+
+# === Clés ===
+
+def test_key_ignores_precision_below_prompt():
+    assert report_key({"bpm": 120.01, "rms_level_db": -9.123}) == report_key({"bpm": 120.04, "rms_level_db": -9.1249})
+    assert report_key({"bpm": 120.0}) != report_key({"bpm": 121.0})
+
+
+def test_key_changes_with_prompt_version(monkeypatch):
+    features = {"bpm": 120.0, "key": "C major"}
+    before = report_key(features)
+    monkeypatch.setattr(report_cache, "PROMPT_VERSION", "another-version")
+    assert report_key(features) != before
+
+
+# === Cache ===
+
+def test_put_and_get(cache):
+    cache.put("a", "report a")
+    assert cache.get("a") == "report a"
+    assert cache.get("missing") is None
+
+
+def test_get_does_not_touch_sqlite(cache, monkeypatch):
+    cache.put("a", "report a")
+
+    def no_db():
+        raise AssertionError("SQLite used from get()")
+
+    monkeypatch.setattr(AIReportCache, "_db", no_db)
+    assert cache.get("a") == "report a"
+    assert cache.get("missing") is None
+
+
+def test_accesses_are_written_in_batch(cache):
+    cache.put("a", "report a")
+    written = accessed_at(cache, "a")
+    time.sleep(0.01)
+    cache.get("a")
+    assert accessed_at(cache, "a") == written
+    cache.flush()
+    assert accessed_at(cache, "a") > written
+
+
+def test_put_flushes_pending_accesses(cache):
+    cache.put("a", "report a")
+    written = accessed_at(cache, "a")
+    time.sleep(0.01)
+    cache.get("a")
+    cache.put("b", "report b")
+    assert accessed_at(cache, "a") > written
+
+
+def test_lru_eviction(cache):
+    for key in ("a", "b", "c"):
+        cache.put(key, f"report {key}")
+    cache.get("a")
+    cache.put("d", "report d")
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in ("a", "c", "d")] == ["report a", "report c", "report d"]
+    assert cache._db().execute("SELECT COUNT(*) FROM reports").fetchone()[0] == 3
+
+
+def test_reload_keeps_recently_used_entries(cache, monkeypatch, tmp_settings):
+    for key in ("a", "b", "c"):
+        cache.put(key, f"report {key}")
+        time.sleep(0.01)
+    cache.get("a")
+    cache.flush()
+    monkeypatch.setattr(tmp_settings, "AI_REPORT_CACHE_SIZE", 2)
+    restart(cache, monkeypatch)
+    assert list(cache._entries) == ["c", "a"]
+
+
+def test_expired_entry_is_dropped(cache, monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now - 7200)
+    cache.put("old", "old report")
+    monkeypatch.setattr(time, "time", lambda: now)
+    assert cache.get("old") is None
+    cache.flush()
+    assert cache._db().execute("SELECT COUNT(*) FROM reports").fetchone()[0] == 0
+
+
+# === Seuls les vrais rapports sont mis en cache ===
+
+class EmptyResponse:
+    text = None
+    candidates = []
+
+    def __str__(self):
+        return "GenerateContentResponse(candidates=[])"
+
+
+def test_response_without_text():
+    assert GeminiAIService.response_text(EmptyResponse()) is None
+    # Le texte de repli reste affiché par l'API synchrone
+    assert GeminiAIService.extract_text(EmptyResponse()) == "GenerateContentResponse(candidates=[])"
+
+
+@pytest.mark.anyio
+async def test_fallback_report_is_not_cached(cache, monkeypatch):
+    async def no_text(features):
+        return None
+
+    monkeypatch.setattr(GeminiAIService, "generate_audio_analysis_async", no_text)
+    report = await endpoints._generate_report({"bpm": 120.0}, "key")
+    assert report == "Aucune analyse disponible."
+    assert cache.get("key") is None
+
+
+@pytest.mark.anyio
+async def test_generated_report_is_cached(cache, monkeypatch):
+    async def generate(features):
+        return "Un vrai rapport"
+
+    monkeypatch.setattr(GeminiAIService, "generate_audio_analysis_async", generate)
+    assert await endpoints._generate_report({"bpm": 120.0}, "key") == "Un vrai rapport"
+    assert cache.get("key") == "Un vrai rapport"
+
+
+@pytest.mark.anyio
+async def test_batch_without_text_returns_no_parts(monkeypatch):
+    async def no_text(prompt, deadline):
+        return None
+
+    monkeypatch.setattr(GeminiAIService, "_generate_text_async", no_text)
+    parts = await GeminiAIService.generate_batch_analysis_async(["A", "B"], [{"bpm": 120.0}, {"bpm": 90.0}])
+    assert parts == [None, None]
@@ -0,0 +1,42 @@
+import pytest
+
+from app.core.repository import SQLiteUserRepository, UserRepository
+
+
+def test_incomplete_driver_fails_at_instantiation():
+    class PartialRepository(UserRepository):
+        async def get_by_id(self, user_id, timeout=None):
+            return None
+
+    with pytest.raises(TypeError):
+        PartialRepository()
+
+
+@pytest.fixture
+def repository(tmp_path):
+    return SQLiteUserRepository(tmp_path / "users.db")
+
+
+@pytest.mark.anyio
+async def test_sqlite_create_and_read(repository):
+    user = await repository.create({"email": "a@example.com", "hashed_password": "x", "plan": "pro"})
+    assert user.id is not None
+    assert (await repository.get_by_id(user.id)).email == "a@example.com"
+    assert (await repository.get_by_email("a@example.com")).id == user.id
+    assert await repository.get_by_id(user.id + 1) is None
+
+
+@pytest.mark.anyio
+async def test_sqlite_get_many_skips_unknown_ids(repository):
+    first = await repository.create({"email": "a@example.com", "hashed_password": "x"})
+    second = await repository.create({"email": "b@example.com", "hashed_password": "x"})
+    users = await repository.get_many([first.id, second.id, 999])
+    assert set(users) == {first.id, second.id}
+
+
+@pytest.mark.anyio
+async def test_sqlite_update(repository):
+    user = await repository.create({"email": "a@example.com", "hashed_password": "x"})
+    updated = await repository.update(user.id, {"full_name": "Alice"})
+    assert updated.full_name == "Alice"
+    assert await repository.update(999, {"full_name": "Nobody"}) is None
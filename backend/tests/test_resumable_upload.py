@@ -0,0 +1,199 @@
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.models.user import PlanType
+from app.services import storage_lifecycle
+from app.services.resumable_upload import ResumableUploadService
+from app.services.storage_lifecycle import StorageLifecycle
+from app.services.upload import UploadService
+
+CONTENT = bytes(range(256)) * 40
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def finalized(monkeypatch):
+    """Fichiers transmis à UploadService.finalize: (nom, contenu)"""
+    files = []
+
+    async def finalize(part_path, filename, max_size):
+        files.append((filename, part_path.read_bytes()))
+        return "stored.wav"
+
+    monkeypatch.setattr(UploadService, "finalize", finalize)
+    return files
+
+
+@pytest.fixture
+def uploads(tmp_settings, finalized, monkeypatch):
+    monkeypatch.setattr(ResumableUploadService, "_locks", {})
+    monkeypatch.setattr(ResumableUploadService, "_create_lock", None)
+    monkeypatch.setattr(StorageLifecycle, "_connection", None)
+    yield ResumableUploadService
+    if StorageLifecycle._connection is not None:
+        StorageLifecycle._connection.close()
+
+
+async def chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+async def broken_chunks(*parts: bytes):
+    """Connexion coupée après les premiers octets"""
+    for part in parts:
+        yield part
+    raise ConnectionResetError("client disconnected")
+
+
+async def create(uploads, owner=None, size=len(CONTENT), client="ip:1") -> str:
+    session = await uploads.create("song.wav", size, PlanType.FREE, owner, client)
+    assert session["offset"] == 0
+    return session["upload_id"]
+
+
+@pytest.mark.anyio
+async def test_chunks_are_appended_at_the_current_offset(uploads, finalized):
+    upload_id = await create(uploads)
+    assert await uploads.append(upload_id, 0, chunks(CONTENT[:4000]), None) == 4000
+    assert await uploads.append(upload_id, 4000, chunks(CONTENT[4000:6000], CONTENT[6000:]), None) == len(CONTENT)
+    assert (await uploads.status(upload_id, None))["offset"] == len(CONTENT)
+
+    assert await uploads.complete(upload_id, None) == "stored.wav"
+    assert finalized == [("song.wav", CONTENT)]
+    with pytest.raises(HTTPException) as excinfo:
+        await uploads.status(upload_id, None)
+    assert excinfo.value.status_code == 404
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("offset", [0, 1000, 5000])
+async def test_wrong_offset_is_rejected_with_current_offset(uploads, offset):
+    upload_id = await create(uploads)
+    await uploads.append(upload_id, 0, chunks(CONTENT[:2000]), None)
+    with pytest.raises(HTTPException) as excinfo:
+        await uploads.append(upload_id, offset, chunks(CONTENT[offset:offset + 100]), None)
+    assert excinfo.value.status_code == 409
+    assert excinfo.value.headers["Upload-Offset"] == "2000"
+    assert (await uploads.status(upload_id, None))["offset"] == 2000
+
+
+@pytest.mark.anyio
+async def test_interrupted_chunk_keeps_received_bytes(uploads, finalized):
+    upload_id = await create(uploads)
+    with pytest.raises(ConnectionResetError):
+        await uploads.append(upload_id, 0, broken_chunks(CONTENT[:1500], CONTENT[1500:3000]), None)
+    # Reprise à l'offset annoncé par HEAD
+    offset = (await uploads.status(upload_id, None))["offset"]
+    assert offset == 3000
+    await uploads.append(upload_id, offset, chunks(CONTENT[offset:]), None)
+    await uploads.complete(upload_id, None)
+    assert finalized == [("song.wav", CONTENT)]
+
+
+@pytest.mark.anyio
+async def test_chunk_beyond_declared_size_is_dropped(uploads):
+    upload_id = await create(uploads)
+    await uploads.append(upload_id, 0, chunks(CONTENT[:3000]), None)
+    with pytest.raises(HTTPException) as excinfo:
+        await uploads.append(upload_id, 3000, chunks(CONTENT[3000:8000], CONTENT[8000:] + b"extra"), None)
+    assert excinfo.value.status_code == 413
+    # Le bloc entier est annulé, y compris sa partie valide
+    assert (await uploads.status(upload_id, None))["offset"] == 3000
+
+
+@pytest.mark.anyio
+async def test_incomplete_upload_cannot_complete(uploads, finalized):
+    upload_id = await create(uploads)
+    await uploads.append(upload_id, 0, chunks(CONTENT[:100]), None)
+    with pytest.raises(HTTPException) as excinfo:
+        await uploads.complete(upload_id, None)
+    assert excinfo.value.status_code == 409
+    assert excinfo.value.headers["Upload-Offset"] == "100"
+    assert finalized == []
+
+
+@pytest.mark.anyio
+async def test_session_is_reserved_to_its_owner(uploads):
+    upload_id = await create(uploads, owner=1)
+    for owner in (None, 2):
+        with pytest.raises(HTTPException) as excinfo:
+            await uploads.append(upload_id, 0, chunks(CONTENT), owner)
+        assert excinfo.value.status_code == 404
+    assert await uploads.append(upload_id, 0, chunks(CONTENT), 1) == len(CONTENT)
+
+
+@pytest.mark.anyio
+async def test_expired_or_invalid_session_is_not_found(uploads, tmp_settings, monkeypatch):
+    upload_id = await create(uploads)
+    monkeypatch.setattr(time, "time", lambda: 10 ** 12)
+    for session in (upload_id, "../secret"):
+        with pytest.raises(HTTPException) as excinfo:
+            await uploads.status(session, None)
+        assert excinfo.value.status_code == 404
+    assert list(tmp_settings.UPLOAD_TMP_DIR.iterdir()) == []
+
+
+@pytest.mark.anyio
+async def test_size_is_checked_against_the_plan(uploads):
+    with pytest.raises(HTTPException) as excinfo:
+        await uploads.create("master.wav", uploads.max_size(PlanType.FREE) + 1, PlanType.FREE, None, "ip:1")
+    assert excinfo.value.status_code == 413
+    session = await uploads.create("master.wav", uploads.max_size(PlanType.FREE) + 1, PlanType.STUDIO, 1, "user:1")
+    assert session["offset"] == 0
+
+
+# === Limites ===
+
+@pytest.mark.anyio
+async def test_open_sessions_are_capped_per_client(uploads, tmp_settings, monkeypatch):
+    monkeypatch.setattr(tmp_settings, "RESUMABLE_MAX_SESSIONS", 2)
+    upload_id = await create(uploads, client="ip:1")
+    await create(uploads, client="ip:1")
+    with pytest.raises(HTTPException) as excinfo:
+        await create(uploads, client="ip:1")
+    assert excinfo.value.status_code == 429
+    # Les autres clients ne sont pas concernés, une session fermée libère une place
+    await create(uploads, client="ip:2")
+    await uploads.cancel(upload_id, None)
+    await create(uploads, client="ip:1")
+
+
+@pytest.mark.anyio
+async def test_declared_sizes_count_toward_the_quota(uploads, monkeypatch):
+    monkeypatch.setitem(storage_lifecycle.PLAN_STORAGE_QUOTAS, PlanType.FREE, 10 * MB)
+    await create(uploads, owner=1, size=6 * MB, client="user:1")
+    with pytest.raises(HTTPException) as excinfo:
+        await create(uploads, owner=1, size=6 * MB, client="user:1")
+    assert excinfo.value.status_code == 413
+    await create(uploads, owner=2, size=6 * MB, client="user:2")
+
+
+@pytest.mark.anyio
+async def test_anonymous_sessions_share_the_anonymous_quota(uploads, tmp_settings, monkeypatch):
+    monkeypatch.setattr(tmp_settings, "STORAGE_ANONYMOUS_QUOTA", 10 * MB)
+    await create(uploads, size=6 * MB, client="ip:1")
+    with pytest.raises(HTTPException) as excinfo:
+        await create(uploads, size=6 * MB, client="ip:2")
+    assert excinfo.value.status_code == 413
+
+
+@pytest.mark.anyio
+async def test_staged_bytes_count_toward_the_high_water_mark(uploads, blob_store):
+    upload_id = await create(uploads)
+    await uploads.append(upload_id, 0, chunks(CONTENT[:3000]), None)
+    stats = StorageLifecycle.stats()
+    assert stats["staged_bytes"] >= 3000
+    assert stats["total_bytes"] >= stats["staged_bytes"]
+
+
+@pytest.mark.anyio
+async def test_purge_expired_removes_old_sessions(uploads, tmp_settings, monkeypatch):
+    upload_id = await create(uploads)
+    assert len(await uploads.purge_expired()) == 1
+    monkeypatch.setattr(tmp_settings, "RESUMABLE_UPLOAD_TTL", -1)
+    assert await uploads.purge_expired() == []
+    assert list(tmp_settings.UPLOAD_TMP_DIR.iterdir()) == []
+    assert upload_id not in uploads._locks
@@ -0,0 +1,331 @@
+import hashlib
+import hmac
+import re
+import threading
+import time
+from typing import Dict
+from urllib.parse import parse_qsl, quote, unquote, urlsplit
+
+import httpx
+import pytest
+
+from app.core import storage as storage_module
+from app.core.storage import (
+    LocalStorageBackend,
+    MemoryStorageBackend,
+    S3StorageBackend,
+    StorageBackend,
+    StorageError,
+    ensure_local,
+    get_storage,
+    publish,
+    stored_size,
+)
+
+ACCESS_KEY = "AKIDEXAMPLE"
+SECRET_KEY = "wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY"
+REGION = "eu-west-3"
+BUCKET = "audio"
+
+
+# === Serveur S3 simulé (vérifie les signatures comme le ferait S3) ===
+
+def _uri_encode(value: str, safe: str = "") -> str:
+    return quote(value, safe="-_.~" + safe)
+
+
+def _signing_key(secret: str, date: str) -> bytes:
+    key = f"AWS4{secret}".encode()
+    for part in (date, REGION, "s3", "aws4_request"):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    return key
+
+
+def _expected_signature(secret: str, method: str, path: str, query: Dict[str, str],
+                        headers: Dict[str, str], signed_headers: str, payload_hash: str, amz_date: str) -> str:
+    canonical_request = "\n".join([
+        method,
+        _uri_encode(unquote(path), safe="/"),
+        "&".join(f"{_uri_encode(k)}={_uri_encode(v)}" for k, v in sorted(query.items())),
+        "".join(f"{name}:{headers[name].strip()}\n" for name in signed_headers.split(";")),
+        signed_headers,
+        payload_hash,
+    ])
+    scope = f"{amz_date[:8]}/{REGION}/s3/aws4_request"
+    string_to_sign = "\n".join([
+        "AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical_request.encode()).hexdigest()
+    ])
+    return hmac.new(_signing_key(secret, amz_date[:8]), string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+
+class FakeS3:
+    """Bucket en mémoire derrière un httpx.MockTransport"""
+
+    def __init__(self, secret: str = SECRET_KEY):
+        self.secret = secret
+        self.objects: Dict[str, bytes] = {}
+        self.requests = []
+
+    def verify_headers(self, request: httpx.Request) -> bool:
+        match = re.fullmatch(
+            r"AWS4-HMAC-SHA256 Credential=([^/]+)/(\d{8})/([^/]+)/s3/aws4_request, "
+            r"SignedHeaders=([^,]+), Signature=([0-9a-f]{64})",
+            request.headers.get("authorization", "")
+        )
+        if match is None or match.group(1) != ACCESS_KEY or match.group(3) != REGION:
+            return False
+        signed_headers, signature = match.group(4), match.group(5)
+        payload_hash = request.headers["x-amz-content-sha256"]
+        if payload_hash != "UNSIGNED-PAYLOAD" and payload_hash != hashlib.sha256(request.content).hexdigest():
+            return False
+        headers = {name.lower(): value for name, value in request.headers.items()}
+        expected = _expected_signature(
+            self.secret, request.method, request.url.raw_path.decode().split("?")[0], {},
+            headers, signed_headers, payload_hash, headers["x-amz-date"]
+        )
+        return hmac.compare_digest(signature, expected)
+
+    def verify_presigned(self, url: str) -> bool:
+        parts = urlsplit(url)
+        query = dict(parse_qsl(parts.query, keep_blank_values=True))
+        signature = query.pop("X-Amz-Signature", "")
+        expected = _expected_signature(
+            self.secret, "GET", parts.path, query, {"host": parts.netloc},
+            query["X-Amz-SignedHeaders"], "UNSIGNED-PAYLOAD", query["X-Amz-Date"]
+        )
+        return hmac.compare_digest(signature, expected)
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        self.requests.append(request)
+        if not self.verify_headers(request):
+            return httpx.Response(403, text="SignatureDoesNotMatch")
+        prefix = f"/{BUCKET}/"
+        key = unquote(request.url.path)[len(prefix):]
+        if request.method == "PUT":
+            self.objects[key] = request.content
+            return httpx.Response(200)
+        if request.method == "DELETE":
+            self.objects.pop(key, None)
+            return httpx.Response(204)
+        data = self.objects.get(key)
+        if data is None:
+            return httpx.Response(404, text="NoSuchKey")
+        if request.method == "HEAD":
+            return httpx.Response(200, headers={"content-length": str(len(data))})
+        range_header = request.headers.get("range")
+        if range_header is None:
+            return httpx.Response(200, content=data)
+        start, _, end = range_header[len("bytes="):].partition("-")
+        start = int(start)
+        if start >= len(data):
+            return httpx.Response(416, text="InvalidRange")
+        stop = len(data) if not end else min(int(end) + 1, len(data))
+        return httpx.Response(206, content=data[start:stop])
+
+
+def make_s3(fake: FakeS3) -> S3StorageBackend:
+    backend = S3StorageBackend("https://s3.test:9000", BUCKET, REGION, ACCESS_KEY, SECRET_KEY)
+    backend._client.close()
+    backend._client = httpx.Client(transport=httpx.MockTransport(fake.handler))
+    return backend
+
+
+@pytest.fixture(params=["local", "memory", "s3"])
+def backend(request, tmp_path):
+    if request.param == "local":
+        yield LocalStorageBackend(tmp_path / "bucket")
+    elif request.param == "memory":
+        yield MemoryStorageBackend()
+    else:
+        backend = make_s3(FakeS3())
+        yield backend
+        backend.close()
+
+
+# === Interface commune ===
+
+def test_backend_requires_all_operations():
+    class Partial(StorageBackend):
+        def put_bytes(self, key, data):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_roundtrip(backend, tmp_path):
+    source = tmp_path / "source.wav"
+    source.write_bytes(b"RIFF" + bytes(range(256)) * 4)
+    backend.put_file("uploads/blobs/ab/abc.wav", source)
+    backend.put_bytes("processed/report.json", b"{}")
+
+    assert backend.get_bytes("uploads/blobs/ab/abc.wav") == source.read_bytes()
+    assert backend.size("uploads/blobs/ab/abc.wav") == source.stat().st_size
+    assert backend.get_bytes("processed/report.json") == b"{}"
+
+    backend.delete("processed/report.json")
+    backend.delete("processed/report.json")
+    assert backend.get_bytes("processed/report.json") is None
+    assert backend.size("processed/report.json") is None
+
+
+@pytest.mark.parametrize("start, end, expected", [
+    (0, None, b"0123456789"),
+    (0, 0, b"0"),
+    (3, 6, b"3456"),
+    (7, None, b"789"),
+    (8, 100, b"89"),
+    (9, 9, b"9"),
+    (10, None, b""),
+    (25, 30, b""),
+])
+def test_iter_range(backend, start, end, expected):
+    backend.put_bytes("processed/digits.bin", b"0123456789")
+    assert b"".join(backend.iter_range("processed/digits.bin", start, end)) == expected
+
+
+def test_iter_range_missing_object(backend):
+    with pytest.raises(StorageError):
+        b"".join(backend.iter_range("processed/missing.bin"))
+
+
+def test_download_to(backend, tmp_path):
+    backend.put_bytes("processed/out.mp3", b"ID3" * 1000)
+    target = tmp_path / "local" / "out.mp3"
+    assert backend.download_to("processed/out.mp3", target)
+    assert target.read_bytes() == b"ID3" * 1000
+    assert not backend.download_to("processed/missing.mp3", tmp_path / "local" / "missing.mp3")
+    assert not (tmp_path / "local" / "missing.mp3").exists()
+    assert list(target.parent.glob(".*.part")) == []
+
+
+def test_local_rejects_keys_outside_root(tmp_path):
+    backend = LocalStorageBackend(tmp_path / "bucket")
+    with pytest.raises(StorageError):
+        backend.put_bytes("../escape.txt", b"x")
+
+
+# === Signature V4 ===
+
+def test_s3_requests_are_signed():
+    fake = FakeS3()
+    backend = make_s3(fake)
+    backend.put_bytes("uploads/blobs/a b+c.wav", b"data")
+    assert backend.get_bytes("uploads/blobs/a b+c.wav") == b"data"
+    assert [r.method for r in fake.requests] == ["PUT", "GET"]
+    assert fake.requests[0].url.raw_path == b"/audio/uploads/blobs/a%20b%2Bc.wav"
+
+
+def test_s3_streamed_upload_is_unsigned_payload(tmp_path):
+    fake = FakeS3()
+    backend = make_s3(fake)
+    source = tmp_path / "big.wav"
+    source.write_bytes(b"x" * (storage_module._CHUNK_SIZE * 2 + 17))
+    backend.put_file("uploads/big.wav", source)
+    request = fake.requests[0]
+    assert request.headers["x-amz-content-sha256"] == "UNSIGNED-PAYLOAD"
+    assert request.headers["content-length"] == str(source.stat().st_size)
+    assert fake.objects["uploads/big.wav"] == source.read_bytes()
+
+
+def test_s3_wrong_secret_is_rejected():
+    backend = make_s3(FakeS3(secret="another-secret"))
+    with pytest.raises(StorageError, match="403"):
+        backend.put_bytes("uploads/a.wav", b"data")
+
+
+def test_presigned_url(monkeypatch):
+    monkeypatch.setattr(storage_module.settings, "S3_PRESIGN_TTL", 900)
+    fake = FakeS3()
+    backend = make_s3(fake)
+    url = backend.presigned_url("processed/mix final.mp3", filename="mix final.mp3")
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+
+    assert parts.path == "/audio/processed/mix%20final.mp3"
+    assert query["X-Amz-Expires"] == "900"
+    assert query["X-Amz-Credential"].startswith(f"{ACCESS_KEY}/")
+    assert query["response-content-disposition"] == 'attachment; filename="mix final.mp3"'
+    assert fake.verify_presigned(url)
+    assert not FakeS3(secret="another-secret").verify_presigned(url)
+
+    tampered = url.replace("X-Amz-Expires=900", "X-Amz-Expires=999999")
+    assert not fake.verify_presigned(tampered)
+    assert "X-Amz-Expires=60" in backend.presigned_url("processed/a.mp3", expires_in=60)
+
+
+def test_memory_and_local_have_no_presigned_url(tmp_path):
+    assert MemoryStorageBackend().presigned_url("processed/a.mp3") is None
+    assert LocalStorageBackend(tmp_path).presigned_url("processed/a.mp3") is None
+
+
+# === Stockage partagé ===
+
+@pytest.fixture
+def shared_storage(tmp_settings, monkeypatch):
+    storage = MemoryStorageBackend()
+    monkeypatch.setattr(storage_module, "_storage", storage)
+    return storage
+
+
+def test_publish_and_ensure_local(shared_storage, tmp_settings):
+    path = tmp_settings.PROCESSED_DIR / "render.wav"
+    path.write_bytes(b"render")
+    publish(path)
+    assert shared_storage.get_bytes("processed/render.wav") == b"render"
+
+    # Autre réplique: le fichier n'existe que dans le stockage
+    path.unlink()
+    assert stored_size(path) == len(b"render")
+    assert ensure_local(path)
+    assert path.read_bytes() == b"render"
+
+
+def test_ensure_local_missing_everywhere(shared_storage, tmp_settings):
+    path = tmp_settings.PROCESSED_DIR / "missing.wav"
+    assert not ensure_local(path)
+    assert stored_size(path) is None
+    assert not path.exists()
+
+
+def test_in_place_storage_copies_nothing(tmp_settings, monkeypatch):
+    storage = LocalStorageBackend(tmp_settings.BASE_DIR)
+    monkeypatch.setattr(storage_module, "_storage", storage)
+    assert storage.in_place
+
+    path = tmp_settings.PROCESSED_DIR / "render.wav"
+    path.write_bytes(b"render")
+    publish(path)
+    assert storage.get_bytes("processed/render.wav") == b"render"
+    path.unlink()
+    assert not ensure_local(path)
+
+
+def test_get_storage_creates_a_single_instance(monkeypatch):
+    monkeypatch.setattr(storage_module, "_storage", None)
+    monkeypatch.setattr(storage_module.settings, "STORAGE_BACKEND", "memory")
+    created = []
+    original_init = MemoryStorageBackend.__init__
+
+    def slow_init(self):
+        time.sleep(0.05)
+        original_init(self)
+        created.append(self)
+
+    monkeypatch.setattr(MemoryStorageBackend, "__init__", slow_init)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(get_storage())
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert all(result is created[0] for result in results)
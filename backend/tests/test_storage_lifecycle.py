@@ -0,0 +1,251 @@
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.api import endpoints
+from app.models.user import PlanType
+from app.services import storage_lifecycle
+from app.services.storage_lifecycle import KIND_RENDER, KIND_TRANSCODE, KIND_UPLOAD, StorageLifecycle
+
+MB = 1024 * 1024
+DAY = 24 * 3600
+
+
+@pytest.fixture
+def lifecycle(blob_store, tmp_settings, monkeypatch):
+    monkeypatch.setattr(StorageLifecycle, "_connection", None)
+    monkeypatch.setattr(StorageLifecycle, "_pending_touches", {})
+    monkeypatch.setitem(storage_lifecycle.PLAN_STORAGE_QUOTAS, PlanType.FREE, 10 * MB)
+    yield StorageLifecycle
+    if StorageLifecycle._connection is not None:
+        StorageLifecycle._connection.close()
+
+
+def set_accessed(name: str, accessed_at: float):
+    StorageLifecycle._db().execute("UPDATE files SET accessed_at = ? WHERE name = ?", (accessed_at, name))
+    StorageLifecycle._db().commit()
+
+
+def add_render(tmp_settings, name: str, size: int, owner=1, accessed_at=None) -> str:
+    (tmp_settings.PROCESSED_DIR / name).write_bytes(b"r" * size)
+    StorageLifecycle.track(KIND_RENDER, name, size, owner)
+    if accessed_at is not None:
+        set_accessed(name, accessed_at)
+    return name
+
+
+def add_upload(store_upload, size: int, owner=1, accessed_at=None, fill: bytes = b"u") -> str:
+    name = store_upload(fill * size)
+    StorageLifecycle.track(KIND_UPLOAD, name, size, owner)
+    if accessed_at is not None:
+        set_accessed(name, accessed_at)
+    return name
+
+
+def tracked(kind: str):
+    return {row[0] for row in StorageLifecycle._db().execute("SELECT name FROM files WHERE kind = ?", (kind,))}
+
+
+# === Quotas ===
+
+def test_admit_within_quota(lifecycle, tmp_settings):
+    add_render(tmp_settings, "old.wav", 2 * MB)
+    assert lifecycle.admit(KIND_RENDER, "new.wav", 3 * MB, 1, PlanType.FREE) == []
+    assert tracked(KIND_RENDER) == {"old.wav", "new.wav"}
+
+
+def test_admit_evicts_least_recently_used_renders_first(lifecycle, tmp_settings, store_upload):
+    now = time.time()
+    upload = add_upload(store_upload, 2 * MB, accessed_at=now - 60 * DAY)
+    add_render(tmp_settings, "older.wav", 3 * MB, accessed_at=now - 2 * DAY)
+    add_render(tmp_settings, "recent.wav", 3 * MB, accessed_at=now - 1)
+
+    assert lifecycle.admit(KIND_RENDER, "new.wav", 4 * MB, 1, PlanType.FREE) == []
+    assert tracked(KIND_RENDER) == {"recent.wav", "new.wav"}
+    assert not (tmp_settings.PROCESSED_DIR / "older.wav").exists()
+    assert tracked(KIND_UPLOAD) == {upload}
+
+
+def test_admit_evicts_idle_uploads_and_reports_them(lifecycle, tmp_settings, store_upload):
+    now = time.time()
+    idle = add_upload(store_upload, 4 * MB, accessed_at=now - 60 * DAY, fill=b"a")
+    active = add_upload(store_upload, 4 * MB, accessed_at=now - 1 * DAY, fill=b"b")
+    add_render(tmp_settings, "render.wav", 1 * MB)
+
+    evicted = lifecycle.admit(KIND_UPLOAD, "new.wav", 4 * MB, 1, PlanType.FREE)
+    assert evicted == [idle]
+    assert tracked(KIND_UPLOAD) == {active, "new.wav"}
+    assert tracked(KIND_RENDER) == set()
+    assert lifecycle.usage(1) == 8 * MB
+
+
+def test_admit_rejects_when_nothing_can_be_freed(lifecycle, tmp_settings, store_upload):
+    active = add_upload(store_upload, 8 * MB, accessed_at=time.time() - DAY)
+    (tmp_settings.PROCESSED_DIR / "new.wav").write_bytes(b"r")
+    with pytest.raises(HTTPException) as excinfo:
+        lifecycle.admit(KIND_RENDER, "new.wav", 4 * MB, 1, PlanType.FREE)
+    assert excinfo.value.status_code == 413
+    assert tracked(KIND_UPLOAD) == {active}
+    assert not (tmp_settings.PROCESSED_DIR / "new.wav").exists()
+
+
+def test_concurrent_admissions_respect_quota(lifecycle, store_upload):
+    names = [store_upload(bytes([i]) * 10) for i in range(6)]
+    admitted = []
+
+    def admit(name):
+        try:
+            lifecycle.admit(KIND_UPLOAD, name, 4 * MB, 1, PlanType.FREE)
+            admitted.append(name)
+        except HTTPException:
+            pass
+
+    threads = [threading.Thread(target=admit, args=(name,)) for name in names]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Uploads récents, rien à évincer: seuls deux tiennent dans 10 MB
+    assert len(admitted) == 2
+    assert tracked(KIND_UPLOAD) == set(admitted)
+    assert lifecycle.usage(1) == 8 * MB
+
+
+def test_admit_removes_file_when_tracking_fails(lifecycle, tmp_settings, monkeypatch):
+    path = tmp_settings.PROCESSED_DIR / "new.wav"
+    path.write_bytes(b"r")
+
+    def failing_insert(kind, name, size, owner):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(StorageLifecycle, "_insert", failing_insert)
+    with pytest.raises(OSError):
+        lifecycle.admit(KIND_RENDER, "new.wav", 1, 1, PlanType.FREE)
+    assert not path.exists()
+    assert tracked(KIND_RENDER) == set()
+
+
+def test_anonymous_files_share_one_quota(lifecycle, tmp_settings, store_upload, monkeypatch):
+    monkeypatch.setattr(tmp_settings, "STORAGE_ANONYMOUS_QUOTA", 10 * MB)
+    first = store_upload(b"a" * 6 * MB)
+    second = store_upload(b"b" * 6 * MB)
+    assert lifecycle.admit(KIND_UPLOAD, first, 6 * MB, None, PlanType.FREE) == []
+    with pytest.raises(HTTPException) as excinfo:
+        lifecycle.admit(KIND_UPLOAD, second, 6 * MB, None, PlanType.FREE)
+    assert excinfo.value.status_code == 413
+    assert tracked(KIND_UPLOAD) == {first}
+    # Le quota d'un utilisateur connecté est distinct
+    third = store_upload(b"c" * 6 * MB)
+    assert lifecycle.admit(KIND_UPLOAD, third, 6 * MB, 1, PlanType.FREE) == []
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("quota, ratio", [(10 * MB, 0.2), (0, None)])
+async def test_storage_usage_ratio(lifecycle, tmp_settings, monkeypatch, quota, ratio):
+    from app.models.user import User
+
+    async def current_user(request):
+        return User(id=1, email="a@example.com", hashed_password="x", plan=PlanType.FREE)
+
+    monkeypatch.setattr(endpoints, "get_optional_user", current_user)
+    monkeypatch.setitem(storage_lifecycle.PLAN_STORAGE_QUOTAS, PlanType.FREE, quota)
+    add_render(tmp_settings, "render.wav", 2 * MB)
+    usage = await endpoints.get_storage_usage(None)
+    assert usage == {"used_bytes": 2 * MB, "quota_bytes": quota, "used_ratio": ratio}
+
+
+def test_owned_keeps_order_and_owner(lifecycle, store_upload):
+    names = [add_upload(store_upload, 10, owner=owner, fill=bytes([owner])) for owner in (1, 2, 1)]
+    assert lifecycle.owned(KIND_UPLOAD, names, 1) == [names[0], names[2]]
+    assert lifecycle.owned(KIND_UPLOAD, [], 1) == []
+
+
+def test_duplicate_names_only_the_callers_upload(lifecycle, blob_store, store_upload):
+    other = add_upload(store_upload, 10, owner=2)
+    mine = add_upload(store_upload, 10, owner=1)
+    new = add_upload(store_upload, 10, owner=1)
+    blob_name = blob_store.resolve(new).name
+    assert endpoints._own_upload(blob_name, 1, new) == mine
+    # Le nom de l'upload d'un autre utilisateur n'est jamais renvoyé
+    assert endpoints._own_upload(blob_name, 3, new) is None
+    assert endpoints._own_upload(blob_name, None, new) is None
+    assert endpoints._own_upload(blob_name, 2, other) is None
+
+
+# === Balayage ===
+
+def test_sweep_never_evicts_uploads(lifecycle, blob_store, tmp_settings, store_upload, monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(tmp_settings, "STORAGE_MAX_BYTES", 10 * MB)
+    upload = add_upload(store_upload, 9 * MB, accessed_at=now - 365 * DAY)
+    add_render(tmp_settings, "render.wav", 1 * MB, accessed_at=now - 60)
+
+    lifecycle.sweep()
+    assert tracked(KIND_UPLOAD) == {upload}
+    assert tracked(KIND_RENDER) == set()
+    assert blob_store.resolve(upload).exists()
+
+
+def test_sweep_expires_idle_anonymous_uploads(lifecycle, blob_store, tmp_settings, store_upload):
+    old = time.time() - tmp_settings.STORAGE_ANONYMOUS_UPLOAD_TTL - 1
+    anonymous = add_upload(store_upload, 10, owner=None, accessed_at=old, fill=b"a")
+    recent = add_upload(store_upload, 10, owner=None, fill=b"b")
+    owned = add_upload(store_upload, 10, owner=1, accessed_at=old, fill=b"c")
+
+    assert lifecycle.sweep() == 1
+    assert tracked(KIND_UPLOAD) == {recent, owned}
+    assert blob_store.resolve(anonymous) is None
+
+
+def test_sweep_evicts_transcodes_before_renders(lifecycle, tmp_settings, monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(tmp_settings, "STORAGE_MAX_BYTES", 10 * MB)
+    add_render(tmp_settings, "render.wav", 5 * MB, accessed_at=now - 120)
+    (tmp_settings.TRANSCODE_CACHE_DIR / "a.flac").write_bytes(b"t" * 5 * MB)
+    lifecycle.track(KIND_TRANSCODE, "a.flac", 5 * MB)
+    set_accessed("a.flac", now - 1)
+
+    assert lifecycle.sweep() == 1
+    assert tracked(KIND_TRANSCODE) == set()
+    assert tracked(KIND_RENDER) == {"render.wav"}
+
+
+def test_sweep_removes_expired_renders(lifecycle, tmp_settings):
+    now = time.time()
+    add_render(tmp_settings, "expired.wav", MB, accessed_at=now - tmp_settings.STORAGE_RENDER_TTL - 1)
+    add_render(tmp_settings, "fresh.wav", MB)
+    assert lifecycle.sweep() == 1
+    assert tracked(KIND_RENDER) == {"fresh.wav"}
+
+
+def test_touch_keeps_render_alive(lifecycle, tmp_settings):
+    add_render(tmp_settings, "render.wav", MB, accessed_at=time.time() - tmp_settings.STORAGE_RENDER_TTL - 1)
+    lifecycle.touch(KIND_RENDER, "render.wav")
+    assert lifecycle.sweep() == 0
+    assert tracked(KIND_RENDER) == {"render.wav"}
+
+
+def test_touches_during_flush_are_not_lost(lifecycle, tmp_settings):
+    names = [add_render(tmp_settings, f"r{i}.wav", 1, accessed_at=0) for i in range(200)]
+    stop = threading.Event()
+
+    def toucher():
+        while not stop.is_set():
+            for name in names:
+                lifecycle.touch(KIND_RENDER, name)
+
+    thread = threading.Thread(target=toucher)
+    thread.start()
+    try:
+        for _ in range(20):
+            with lifecycle._lock:
+                lifecycle._flush_touches()
+    finally:
+        stop.set()
+        thread.join()
+    with lifecycle._lock:
+        lifecycle._flush_touches()
+    rows = lifecycle._db().execute("SELECT COUNT(*) FROM files WHERE accessed_at = 0").fetchone()
+    assert rows[0] == 0
@@ -0,0 +1,73 @@
+import time
+from collections import OrderedDict
+
+import pytest
+
+from app.models.user import User
+from app.services.user_cache import UserCache
+
+
+@pytest.fixture
+def cache(tmp_settings, monkeypatch):
+    monkeypatch.setattr(UserCache, "_entries", OrderedDict())
+    monkeypatch.setattr(UserCache, "_invalidated_at", {})
+    monkeypatch.setattr(tmp_settings, "USER_CACHE_TTL", 60)
+    monkeypatch.setattr(tmp_settings, "USER_CACHE_SHARED_INVALIDATION", True)
+    return UserCache
+
+
+def make_user(user_id: int = 1) -> User:
+    return User(id=user_id, email=f"user{user_id}@example.com", hashed_password="x")
+
+
+def test_get_returns_cached_user(cache):
+    user = make_user()
+    cache.put(user, time.time())
+    assert cache.get(1) is user
+
+
+def test_invalidate_drops_entry(cache):
+    cache.put(make_user(), time.time())
+    cache.invalidate(1)
+    assert cache.get(1) is None
+
+
+def test_read_started_before_invalidation_is_not_cached(cache):
+    fetched_at = time.time()
+    cache.invalidate(1)
+    cache.put(make_user(), fetched_at)
+    assert cache.get(1) is None
+
+
+def test_expired_entry_is_dropped(cache):
+    cache.put(make_user(), time.time() - 61)
+    assert cache.get(1) is None
+
+
+def test_marker_invalidates_other_workers(cache, tmp_settings):
+    cache.put(make_user(), time.time() - 1)
+    # Invalidation faite par un autre worker: seul le fichier marqueur existe
+    (tmp_settings.USER_CACHE_DIR / "1").touch()
+    assert cache.get(1) is None
+
+
+def test_old_invalidations_are_pruned(cache, monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now - 120)
+    cache.invalidate(1)
+    cache.invalidate(2)
+    monkeypatch.setattr(time, "time", lambda: now)
+    cache.invalidate(3)
+    assert list(cache._invalidated_at) == [3]
+
+
+def test_reinvalidation_keeps_chronological_order(cache, monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now - 120)
+    cache.invalidate(1)
+    cache.invalidate(2)
+    monkeypatch.setattr(time, "time", lambda: now - 30)
+    cache.invalidate(1)
+    monkeypatch.setattr(time, "time", lambda: now)
+    cache.invalidate(3)
+    assert list(cache._invalidated_at) == [1, 3]
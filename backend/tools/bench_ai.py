@@ -0,0 +1,129 @@
+"""
+Benchmark de l'endpoint d'analyse IA (débit, latences p50/p90/p99).
+
+Hors ligne, avec le faux serveur Gemini (depuis backend/):
+    python -m tools.fake_gemini --port 8090 &
+    GEMINI_API_KEY=fake GEMINI_BASE_URL=http://127.0.0.1:8090 AI_BUDGET_SCALE=1000 uvicorn main:app --port 8000 &
+    python -m tools.bench_ai --requests 200 --concurrency 20
+
+Le budget du client s'applique (plan gratuit, par adresse IP, pour les requêtes
+anonymes: tout le banc partage donc un seul budget), ainsi que le budget global:
+AI_BUDGET_SCALE les relève tous pour mesurer le chemin IA lui-même.
+
+Options utiles:
+    --stream          mesure /api/analyze-ai/stream (temps jusqu'au premier fragment inclus)
+    --unique-ratio R  proportion de requêtes aux métriques uniques (0 = tout en cache)
+    --token T         token JWT (budget du plan de l'utilisateur au lieu du plan gratuit)
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+from typing import List, Optional
+
+import httpx
+
+# Métriques représentatives d'un morceau (voir FeatureExtractor.analyze)
+BASE_FEATURES = {
+    "bpm": 124.0, "key": "A", "tempo_stability": 0.94,
+    "rms_level": 0.18, "rms_level_db": -14.9, "peak_level_db": -0.3,
+    "crest_factor": 5.4, "crest_factor_db": 14.6, "dynamic_range_db": 14.6,
+    "spectral_centroid": 2450.0, "spectral_bandwidth": 2710.0, "spectral_rolloff": 5120.0,
+    "spectral_contrast": 21.3, "spectral_flatness": 0.012, "zero_crossing_rate": 0.061,
+    "bass_energy_pct": 31.2, "low_mid_energy_pct": 14.1, "mid_energy_pct": 27.5,
+    "high_mid_energy_pct": 12.9, "treble_energy_pct": 14.3,
+    "harmonic_ratio": 0.62, "percussive_ratio": 0.38,
+    "is_stereo": True, "stereo_width": 0.71,
+}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def make_features(unique: bool) -> dict:
+    features = dict(BASE_FEATURES)
+    if unique:
+        # Un BPM différent suffit à changer la clé du cache des rapports
+        features["bpm"] = round(random.uniform(60, 200), 1)
+    return features
+
+
+async def one_request(client: httpx.AsyncClient, url: str, stream: bool, unique: bool, headers: dict):
+    """Retourne (statut, latence totale, temps jusqu'au premier fragment ou None)"""
+    body = {"features": make_features(unique)}
+    start = time.perf_counter()
+    first_byte: Optional[float] = None
+    try:
+        if stream:
+            async with client.stream("POST", url, json=body, headers=headers) as response:
+                async for line in response.aiter_lines():
+                    if first_byte is None and line.startswith("data:"):
+                        first_byte = time.perf_counter() - start
+                status = response.status_code
+        else:
+            response = await client.post(url, json=body, headers=headers)
+            status = response.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    return status, time.perf_counter() - start, first_byte
+
+
+async def run(args):
+    path = "/api/analyze-ai/stream" if args.stream else "/api/analyze-ai"
+    url = args.base_url.rstrip("/") + path
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    semaphore = asyncio.Semaphore(args.concurrency)
+    results = []
+
+    async with httpx.AsyncClient(timeout=args.timeout) as client:
+        async def worker(_):
+            async with semaphore:
+                unique = random.random() < args.unique_ratio
+                results.append(await one_request(client, url, args.stream, unique, headers))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+    statuses = Counter(status for status, _, _ in results)
+    latencies = [latency for status, latency, _ in results if status == 200]
+    first_bytes = [fb for status, _, fb in results if status == 200 and fb is not None]
+
+    print(f"Endpoint:     {url}")
+    print(f"Requêtes:     {args.requests} (concurrence {args.concurrency}, uniques {args.unique_ratio:.0%})")
+    print(f"Durée:        {elapsed:.2f} s")
+    print(f"Débit:        {len(latencies) / elapsed:.2f} req/s réussies")
+    print(f"Statuts:      {dict(statuses)}")
+    if latencies:
+        print(
+            f"Latence (s):  p50={percentile(latencies, 50):.3f} "
+            f"p90={percentile(latencies, 90):.3f} p99={percentile(latencies, 99):.3f} "
+            f"max={max(latencies):.3f}"
+        )
+    if first_bytes:
+        print(
+            f"1er fragment: p50={percentile(first_bytes, 50):.3f} "
+            f"p90={percentile(first_bytes, 90):.3f} p99={percentile(first_bytes, 99):.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de /api/analyze-ai")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--unique-ratio", type=float, default=1.0)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--token", default=None)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
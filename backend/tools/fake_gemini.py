@@ -0,0 +1,182 @@
+"""
+Faux serveur Gemini (API REST v1beta) pour les tests de charge hors ligne.
+
+Implémente la liste des modèles, generateContent et streamGenerateContent
+(SSE) avec une latence, une cadence de streaming et des taux d'erreur
+configurables.
+
+Usage (depuis backend/):
+    python -m tools.fake_gemini --port 8090 --latency-median-ms 1500 --rate-limit-rate 0.05
+
+Puis démarrer l'API en la faisant pointer vers ce serveur:
+    GEMINI_API_KEY=fake GEMINI_BASE_URL=http://127.0.0.1:8090 uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+from typing import List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class FakeGeminiConfig:
+    """Paramètres du faux serveur (modifiables par variables d'environnement ou CLI)"""
+
+    def __init__(self):
+        # Latence avant la réponse (ou le premier fragment): loi log-normale
+        self.latency_median_ms: float = float(os.getenv("FAKE_GEMINI_LATENCY_MEDIAN_MS", "1500"))
+        self.latency_sigma: float = float(os.getenv("FAKE_GEMINI_LATENCY_SIGMA", "0.5"))
+        # Streaming: nombre de fragments et intervalle entre deux fragments
+        self.stream_chunks: int = int(os.getenv("FAKE_GEMINI_STREAM_CHUNKS", "40"))
+        self.chunk_interval_ms: float = float(os.getenv("FAKE_GEMINI_CHUNK_INTERVAL_MS", "50"))
+        # Proportion de réponses 500 et 429
+        self.error_rate: float = float(os.getenv("FAKE_GEMINI_ERROR_RATE", "0"))
+        self.rate_limit_rate: float = float(os.getenv("FAKE_GEMINI_RATE_LIMIT_RATE", "0"))
+        self.models: List[str] = os.getenv(
+            "FAKE_GEMINI_MODELS",
+            "gemini-2.5-flash,gemini-2.0-flash-exp,gemini-1.5-pro"
+        ).split(",")
+
+    def latency(self) -> float:
+        """Latence tirée au hasard (secondes)"""
+        if self.latency_median_ms <= 0:
+            return 0.0
+        return random.lognormvariate(0, self.latency_sigma) * self.latency_median_ms / 1000
+
+
+config = FakeGeminiConfig()
+app = FastAPI(title="Fake Gemini API")
+
+# Rapport renvoyé par le faux modèle (~400 mots, même structure que le vrai)
+REPORT_TEXT = "# Vue d'ensemble\n" + (
+    "Le morceau présente un **équilibre fréquentiel** correct avec une dynamique maîtrisée. "
+) * 8 + "\n\n## Points forts\n" + (
+    "La **stabilité du tempo** est excellente et le bas du spectre reste défini. "
+) * 8 + "\n\n## Points à améliorer\n### Niveaux\n" + (
+    "Le **niveau RMS** reste en dessous des standards de streaming modernes. "
+) * 8 + "\n\n## Recommandations techniques\n" + (
+    "- Ajouter 2 dB de gain avant le limiteur et surveiller le **Crest Factor**.\n"
+) * 8
+
+
+def _error_response():
+    """Erreur simulée selon les taux configurés, ou None"""
+    draw = random.random()
+    if draw < config.rate_limit_rate:
+        return JSONResponse(
+            status_code=429,
+            content={"error": {"code": 429, "message": "Resource has been exhausted", "status": "RESOURCE_EXHAUSTED"}}
+        )
+    if draw < config.rate_limit_rate + config.error_rate:
+        return JSONResponse(
+            status_code=500,
+            content={"error": {"code": 500, "message": "Internal error", "status": "INTERNAL"}}
+        )
+    return None
+
+
+def _candidate(text: str, finished: bool) -> dict:
+    candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+    if finished:
+        candidate["finishReason"] = "STOP"
+    return candidate
+
+
+@app.get("/{version}/models")
+async def list_models(version: str):
+    return {
+        "models": [
+            {
+                "name": f"models/{name}",
+                "displayName": name,
+                "supportedGenerationMethods": ["generateContent", "countTokens"],
+            }
+            for name in config.models
+        ]
+    }
+
+
+@app.post("/{version}/models/{model_action}")
+async def generate(version: str, model_action: str, request: Request):
+    model, _, action = model_action.partition(":")
+    if model not in config.models:
+        return JSONResponse(
+            status_code=404,
+            content={"error": {"code": 404, "message": f"models/{model} is not found", "status": "NOT_FOUND"}}
+        )
+
+    await asyncio.sleep(config.latency())
+    error = _error_response()
+    if error is not None:
+        return error
+
+    body = await request.json()
+    prompt = "".join(
+        part.get("text", "")
+        for content in body.get("contents", [])
+        for part in content.get("parts", [])
+    )
+    # Analyse groupée: un rapport par ligne du tableau, avec les séparateurs demandés
+    track_numbers = re.findall(r"^\| (\d+) \|", prompt, re.MULTILINE) if "MORCEAU N" in prompt else []
+    if track_numbers:
+        text = "\n\n".join(f"=== MORCEAU {number} ===\n{REPORT_TEXT}" for number in track_numbers)
+    else:
+        text = REPORT_TEXT
+    usage = {
+        "promptTokenCount": len(prompt) // 4,
+        "candidatesTokenCount": len(text) // 4,
+        "totalTokenCount": (len(prompt) + len(text)) // 4,
+    }
+
+    if action == "generateContent":
+        return {"candidates": [_candidate(text, True)], "usageMetadata": usage, "modelVersion": model}
+
+    if action == "streamGenerateContent":
+        chunk_size = max(1, len(text) // max(1, config.stream_chunks))
+        chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+        async def events():
+            for index, chunk in enumerate(chunks):
+                if index:
+                    await asyncio.sleep(config.chunk_interval_ms / 1000)
+                payload = {"candidates": [_candidate(chunk, index == len(chunks) - 1)], "modelVersion": model}
+                if index == len(chunks) - 1:
+                    payload["usageMetadata"] = usage
+                yield f"data: {json.dumps(payload, ensure_ascii=False)}\r\n\r\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return JSONResponse(status_code=400, content={"error": {"code": 400, "message": f"Unknown action: {action}"}})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Faux serveur Gemini pour les tests de charge")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-median-ms", type=float, default=config.latency_median_ms)
+    parser.add_argument("--latency-sigma", type=float, default=config.latency_sigma)
+    parser.add_argument("--stream-chunks", type=int, default=config.stream_chunks)
+    parser.add_argument("--chunk-interval-ms", type=float, default=config.chunk_interval_ms)
+    parser.add_argument("--error-rate", type=float, default=config.error_rate)
+    parser.add_argument("--rate-limit-rate", type=float, default=config.rate_limit_rate)
+    parser.add_argument("--models", default=",".join(config.models))
+    args = parser.parse_args()
+
+    config.latency_median_ms = args.latency_median_ms
+    config.latency_sigma = args.latency_sigma
+    config.stream_chunks = args.stream_chunks
+    config.chunk_interval_ms = args.chunk_interval_ms
+    config.error_rate = args.error_rate
+    config.rate_limit_rate = args.rate_limit_rate
+    config.models = args.models.split(",")
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()